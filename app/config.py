@@ -12,6 +12,7 @@ class Config:
     # LLM Configuration
     LLM_MODEL_NAME: str = os.getenv("LLM_MODEL_NAME", "llama3-groq-tool-use:latest")
     OLLAMA_BASE_URL: str = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+    LLM_CONCURRENCY: int = int(os.getenv("LLM_CONCURRENCY", "8"))  # Maksimal panggilan LLM yang berjalan bersamaan
     
     # Directory Configuration
     APP_DIR: str = "app"
@@ -25,12 +26,23 @@ class Config:
     
     # MCP Configuration
     MCP_SERVER_SCRIPT: str = os.getenv("MCP_SERVER_SCRIPT", "mcp_server.py")
+    MCP_POOL_SIZE: int = int(os.getenv("MCP_POOL_SIZE", "2"))  # Jumlah proses server MCP per server
+    TOOL_CONCURRENCY: int = int(os.getenv("TOOL_CONCURRENCY", "4"))  # Maksimal tool call LLM yang berjalan bersamaan
     
     # CORS Configuration
     CORS_ORIGINS: list = ["*"]  # Untuk production, ganti dengan domain spesifik
     
     # Memory Configuration
-    MEMORY_DB: str = "warung_ai_memory.sqlite"
+    MEMORY_DB: str = os.getenv("MEMORY_DB", "warung_ai_memory.sqlite")
+    CHECKPOINT_KEEP_LAST: int = int(os.getenv("CHECKPOINT_KEEP_LAST", "20"))  # Checkpoint yang disimpan per thread
+    CHECKPOINT_TTL_SECONDS: int = int(os.getenv("CHECKPOINT_TTL_SECONDS", str(24 * 3600)))  # Thread idle lebih lama dari ini dihapus
+    CHECKPOINT_COMPACT_INTERVAL_SECONDS: int = int(os.getenv("CHECKPOINT_COMPACT_INTERVAL_SECONDS", "300"))
+    HISTORY_MAX_TOKENS: int = int(os.getenv("HISTORY_MAX_TOKENS", "3000"))  # Budget riwayat percakapan yang dikirim ke LLM
+    HISTORY_KEEP_LAST_TURNS: int = int(os.getenv("HISTORY_KEEP_LAST_TURNS", "4"))  # Giliran terakhir yang tidak diringkas
+    HISTORY_SUMMARY_MAX_TOKENS: int = int(os.getenv("HISTORY_SUMMARY_MAX_TOKENS", "300"))
+    PRODUCT_CONTEXT_TOP_K: int = int(os.getenv("PRODUCT_CONTEXT_TOP_K", "8"))  # Produk relevan yang disisipkan ke prompt per pesan
+    RESPONSE_CACHE_SIZE: int = int(os.getenv("RESPONSE_CACHE_SIZE", "1000"))  # Jawaban agent yang di-cache (LRU)
+    RESPONSE_CACHE_TTL_SECONDS: int = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", "600"))
     
     @classmethod
     def ensure_directories(cls):
@@ -3,7 +3,8 @@
 import os
 import json
 import asyncio
-from typing import List, Dict, Any, Optional, TypedDict
+import time
+from typing import Annotated, List, Dict, Any, Optional, TypedDict
 from uuid import uuid4
 
 import gradio as gr
@@ -11,8 +12,8 @@ from dotenv import load_dotenv
 
 # Langchain & LangGraph
 from langgraph.graph import StateGraph, END
-from langgraph.checkpoint.sqlite import SqliteSaver # Untuk menyimpan state percakapan
-from langchain_core.messages import AnyMessage, SystemMessage, HumanMessage, AIMessage, ToolMessage
+from langgraph.graph.message import add_messages
+from langchain_core.messages import AnyMessage, SystemMessage, HumanMessage, AIMessage, ToolMessage, RemoveMessage
 from langchain_core.tools import tool, Tool
 from langchain_openai import ChatOpenAI
 
@@ -34,6 +35,7 @@ print("Pustaka dan setup awal selesai.")
 print(os.getcwd())
 # Fungsi Inisialisasi Database (langsung dari file database)
 from app.mcp_sample.produk_database import init_db as init_produk_db, DATABASE_NAME as PRODUK_DB_PATH
+from app.mcp_sample.produk_database import get_product_versions_from_db, get_products_by_ids_from_db
 from app.mcp_sample.transaction_database import init_db as init_transaction_db, DATABASE_NAME as TRANSACTION_DB_PATH
 
 # Pastikan direktori database ada
@@ -51,6 +53,15 @@ except Exception as e:
     print("Pastikan server MCP tidak berjalan jika error terkait 'database is locked'.")
     print("Atau jalankan notebook ini tanpa sel yang menjalankan server MCP secara otomatis jika perlu.")
 
+from app.config import Config
+from app.mcp_sample.checkpoint_store import CheckpointMaintenance, CheckpointStore
+from app.mcp_sample.history_manager import HistoryManager, estimate_tokens
+from app.mcp_sample.response_cache import ResponseCache, cacheable_products, mentions_product
+from app.mcp_sample.tool_executor import execute_tool_calls
+from app.mcp_sample.intent_router import (
+    Intent, IntentRouter, RouterMetrics, pick_product, render_order, render_product, render_product_list
+)
+
 # Klien MCP (impor fungsi yang sudah ada dan buat wrapper jika perlu)
 # Diasumsikan produk_client.py dan transaction_client.py ada di PWD
 from app.mcp_sample import produk_client, transaction_client
@@ -68,16 +79,8 @@ async def call_produk_tool_wrapper(tool_name: str, tool_args: Dict[str, Any]) ->
         return json.dumps({"error": error_message})
 
     if tool_result.content:
-        if tool_name == "list_all_produk":
-            # Assuming tool_result.content is a list of ContentPart objects,
-            # and each part.text is a JSON string of a product.
-            # We want to return a JSON string that is an array of these product JSON strings.
-            product_json_strings = [
-                part.text for part in tool_result.content if hasattr(part, 'text') and part.text
-            ]
-            return json.dumps(product_json_strings) # e.g., "[ \"{\\\"id\\\":1,...}\", \"{\\\"id\\\":2,...}\" ]"
-        elif len(tool_result.content) > 0 and hasattr(tool_result.content[0], 'text') and tool_result.content[0].text is not None:
-            # For other tools expected to return a single string
+        if len(tool_result.content) > 0 and hasattr(tool_result.content[0], 'text') and tool_result.content[0].text is not None:
+            # Every tool returns a single string; list_all_produk returns one JSON array
             return tool_result.content[0].text
         else:
             msg = f"Tool call '{tool_name}' returned content but not in expected format. Result: {tool_result}"
@@ -107,46 +110,73 @@ print("Klien MCP siap.")
 
 # --- Product Tools ---
 @tool
-async def get_product_details(product_id: Optional[int] = None, product_name: Optional[str] = None) -> str:
+async def get_product_details(product_id: Optional[int] = None, product_name: Optional[str] = None, include_stock: bool = False) -> str:
     """
     Mencari detail produk berdasarkan ID atau nama produk.
-    Jika menggunakan nama, akan mengembalikan produk pertama yang cocok (case-insensitive).
+    Jika menggunakan nama, akan mengembalikan produk yang paling cocok (case-insensitive).
+    Stok hanya disertakan jika include_stock=True: pakai untuk pertanyaan stok/ketersediaan dan sebelum memesan.
     """
     if product_id:
         # This part seems to work fine, assuming get_produk returns a single JSON string
         result_str = await call_produk_tool_wrapper("get_produk", {"produk_id": product_id})
-        return result_str
+        return result_str if include_stock else _without_stock(result_str)
     elif product_name:
-        # This is the part that needs adjustment based on the corrected wrapper
-        all_products_wrapper_output_str = await call_produk_tool_wrapper("list_all_produk", {})
+        # Pencarian dilakukan di produk_server (SQLite), hanya hasil teratas yang dikirim balik
+        search_result_str = await call_produk_tool_wrapper("search_produk", {"query": product_name, "limit": 1})
         try:
-            # all_products_wrapper_output_str should now be a JSON string like:
-            # "[ \"{\\\"id\\\":1,...}\", \"{\\\"id\\\":2,...}\" ]"
-            list_of_product_json_strings = json.loads(all_products_wrapper_output_str)
-            
-            if isinstance(list_of_product_json_strings, dict) and "error" in list_of_product_json_strings:
-                 return all_products_wrapper_output_str # Propagate error
-
-            all_products = []
-            for p_str in list_of_product_json_strings:
-                try:
-                    all_products.append(json.loads(p_str))
-                except json.JSONDecodeError:
-                    print(f"Peringatan: String produk tidak valid JSON diabaikan: {p_str}")
-                    continue # Abaikan string yang tidak bisa di-parse
-
-            for p in all_products:
-                if isinstance(p, dict) and product_name.lower() in p.get('nama_barang', '').lower():
-                    return json.dumps(p) # Kembalikan produk pertama yang cocok (sebagai JSON string)
+            matches = json.loads(search_result_str)
+            if isinstance(matches, dict) and "error" in matches:
+                return search_result_str # Propagate error
+            if matches:
+                produk = matches[0] # Kembalikan produk yang paling cocok (sebagai JSON string)
+                if not include_stock:
+                    produk.pop("stok", None)
+                return json.dumps(produk)
             return json.dumps({"error": f"Produk dengan nama '{product_name}' tidak ditemukan."})
         except Exception as e:
-            return json.dumps({"error": f"Gagal memproses daftar produk: {str(e)}", "raw_response": all_products_wrapper_output_str})
+            return json.dumps({"error": f"Gagal memproses hasil pencarian produk: {str(e)}", "raw_response": search_result_str})
     return json.dumps({"error": "Harus menyediakan product_id atau product_name."})
 
+def _without_stock(result_str: str) -> str:
+    """Hasil get_produk tanpa kolom stok. Jawaban tanpa stok boleh di-cache (lihat response_cache.cacheable_products)."""
+    try:
+        produk = json.loads(result_str)
+    except (TypeError, ValueError):
+        return result_str
+    if isinstance(produk, dict):
+        produk.pop("stok", None)
+        return json.dumps(produk)
+    return result_str
+
+async def get_products_by_ids(product_ids: List[int]) -> List[str]:
+    """
+    Mengambil beberapa produk sekaligus dalam satu batch_call ke produk_server.
+    Mengembalikan satu JSON string per ID, sama seperti get_product_details.
+    """
+    try:
+        results = await produk_client.call_produk_batch(
+            [{"tool": "get_produk", "args": {"produk_id": pid}} for pid in product_ids], atomic=False
+        )
+    except Exception as e:
+        return [json.dumps({"error": f"Gagal mengambil produk: {str(e)}"}) for _ in product_ids]
+
+    product_info_strs = []
+    for pid, res in zip(product_ids, results):
+        if not res["ok"]:
+            product_info_strs.append(json.dumps({"error": res["error"]}))
+        elif res["result"] is None:
+            product_info_strs.append(json.dumps({"error": f"Produk dengan ID {pid} tidak ditemukan."}))
+        else:
+            product_info_strs.append(res["result"])
+    return product_info_strs
+
 @tool
-async def list_available_products() -> str:
-    """Mendaftar semua produk yang tersedia."""
-    return await call_produk_tool_wrapper("list_all_produk", {})
+async def list_available_products(cursor: Optional[int] = None) -> str:
+    """
+    Mendaftar produk yang tersedia, 50 per halaman.
+    Hasilnya {"items": [...], "next_cursor": ...}; panggil lagi dengan cursor=next_cursor untuk halaman berikutnya.
+    """
+    return await call_produk_tool_wrapper("list_all_produk", {"cursor": cursor})
 
 # --- Transaction Tools (dengan logika kelengkapan) ---
 @tool
@@ -155,36 +185,21 @@ async def create_new_order(items: List[Dict[str, Any]], tanggal_transaksi: str,
     Membuat pesanan baru. 'items' adalah list dari dictionary, masing-masing berisi 'product_id' dan 'quantity'.
     Contoh items: [{"product_id": 1, "quantity": 2}, {"product_id": 3, "quantity": 1}]
     Fungsi ini akan membuat header transaksi, detail transaksi untuk setiap item,
-    dan mengurangi stok produk yang sesuai. Total harga akan dihitung otomatis.
+    dan mengurangi stok produk yang sesuai dalam satu transaksi database. Total harga akan dihitung otomatis.
     """
     print(f"Membuat pesanan baru dengan items: {items}")
-    # 1. Buat Transaction Header awal
-    header_data = {
-        "tanggal_transaksi": tanggal_transaksi,
-        "total_harga_transaksi": 0, # Akan diupdate nanti
-        "status": "pending",
-        "metode_pembayaran": metode_pembayaran,
-        "catatan": catatan or "Pesanan baru dari chatbot"
-    }
-    header_str = await call_transaction_tool_wrapper("create_transaction", header_data)
-    try:
-        header = json.loads(header_str)
-        if "error" in header: return header_str
-    except Exception as e:
-        return json.dumps({"error": f"Gagal membuat header transaksi: {str(e)}", "raw_response": header_str})
-
-    transaction_id = header['id']
     grand_total = 0
-    created_details = []
+    detail_transactions = []
     stock_update_errors = []
 
-    # 2. Proses setiap item: buat detail transaksi & update stok
-    for item in items:
+    # 1. Ambil info semua produk (harga, stok saat ini) dalam satu batch_call
+    product_info_strs = await get_products_by_ids([item['product_id'] for item in items])
+
+    # 2. Validasi setiap item & siapkan detail transaksi
+    for item, product_info_str in zip(items, product_info_strs):
         product_id = item['product_id']
         quantity_to_buy = item['quantity']
 
-        # Ambil info produk (harga, stok saat ini)
-        product_info_str = await get_product_details.ainvoke({"product_id": product_id})
         try:
             product_info = json.loads(product_info_str)
             if "error" in product_info:
@@ -205,71 +220,44 @@ async def create_new_order(items: List[Dict[str, Any]], tanggal_transaksi: str,
             stock_update_errors.append(f"Produk ID {product_id} ({product_info.get('nama_barang','N/A')}): Stok tidak cukup ({current_stock} tersedia, {quantity_to_buy} diminta).")
             continue # Stok tidak cukup
 
-        # Buat detail transaksi
         total_harga_produk_item = price_per_unit * quantity_to_buy
-        detail_data = {
-            "transaction_id": transaction_id,
+        detail_transactions.append({
+            "transaction_id": 0, # Diisi server
             "produk_id": product_id,
+            "product_name": product_info['nama_barang'],
             "qty": quantity_to_buy,
             "harga_per_produk": price_per_unit,
             "total_harga_produk": total_harga_produk_item
-        }
-        detail_str = await call_transaction_tool_wrapper("create_detail_transaction", detail_data)
-        try:
-            detail = json.loads(detail_str)
-            if "error" in detail:
-                stock_update_errors.append(f"Produk ID {product_id}: Gagal buat detail - {detail['error']}")
-                continue
-            created_details.append(detail)
-            grand_total += total_harga_produk_item
-        except Exception as e:
-            stock_update_errors.append(f"Produk ID {product_id}: Gagal parse detail - {str(e)}")
-            continue
-
-        # Update stok produk
-        new_stock = current_stock - quantity_to_buy
-        update_stock_data = {
-            "produk_id": product_id,
-            "nama_barang": product_info['nama_barang'], # Perlu field ini dari get_produk
-            "harga": product_info['harga'],
-            "stok": new_stock,
-            "lokasi": product_info.get('lokasi'),
-            "deskripsi_suara_lokasi": product_info.get('deskripsi_suara_lokasi'),
-            "path_qris": product_info.get('path_qris')
-        }
-        update_stock_str = await call_produk_tool_wrapper("update_produk", update_stock_data)
-        try:
-            update_stock_res = json.loads(update_stock_str)
-            if "error" in update_stock_res:
-                stock_update_errors.append(f"Produk ID {product_id}: Gagal update stok - {update_stock_res['error']}")
-                # Pertimbangkan rollback detail yang sudah dibuat jika update stok gagal? Untuk sekarang, kita catat errornya.
-        except Exception as e:
-             stock_update_errors.append(f"Produk ID {product_id}: Gagal parse update stok - {str(e)}")
-
+        })
+        grand_total += total_harga_produk_item
 
-    # 3. Update Transaction Header dengan total harga final dan status
-    if not created_details and stock_update_errors: # Tidak ada item yang berhasil diproses
-        # Hapus header transaksi yang kosong
-        await call_transaction_tool_wrapper("delete_transaction", {"transaction_id": transaction_id})
+    if not detail_transactions: # Tidak ada item yang bisa diproses
         return json.dumps({
             "error": "Gagal memproses semua item dalam pesanan.",
             "item_errors": stock_update_errors
         })
 
-    final_header_data = {
-        "transaction_id": transaction_id,
-        "tanggal_transaksi": header_data["tanggal_transaksi"],
+    # 3. Simpan header, semua detail & pengurangan stok dalam satu transaksi SQLite (semua atau tidak sama sekali)
+    order_data = {
+        "tanggal_transaksi": tanggal_transaksi,
         "total_harga_transaksi": grand_total,
         "status": "success" if not stock_update_errors else "partial_success",
-        "metode_pembayaran": header_data["metode_pembayaran"],
-        "catatan": (header_data["catatan"] or "") + (f" | Item errors: {len(stock_update_errors)}" if stock_update_errors else "")
+        "metode_pembayaran": metode_pembayaran,
+        "catatan": (catatan or "Pesanan baru dari chatbot") + (f" | Item errors: {len(stock_update_errors)}" if stock_update_errors else ""),
+        "detail_transactions": detail_transactions
     }
-    updated_header_str = await call_transaction_tool_wrapper("update_transaction", final_header_data)
-    
+    order_str = await call_transaction_tool_wrapper("create_transaction", order_data)
+    try:
+        order = json.loads(order_str)
+        if "error" in order:
+            return json.dumps({"error": order["error"], "item_errors": stock_update_errors or None})
+    except Exception as e:
+        return json.dumps({"error": f"Gagal membuat pesanan: {str(e)}", "raw_response": order_str})
+
     return json.dumps({
         "message": "Pesanan berhasil dibuat." if not stock_update_errors else "Pesanan dibuat dengan beberapa masalah pada item.",
-        "transaction_header": json.loads(updated_header_str),
-        "created_details_count": len(created_details),
+        "transaction_header": order["transaction"],
+        "created_details_count": len(order["detail_transactions"]),
         "item_processing_errors": stock_update_errors if stock_update_errors else None
     })
 
@@ -277,33 +265,17 @@ async def create_new_order(items: List[Dict[str, Any]], tanggal_transaksi: str,
 @tool
 async def get_order_details(transaction_id: int) -> str:
     """Mendapatkan detail pesanan/transaksi berdasarkan ID transaksi, termasuk item-itemnya."""
-    header_str = await call_transaction_tool_wrapper("get_transaction", {"transaction_id": transaction_id})
+    # Header, item, dan nama produk diambil server dalam satu query join
+    order_str = await call_transaction_tool_wrapper("get_order_with_items", {"transaction_id": transaction_id})
     try:
-        header = json.loads(header_str)
-        if "error" in header: return header_str
+        order = json.loads(order_str)
+        if "error" in order: return order_str
     except Exception as e:
-        return json.dumps({"error": f"Gagal mendapatkan header transaksi: {str(e)}", "raw_response": header_str})
-
-    # Ambil semua detail, lalu filter. Ini kurang efisien tapi sesuai tool MCP yang ada.
-    # Jika ada `get_detail_transaction_by_transaction_id` di MCP akan lebih baik.
-    # Untuk sekarang, kita asumsikan `get_all_detail_transactions` mengembalikan semua, dan kita filter.
-    # Bug: `get_all_detail_transactions` di server belum tentu ada, atau mungkin `get_all_detail_transactions_from_db`
-    # Untuk demo, kita hanya kembalikan header. Idealnya, ambil detail juga.
-    # Mari kita coba get_all_detail_transactions, jika gagal, hanya header.
-    all_details_str = await call_transaction_tool_wrapper("get_all_detail_transactions", {})
-    order_details = []
-    try:
-        all_details_list_str = json.loads(all_details_str)
-        all_details = [json.loads(d_str) for d_str in all_details_list_str]
-        for detail in all_details:
-            if detail.get("transaction_id") == transaction_id:
-                order_details.append(detail)
-    except Exception: # Jika gagal mengambil atau memproses detail
-        pass # Biarkan order_details kosong, info header tetap ada
+        return json.dumps({"error": f"Gagal mendapatkan pesanan: {str(e)}", "raw_response": order_str})
 
     return json.dumps({
-        "transaction_header": header,
-        "transaction_details": order_details if order_details else "Tidak dapat mengambil detail item atau tidak ada detail."
+        "transaction_header": order["transaction"],
+        "transaction_details": order["items"] if order["items"] else "Tidak ada detail item untuk transaksi ini."
     })
 
 
@@ -314,92 +286,21 @@ async def cancel_order(transaction_id: int) -> str:
     Ini akan menghapus detail transaksi terkait dan mengembalikan stok produk.
     """
     print(f"Membatalkan pesanan ID: {transaction_id}")
-    # 1. Dapatkan header untuk verifikasi (opsional, tapi baik untuk status check)
-    header_check_str = await call_transaction_tool_wrapper("get_transaction", {"transaction_id": transaction_id})
-    try:
-        header_check = json.loads(header_check_str)
-        if "error" in header_check:
-            return json.dumps({"error": f"Transaksi ID {transaction_id} tidak ditemukan atau gagal diambil: {header_check['error']}"})
-        # Anda bisa menambahkan logika di sini, misal hanya boleh cancel jika status 'pending' atau 'success'
-    except Exception as e:
-         return json.dumps({"error": f"Error saat verifikasi transaksi ID {transaction_id}: {str(e)}"})
-
-
-    # 2. Dapatkan semua detail transaksi untuk transaction_id ini
-    # Perlu cara untuk mendapatkan detail berdasarkan transaction_id.
-    # Jika tidak ada tool MCP spesifik, kita harus get_all dan filter.
-    all_details_str = await call_transaction_tool_wrapper("get_all_detail_transactions", {})
-    details_to_delete = []
-    stock_restore_errors = []
+    # Header & detail dihapus dan stok dikembalikan (stok = stok + qty) oleh server dalam satu transaksi SQLite
+    result_str = await call_transaction_tool_wrapper("cancel_transaction", {"transaction_id": transaction_id})
     try:
-        all_details_list_str = json.loads(all_details_str)
-        all_details_obj_list = [json.loads(d_str) for d_str in all_details_list_str]
-        for detail_obj in all_details_obj_list:
-            if detail_obj.get("transaction_id") == transaction_id:
-                details_to_delete.append(detail_obj)
+        result = json.loads(result_str)
     except Exception as e:
-        return json.dumps({"error": f"Gagal mengambil atau memproses detail transaksi untuk pembatalan: {str(e)}", "raw_response": all_details_str})
+        return json.dumps({"error": f"Gagal membatalkan pesanan ID {transaction_id}: {str(e)}", "raw_response": result_str})
+    if "error" in result:
+        return json.dumps({"error": f"Transaksi ID {transaction_id} tidak ditemukan atau gagal dibatalkan: {result['error']}"})
 
-    if not details_to_delete:
-        print(f"Tidak ada detail transaksi ditemukan untuk transaction_id {transaction_id}. Mungkin sudah dihapus atau tidak ada item.")
-    
-    # 3. Untuk setiap detail: kembalikan stok & hapus detail
-    for detail in details_to_delete:
-        detail_id = detail['id']
-        product_id = detail['produk_id']
-        qty_to_restore = detail['qty']
-
-        # Ambil info produk (stok saat ini)
-        product_info_str = await get_product_details(product_id=product_id)
-        try:
-            product_info = json.loads(product_info_str)
-            if "error" in product_info:
-                stock_restore_errors.append(f"Produk ID {product_id} (Detail ID {detail_id}): Gagal ambil info produk - {product_info['error']}")
-                continue
-        except Exception as e:
-            stock_restore_errors.append(f"Produk ID {product_id} (Detail ID {detail_id}): Gagal parse info produk - {str(e)}")
-            continue
-
-        current_stock = product_info.get('stok', 0)
-        new_stock = current_stock + qty_to_restore
-
-        update_stock_data = {
-            "produk_id": product_id,
-            "nama_barang": product_info['nama_barang'],
-            "harga": product_info['harga'],
-            "stok": new_stock,
-            "lokasi": product_info.get('lokasi')
-            # field lain jika perlu
-        }
-        update_stock_str = await call_produk_tool_wrapper("update_produk", update_stock_data)
-        try:
-            update_stock_res = json.loads(update_stock_str)
-            if "error" in update_stock_res :
-                 stock_restore_errors.append(f"Produk ID {product_id} (Detail ID {detail_id}): Gagal update stok - {update_stock_res['error']}")
-        except Exception as e:
-            stock_restore_errors.append(f"Produk ID {product_id} (Detail ID {detail_id}): Gagal parse update stok - {str(e)}")
-
-
-        # Hapus detail transaksi
-        delete_detail_str = await call_transaction_tool_wrapper("delete_detail_transaction", {"detail_transaction_id": detail_id})
-        # Periksa apakah delete_detail_str adalah "true"
-        if delete_detail_str.lower() != "true": # MCP tool delete mengembalikan "true" atau "false" sebagai string
-             stock_restore_errors.append(f"Detail ID {detail_id}: Gagal menghapus detail - {delete_detail_str}")
-
-    # 4. Hapus Transaction Header
-    delete_header_str = await call_transaction_tool_wrapper("delete_transaction", {"transaction_id": transaction_id})
-    
-    if delete_header_str.lower() == "true":
-        return json.dumps({
-            "message": f"Pesanan ID {transaction_id} berhasil dibatalkan.",
-            "stock_restore_errors": stock_restore_errors if stock_restore_errors else None
-        })
-    else:
-        return json.dumps({
-            "error": f"Gagal menghapus header pesanan ID {transaction_id}.",
-            "details": delete_header_str,
-            "stock_restore_errors": stock_restore_errors if stock_restore_errors else None
-        })
+    missing = result.get("missing_produk_ids") or []
+    return json.dumps({
+        "message": f"Pesanan ID {transaction_id} berhasil dibatalkan.",
+        "restored_stock": result["restored_stock"],
+        "stock_restore_errors": [f"Produk ID {pid} sudah tidak ada, stok tidak dikembalikan." for pid in missing] or None
+    })
 
 # Kumpulkan semua tools
 llm_tools = [
@@ -417,7 +318,9 @@ print(f"Tools untuk LLM Agent ({len(llm_tools)} tools) berhasil didefinisikan.")
 
 # Definisikan State untuk Graph
 class AgentState(TypedDict):
-    messages: List[AnyMessage]
+    messages: Annotated[List[AnyMessage], add_messages]
+    summary: str  # Ringkasan giliran lama yang sudah dihapus dari messages
+    open_order: Optional[Dict[str, Any]]  # Pesanan yang sedang dibahas; selalu ikut di prompt
 
 # Inisialisasi LLM (Model OpenAI)
 # llm = ChatOpenAI(model="gpt-3.5-turbo", temperature=0) # Ganti dengan gpt-4 atau model lain jika perlu
@@ -427,54 +330,126 @@ llm = ChatOpenAI(model="gpt-4o", temperature=0)
 # Bind tools ke LLM agar ia tahu tools apa saja yang tersedia
 llm_with_tools = llm.bind_tools(llm_tools)
 
+# Batas jumlah panggilan LLM yang berjalan bersamaan di proses ini (semua sesi chat)
+llm_semaphore = asyncio.Semaphore(Config.LLM_CONCURRENCY)
+
+async def summarize_history(prompt: str) -> str:
+    async with llm_semaphore:
+        response = await llm.ainvoke([HumanMessage(content=prompt)])
+    return str(response.content)
+
+history_manager = HistoryManager(
+    max_tokens=Config.HISTORY_MAX_TOKENS,
+    keep_last_turns=Config.HISTORY_KEEP_LAST_TURNS,
+    summary_max_tokens=Config.HISTORY_SUMMARY_MAX_TOKENS,
+    summarize=summarize_history,
+)
+
+def _message_tokens(m: AnyMessage) -> int:
+    return estimate_tokens(str(m.content)) + estimate_tokens(json.dumps(getattr(m, "tool_calls", None) or [], default=str))
+
+def _split_turns(messages: List[AnyMessage]):
+    """Memisahkan system prompt di awal dari giliran; setiap giliran dimulai dengan HumanMessage."""
+    start = next((i for i, m in enumerate(messages) if not isinstance(m, SystemMessage)), len(messages))
+    turns: List[List[AnyMessage]] = []
+    for m in messages[start:]:
+        if isinstance(m, HumanMessage) or not turns:
+            turns.append([])
+        turns[-1].append(m)
+    return messages[:start], turns
+
+# Node: History (menjaga riwayat tetap dalam budget token sebelum memanggil LLM)
+async def history_node(state: AgentState):
+    """
+    Jika riwayat melebihi Config.HISTORY_MAX_TOKENS, giliran lama (selain
+    HISTORY_KEEP_LAST_TURNS terakhir) diringkas dalam satu panggilan LLM lalu
+    dihapus dari state. Pasangan tool call/ToolMessage tidak terpisah karena
+    yang dihapus selalu giliran utuh.
+    """
+    _, turns = _split_turns(state["messages"])
+    summary, open_order = state.get("summary", ""), state.get("open_order")
+    fold = history_manager.fold_count([sum(_message_tokens(m) for m in turn) for turn in turns], summary, open_order)
+    if not fold:
+        return {}
+    folded = [m for turn in turns[:fold] for m in turn]
+    transcript = "\n".join(f"{m.type}: {m.content}" for m in folded if m.content)
+    new_summary = await history_manager.summarize(summary, transcript)
+    print(f"History: {fold} giliran lama diringkas ({len(folded)} pesan dihapus dari state)")
+    return {"summary": new_summary, "messages": [RemoveMessage(id=m.id) for m in folded]}
+
 # Node: Agent (LLM untuk memutuskan tindakan)
-def agent_node(state: AgentState):
+async def agent_node(state: AgentState):
+    """
+    Memanggil LLM secara async (ainvoke), sehingga event loop tetap melayani
+    sesi lain selama menunggu respons. Di dalam astream_events token tetap
+    di-stream lewat callback on_chat_model_stream.
+    Ringkasan dan pesanan yang sedang berjalan disisipkan setelah system prompt.
+    """
     print("---AGENT NODE---")
     print(f"Messages so far: {[m.type + ': ' + str(m.content)[:100] for m in state['messages']]}")
-    response = llm_with_tools.invoke(state["messages"])
+    system, turns = _split_turns(state["messages"])
+    context = history_manager.context_block(state.get("summary", ""), state.get("open_order"))
+    llm_input = system + ([SystemMessage(content=context)] if context else []) + [m for turn in turns for m in turn]
+    async with llm_semaphore:
+        response = await llm_with_tools.ainvoke(llm_input)
     print(f"LLM Response: {response.type + ': ' + str(response.content)[:100]}")
     return {"messages": [response]}
 
+# Tool yang hanya membaca data; aman dijalankan bersamaan.
+# Tool lain (membuat/membatalkan pesanan) dan semua tool sesudahnya dijalankan satu per satu sesuai urutan panggilan.
+READ_ONLY_TOOLS = {"get_product_details", "list_available_products", "get_order_details"}
+tools_by_name = {t.name: t for t in llm_tools}
+
+def _open_order_after(tool_call: Dict[str, Any], content: str, open_order: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Pesanan yang disematkan di prompt setelah tool call ini: diisi saat pesanan dibuat/dilihat, dikosongkan saat dibatalkan."""
+    try:
+        result = json.loads(content)
+    except (TypeError, ValueError):
+        return open_order
+    if not isinstance(result, dict) or "error" in result:
+        return open_order
+    if tool_call["name"] in ("create_new_order", "get_order_details") and "transaction_header" in result:
+        order = {"transaction": result["transaction_header"]}
+        if isinstance(result.get("transaction_details"), list):
+            order["items"] = [
+                {k: item.get(k) for k in ("produk_id", "nama_barang", "qty", "total_harga_produk")}
+                for item in result["transaction_details"]
+            ]
+        return order
+    if tool_call["name"] == "cancel_order" and open_order and open_order["transaction"].get("id") == tool_call["args"].get("transaction_id"):
+        return None
+    return open_order
+
 # Node: Tool Executor (untuk menjalankan tool yang dipanggil LLM)
 async def tool_executor_node(state: AgentState):
+    """
+    Menjalankan tool call dari pesan terakhir. Tool baca sebelum tool tulis pertama
+    berjalan bersamaan (maksimal Config.TOOL_CONCURRENCY sekaligus); mulai dari tool
+    tulis pertama semuanya berjalan satu per satu sesuai urutan. Urutan ToolMessage
+    sama dengan urutan tool_calls.
+    """
     print("---TOOL EXECUTOR NODE---")
     tool_message = state["messages"][-1] # Pesan terakhir harus berupa AIMessage dengan tool_calls
-    tool_invocations = []
 
     if not hasattr(tool_message, 'tool_calls') or not tool_message.tool_calls:
         print("Tidak ada tool calls pada pesan terakhir. Mengembalikan state apa adanya.")
         return {"messages": [AIMessage(content="Tidak ada tool yang dipanggil atau tool call tidak valid.")]}
 
-    for tool_call in tool_message.tool_calls:
-        tool_name = tool_call["name"]
-        # Cari tool yang sesuai dari list llm_tools
-        selected_tool = next((t for t in llm_tools if t.name == tool_name), None)
-        if not selected_tool:
-            tool_invocations.append(
-                ToolMessage(content=f"Error: Tool '{tool_name}' tidak ditemukan.", tool_call_id=tool_call["id"])
-            )
-            continue
-        
-        try:
-            tool_args = tool_call["args"]
-            print(f"Executing tool: {tool_name} with args: {tool_args}")
-            # Menjalankan tool (yang merupakan fungsi async)
-            # Pastikan selected_tool.func adalah callable async
-            if asyncio.iscoroutinefunction(selected_tool.func):
-                output = await selected_tool.func(**tool_args)
-            else: # Jika tool didefinisikan sebagai sync (seharusnya tidak untuk tool kita)
-                output = selected_tool.func(**tool_args)
-            
-            tool_invocations.append(
-                ToolMessage(content=str(output), tool_call_id=tool_call["id"])
-            )
-        except Exception as e:
-            print(f"Error executing tool {tool_name}: {e}")
-            tool_invocations.append(
-                ToolMessage(content=f"Error executing tool {tool_name}: {str(e)}", tool_call_id=tool_call["id"])
-            )
+    started = time.perf_counter()
+    tool_invocations = await execute_tool_calls(
+        tool_message.tool_calls, tools_by_name, READ_ONLY_TOOLS, Config.TOOL_CONCURRENCY
+    )
+    total_ms = round((time.perf_counter() - started) * 1000, 1)
+    timings = {m.tool_call_id: m.response_metadata.get("duration_ms") for m in tool_invocations}
+    print(f"Tool phase: {len(tool_invocations)} calls dalam {total_ms} ms, per call (ms): {timings}")
     print(f"Tool invocation results: {tool_invocations}")
-    return {"messages": tool_invocations}
+    update: Dict[str, Any] = {"messages": list(tool_invocations)}
+    open_order = state.get("open_order")
+    for tool_call, result in zip(tool_message.tool_calls, tool_invocations):
+        open_order = _open_order_after(tool_call, result.content, open_order)
+    if open_order != state.get("open_order"):
+        update["open_order"] = open_order
+    return update
 
 # Conditional Edges: Menentukan alur berikutnya
 def should_continue(state: AgentState):
@@ -485,10 +460,12 @@ def should_continue(state: AgentState):
 
 # Membuat Graph
 workflow = StateGraph(AgentState)
-workflow.add_node("agent", agent_node)
+workflow.add_node("history", history_node) # Meringkas giliran lama jika melebihi budget token
+workflow.add_node("agent", agent_node) # agent_node juga async (ainvoke)
 workflow.add_node("tools", tool_executor_node) # tool_executor_node dibuat async
 
-workflow.set_entry_point("agent")
+workflow.set_entry_point("history")
+workflow.add_edge("history", "agent")
 workflow.add_conditional_edges(
     "agent",
     should_continue,
@@ -497,16 +474,30 @@ workflow.add_conditional_edges(
 workflow.add_edge("tools", "agent") # Setelah tools dijalankan, kembali ke agent untuk memproses hasilnya
 
 # Konfigurasi Checkpoint (untuk menyimpan histori percakapan)
-# SqliteSaver memerlukan path ke file database sqlite.
-# Jika file tidak ada, akan dibuat.
-memory = SqliteSaver.from_conn_string(":memory:") # Simpan di memori untuk demo, atau ganti dengan path file
-# memory = SqliteSaver.from_conn_string("langgraph_chatbot_memory.sqlite")
+# Disimpan di file Config.MEMORY_DB (WAL) agar percakapan bertahan saat restart.
+# CheckpointMaintenance menjaga ukurannya tetap datar: hanya K checkpoint terakhir per thread,
+# thread yang idle melebihi TTL dihapus, dan file dikompaksi berkala di background.
+checkpoint_maintenance = CheckpointMaintenance(
+    Config.MEMORY_DB,
+    keep_last=Config.CHECKPOINT_KEEP_LAST,
+    ttl_seconds=Config.CHECKPOINT_TTL_SECONDS,
+    interval_seconds=Config.CHECKPOINT_COMPACT_INTERVAL_SECONDS,
+)
 
+# Checkpointer dan maintenance dibuka di event loop yang melayani request (loop Gradio),
+# bukan di loop start-up yang terblokir oleh launch(); lihat CheckpointStore.
+checkpoint_store = CheckpointStore(checkpoint_maintenance)
+# Graph terkompilasi untuk saver milik loop yang sedang berjalan; dibuat oleh open_chat_app()
+app = None
 
-# Kompilasi Graph dengan checkpoint
-# app = workflow.compile() # Tanpa memory
-app = workflow.compile(checkpointer=memory) # Dengan memory
-print("LangGraph App berhasil dikompilasi.")
+async def open_chat_app():
+    """Membuka checkpointer di Config.MEMORY_DB untuk loop ini, menyalakan maintenance, dan mengompilasi graph."""
+    global app
+    saver = await checkpoint_store.open()
+    if app is None or app.checkpointer is not saver:
+        app = workflow.compile(checkpointer=saver)
+        print(f"LangGraph App berhasil dikompilasi (checkpoint: {Config.MEMORY_DB}).")
+    return app
 
 
 # Sel 6: Fungsi untuk interaksi dengan Chatbot dan Gradio UI
@@ -516,6 +507,7 @@ SYSTEM_PROMPT = """Anda adalah asisten AI untuk Warung Cerdas.
 Tugas Anda adalah membantu pelanggan dengan pertanyaan tentang produk, membuat pesanan, memeriksa status pesanan, dan membatalkan pesanan.
 Selalu konfirmasi ID produk sebelum membuat atau memodifikasi pesanan jika pengguna menyebutkan nama produk.
 Jika Anda perlu mencari produk berdasarkan nama, gunakan tool `get_product_details` dengan argumen `product_name`.
+Tool `get_product_details` hanya menyertakan stok jika `include_stock=True`; pakai itu jika pengguna menanyakan stok atau ketersediaan, atau sebelum memesan. Jangan menyebut stok tanpa data stok dari tool.
 Jika pengguna ingin memesan, pastikan Anda mendapatkan daftar item yang jelas (product_id dan quantity).
 Gunakan tool `create_new_order` untuk membuat pesanan.
 Format tanggal transaksi adalah YYYY-MM-DD.
@@ -525,27 +517,121 @@ Jika terjadi error dari tool, sampaikan kepada pengguna dengan cara yang mudah d
 Jangan membuat informasi jika tidak ada di hasil tool.
 """
 
+# Fast path: pertanyaan sederhana dijawab langsung dari tool MCP tanpa LLM
+intent_router = IntentRouter()
+router_metrics = RouterMetrics()
+
+async def answer_intent(intent: Intent) -> Optional[str]:
+    """
+    Menjawab intent dari router langsung lewat tool MCP.
+    Mengembalikan None jika hasilnya tidak meyakinkan (produk tidak ada/ambigu, error), agar diteruskan ke agent.
+    """
+    try:
+        if intent.name == "list_products":
+            page = json.loads(await call_produk_tool_wrapper(
+                "list_all_produk", {"limit": 20, "fields": ["nama_barang", "harga", "stok"]}
+            ))
+            return None if "error" in page else render_product_list(page)
+        if intent.name == "order_status":
+            order = json.loads(await call_transaction_tool_wrapper(
+                "get_order_with_items", {"transaction_id": intent.args["transaction_id"]}
+            ))
+            return None if "error" in order else render_order(order)
+        # product_price / product_location / product_stock
+        query = intent.args["product_name"]
+        candidates = json.loads(await call_produk_tool_wrapper("search_produk", {"query": query, "limit": 3}))
+        if isinstance(candidates, dict):  # {"error": ...}
+            return None
+        produk = pick_product(query, candidates)
+        return render_product(intent, produk) if produk else None
+    except Exception as e:
+        print(f"Fast path {intent.name} gagal, diteruskan ke agent: {e}")
+        return None
+
+
+# Cache jawaban agent untuk pertanyaan produk yang berulang ("lokasi aqua di mana?").
+# Hanya giliran yang murni membaca produk yang disimpan; jawaban gugur jika produknya berubah.
+response_cache = ResponseCache(maxsize=Config.RESPONSE_CACHE_SIZE, ttl_seconds=Config.RESPONSE_CACHE_TTL_SECONDS)
+CACHEABLE_TOOLS = {"get_product_details"}
+
+def _products_read(turn: List[AnyMessage]) -> Optional[Dict[int, Dict[str, Any]]]:
+    """Produk (id -> data) yang dibaca agent pada giliran ini, atau None jika jawabannya tidak boleh di-cache."""
+    tool_names = [c["name"] for m in turn if isinstance(m, AIMessage) for c in m.tool_calls]
+    tool_results = [m.content for m in turn if isinstance(m, ToolMessage)]
+    return cacheable_products(tool_names, tool_results, CACHEABLE_TOOLS)
+
+async def cache_turn(message: str, answer: str, turn: List[AnyMessage]):
+    """Menyimpan jawaban giliran ini ke response_cache jika aman."""
+    products = _products_read(turn)
+    if not products or not mentions_product(message, [p["nama_barang"] for p in products.values()]):
+        return
+    # Versi dibaca dulu, baru isi baris dibandingkan dengan yang dilihat agent:
+    # jika produk berubah di antaranya, jawaban tidak disimpan.
+    # Helper DB-nya sinkron, jadi dijalankan di thread agar event loop tidak terblokir.
+    versions = await asyncio.to_thread(get_product_versions_from_db, list(products))
+    for row in await asyncio.to_thread(get_products_by_ids_from_db, list(products)):
+        # Kolom yang diikuti produk_versions (migration 3); jawaban yang menyebut stok tidak pernah di-cache
+        if any(row.get(k) != products[row["id"]].get(k) for k in ("nama_barang", "harga", "lokasi", "deskripsi_suara_lokasi")):
+            return
+    response_cache.put(message, answer, versions)
+
+
+async def record_turn(chat_app, config: Dict[str, Any], message: str, answer: str):
+    """
+    Menyimpan giliran yang dijawab tanpa menjalankan graph (fast path, response cache) ke state thread,
+    agar giliran berikutnya ("yang itu", "tambah 2") tetap punya konteksnya.
+    """
+    messages = [HumanMessage(content=message), AIMessage(content=answer)]
+    thread_state = await chat_app.aget_state(config)
+    if not thread_state.values.get("messages"):
+        messages.insert(0, SystemMessage(content=SYSTEM_PROMPT))
+    # Dicatat sebagai keluaran agent: AIMessage tanpa tool_calls berarti giliran selesai (END)
+    await chat_app.aupdate_state(config, {"messages": messages}, as_node="agent")
+
+
 # Fungsi untuk menjalankan graph (interaksi dengan chatbot)
 async def predict_fn(message: str, history: List[List[str]], thread_id: str):
     print(f"\n--- New Invocation (Thread ID: {thread_id}) ---")
     print(f"User message: {message}")
     print(f"History: {history}")
-
+    started = time.perf_counter()
+    chat_app = await open_chat_app()
     # Buat config unik untuk setiap thread_id (sesi percakapan)
     config = {"configurable": {"thread_id": thread_id}}
-    
+
+    intent = intent_router.match(message)
+    if intent:
+        answer = await answer_intent(intent)
+        if answer is not None:
+            await record_turn(chat_app, config, message, answer)
+            router_metrics.record(True, time.perf_counter() - started)
+            print(f"Fast path {intent.name}: {answer}")
+            print(f"Router metrics: {router_metrics.summary()}")
+            return answer
+
+    # Pesan yang mengubah pesanan tidak pernah dijawab dari cache (lihat response_cache.cache_key).
+    # get() membaca versi produk dari DB secara sinkron, jadi dijalankan di thread.
+    cached = await asyncio.to_thread(response_cache.get, message, get_product_versions_from_db)
+    if cached is not None:
+        await record_turn(chat_app, config, message, cached)
+        print(f"Response cache hit: {cached}")
+        print(f"Response cache: {response_cache.stats()}")
+        return cached
+
     # Siapkan input messages untuk LangGraph
     current_messages = [HumanMessage(content=message)]
-    if not history: # Jika ini pesan pertama, tambahkan system prompt
+    thread_state = await chat_app.aget_state(config)
+    if not thread_state.values.get("messages"): # Jika ini pesan pertama di graph, tambahkan system prompt
         current_messages.insert(0, SystemMessage(content=SYSTEM_PROMPT))
 
     # Jalankan graph secara streaming untuk mendapatkan respons
     response_content = ""
-    async for event in app.astream_events(
+    async for event in chat_app.astream_events(
         {"messages": current_messages}, config=config, version="v2"
     ):
         kind = event["event"]
-        if kind == "on_chat_model_stream":
+        # Hanya token dari agent; panggilan LLM untuk ringkasan riwayat tidak ikut ke jawaban
+        if kind == "on_chat_model_stream" and event.get("metadata", {}).get("langgraph_node") == "agent":
             content = event["data"]["chunk"].content
             if content:
                 # print(content, end="") # Cetak token streaming ke konsol
@@ -559,14 +645,21 @@ async def predict_fn(message: str, history: List[List[str]], thread_id: str):
 
     # Jika setelah semua proses, respons_content masih kosong (misal hanya ada tool call)
     # Ambil pesan AI terakhir dari state
-    if not response_content:
-        final_state = await app.aget_state(config)
-        if final_state and final_state.values['messages']:
-            last_ai_message = next((m for m in reversed(final_state.values['messages']) if isinstance(m, AIMessage) and not m.tool_calls), None)
-            if last_ai_message:
-                response_content = last_ai_message.content
-
+    final_state = await chat_app.aget_state(config)
+    final_messages = final_state.values.get("messages", []) if final_state else []
+    if not response_content and final_messages:
+        last_ai_message = next((m for m in reversed(final_messages) if isinstance(m, AIMessage) and not m.tool_calls), None)
+        if last_ai_message:
+            response_content = last_ai_message.content
+
+    # Giliran ini: pesan setelah HumanMessage terakhir
+    turn_start = max((i for i, m in enumerate(final_messages) if isinstance(m, HumanMessage)), default=len(final_messages))
+    await cache_turn(message, response_content, final_messages[turn_start + 1:])
+
+    router_metrics.record(False, time.perf_counter() - started)
     print(f"\nFinal AI response for UI: {response_content}")
+    print(f"Router metrics: {router_metrics.summary()}")
+    print(f"Response cache: {response_cache.stats()}")
     return response_content
 
 
@@ -623,9 +716,9 @@ if __name__ == '__main__': # Agar tidak auto-run saat import jika file ini jadi
         products_str = await list_available_products.ainvoke({})
         print(products_str)
         try:
-            products_list = json.loads(products_str) # Ini adalah list of JSON strings
+            products_list = json.loads(products_str)["items"] # Halaman pertama produk
             if products_list and isinstance(products_list, list) and products_list[0]:
-                 first_prod = json.loads(products_list[0])
+                 first_prod = products_list[0]
                  print(f"Produk pertama: {first_prod.get('nama_barang')}")
                  global test_product_id
                  test_product_id = first_prod.get('id') # Simpan untuk tes berikutnya
@@ -707,10 +800,20 @@ if __name__ == '__main__': # Agar tidak auto-run saat import jika file ini jadi
 
 # Jalankan tes tools sebelum UI untuk memastikan tools berfungsi
 async def run_tests_then_ui():
+    # Nyalakan server MCP untuk tes tools; di loop Gradio sesi dibuka sekali lalu dipakai ulang oleh semua tool.
+    await produk_client.get_produk_pool().start()
+    await transaction_client.get_transaction_pool().start()
+    await open_chat_app()
+
     print("Menjalankan tes tools sebelum UI... Mohon tunggu.")
     await test_tools() # Pastikan test_tools didefinisikan sebagai async
     print("Tes tools selesai.")
-    
+    # launch() memblokir loop ini dan Gradio menjalankan predict_fn di loop-nya sendiri:
+    # checkpointer, maintenance dan server MCP ditutup di sini, lalu dibuka lagi oleh request pertama.
+    await checkpoint_store.close()
+    await produk_client.get_produk_pool().stop()
+    await transaction_client.get_transaction_pool().stop()
+
     print("Memulai Gradio UI...")
     # Gradio ChatInterface
     # Fungsi `gradio_predict_wrapper` harus async
@@ -726,6 +829,8 @@ async def run_tests_then_ui():
             ["Batalkan pesanan dengan ID 1"]  # Ganti dengan ID yang valid
         ],
         chatbot=gr.Chatbot(height=600),
+        # Default Gradio hanya menjalankan satu chat sekaligus; batas sebenarnya ada di llm_semaphore
+        concurrency_limit=Config.LLM_CONCURRENCY,
     )
     chat_interface.launch() # share=True jika ingin diakses dari luar
 
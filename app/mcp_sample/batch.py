@@ -0,0 +1,107 @@
+import json
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pydantic import BaseModel, Field, validate_call
+from setup_logs import setup_logger
+from db_connection import batch_transaction, savepoint
+
+logger = setup_logger("batch", log_filename="warung.log")
+
+
+class BatchOperation(BaseModel):
+    """
+    Satu sub-operasi di dalam batch_call.
+    """
+    tool: str = Field(..., description="Nama tool yang dijalankan, misal: get_produk")
+    args: Dict[str, Any] = Field(default_factory=dict, description="Argumen untuk tool tersebut")
+
+
+class BatchItemResult(BaseModel):
+    """
+    Hasil dari satu sub-operasi batch_call.
+    """
+    index: int = Field(..., description="Posisi operasi di dalam batch")
+    tool: str = Field(..., description="Nama tool yang dijalankan")
+    ok: bool = Field(..., description="True jika operasi berhasil")
+    result: Any = Field(None, description="Hasil tool jika berhasil")
+    error: Optional[str] = Field(None, description="Pesan error jika gagal")
+
+
+class BatchError(Exception):
+    """Raised inside an atomic batch to roll back every operation."""
+
+
+def _error_of(result: Any) -> Optional[str]:
+    """Tools report handled failures as a JSON object with an "error" key."""
+    if isinstance(result, str):
+        try:
+            parsed = json.loads(result)
+        except ValueError:
+            return None
+        if isinstance(parsed, dict) and "error" in parsed:
+            return str(parsed["error"])
+    return None
+
+
+async def execute_batch(
+    operations: List[BatchOperation],
+    handlers: Dict[str, Callable[..., Awaitable[Any]]],
+    database_name: str,
+    atomic: bool = True,
+) -> List[BatchItemResult]:
+    """
+    Run `operations` against `handlers` inside one SQLite transaction.
+
+    With atomic=True the first failing operation rolls back the whole batch and
+    the operations after it are reported as skipped. With atomic=False each
+    operation runs in its own savepoint, so only the failing ones are undone
+    and the rest are committed together.
+    """
+    logger.info("execute_batch called with %s operations, atomic=%s", len(operations), atomic)
+    results: List[BatchItemResult] = []
+    # Sub-operation args arrive as plain JSON, so validate and coerce them
+    # against each handler's signature the same way FastMCP does for tools.
+    validated: Dict[str, Callable[..., Awaitable[Any]]] = {}
+    try:
+        with batch_transaction(database_name) as conn:
+            for index, operation in enumerate(operations):
+                handler = handlers.get(operation.tool)
+                if handler is None:
+                    error = f"Tool '{operation.tool}' tidak tersedia di batch_call"
+                    results.append(BatchItemResult(index=index, tool=operation.tool, ok=False, error=error))
+                    if atomic:
+                        raise BatchError(error)
+                    continue
+                if operation.tool not in validated:
+                    validated[operation.tool] = validate_call(handler)
+                try:
+                    with savepoint(conn):
+                        result = await validated[operation.tool](**operation.args)
+                        error = _error_of(result)
+                        if error is not None:
+                            raise BatchError(error)
+                except Exception as e:
+                    results.append(BatchItemResult(index=index, tool=operation.tool, ok=False, error=str(e)))
+                    if atomic:
+                        raise BatchError(str(e)) from e
+                    continue
+                results.append(BatchItemResult(index=index, tool=operation.tool, ok=True, result=result))
+    except BatchError:
+        failed = len(results) - 1
+        for item in results[:failed]:
+            item.ok = False
+            item.error = "Dibatalkan (rollback) karena operasi lain di batch gagal"
+        for index in range(len(results), len(operations)):
+            results.append(BatchItemResult(
+                index=index,
+                tool=operations[index].tool,
+                ok=False,
+                error="Tidak dijalankan karena operasi sebelumnya gagal",
+            ))
+    logger.info("execute_batch success: %s/%s ok", sum(r.ok for r in results), len(results))
+    return results
+
+
+def to_json_report(results: List[BatchItemResult]) -> str:
+    """Return the batch results as a JSON array string."""
+    return json.dumps([r.model_dump() for r in results])
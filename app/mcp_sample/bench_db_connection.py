@@ -0,0 +1,90 @@
+"""
+Benchmark: connection per query (old) vs. the shared connection provider.
+
+Runs the same point reads and stock updates against a throwaway database,
+once opening a fresh sqlite3 connection per query with default settings and
+once through db_connection.get_connection (kept-open connection, WAL,
+statement cache). Run from app/mcp_sample:
+
+    python bench_db_connection.py --products 5000 --queries 20000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from db_connection import close_connections, get_connection
+
+SELECT_SQL = "SELECT * FROM produk WHERE id = ?"
+UPDATE_SQL = "UPDATE produk SET stok = stok - 1 WHERE id = ?"
+
+
+def build_catalog(path: str, count: int):
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE produk (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nama_barang TEXT NOT NULL,
+            harga INTEGER NOT NULL,
+            stok INTEGER NOT NULL
+        )
+    """)
+    conn.executemany(
+        "INSERT INTO produk (nama_barang, harga, stok) VALUES (?, ?, ?)",
+        [(f"Produk {i}", 1000 + i, 1_000_000) for i in range(count)],
+    )
+    conn.commit()
+    conn.close()
+
+
+def per_query_connection(path: str, sql: str, produk_id: int):
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    try:
+        conn.execute(sql, (produk_id,)).fetchone()
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def shared_connection(path: str, sql: str, produk_id: int):
+    with get_connection(path) as conn:
+        conn.execute(sql, (produk_id,)).fetchone()
+
+
+def qps(fn, path: str, sql: str, ids: list) -> float:
+    start = time.perf_counter()
+    for produk_id in ids:
+        fn(path, sql, produk_id)
+    return len(ids) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=20000)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    read_ids = [rng.randint(1, args.products) for _ in range(args.queries)]
+    # Writes fsync, keep them to a smaller sample
+    write_ids = read_ids[:max(args.queries // 10, 1)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        old_path = os.path.join(tmp, "old.db")
+        new_path = os.path.join(tmp, "new.db")
+        build_catalog(old_path, args.products)
+        build_catalog(new_path, args.products)
+
+        print(f"{'workload':<14}{'per-query QPS':>16}{'shared QPS':>14}{'speedup':>10}")
+        for name, sql, ids in (("point read", SELECT_SQL, read_ids), ("stock update", UPDATE_SQL, write_ids)):
+            before = qps(per_query_connection, old_path, sql, ids)
+            after = qps(shared_connection, new_path, sql, ids)
+            print(f"{name:<14}{before:>16,.0f}{after:>14,.0f}{after / before:>9.1f}x")
+        close_connections()
+
+
+if __name__ == "__main__":
+    main()
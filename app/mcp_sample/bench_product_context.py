@@ -0,0 +1,83 @@
+"""
+Benchmark: whole catalog in the prompt vs. top-k retrieved products.
+
+For synthetic catalogs of growing size, compares the size of the
+{products} section (characters and estimated tokens) and the time to
+produce it per message, and checks that the product asked for is among
+the retrieved ones. Run from app/mcp_sample:
+
+    python bench_product_context.py --sizes 100,1000,10000,50000 --top-k 8
+"""
+import argparse
+import random
+import time
+
+from history_manager import estimate_tokens
+from product_retrieval import ProductRetriever, render_product_context
+
+REAL_PRODUCTS = [
+    ("Indomie Goreng", "Rak Mie Instan", "Ada di rak tengah, bagian mie instan."),
+    ("Aqua Botol 600ml", "Kulkas Minuman", "Di dalam kulkas minuman, sebelah kanan."),
+    ("Chitato Sapi Panggang", "Rak Snack", "Rak snack, di bagian atas."),
+    ("Teh Botol Sosro Kotak", "Kulkas Minuman", "Kulkas minuman, di sebelah kiri bawah."),
+    ("Sabun Mandi Lifebuoy", "Rak Perlengkapan Mandi", "Bagian sabun dan sampo, rak nomor tiga."),
+]
+# (message, product that must be retrieved)
+QUERIES = [
+    ("saya mau beli indomie goreng 2", "Indomie Goreng"),
+    ("aqua botol ada?", "Aqua Botol 600ml"),
+    ("chitatoo sapi berapa", "Chitato Sapi Panggang"),
+    ("teh botl sosro kotak", "Teh Botol Sosro Kotak"),
+    ("sabun lifebuoy di mana", "Sabun Mandi Lifebuoy"),
+]
+SYLLABLES = ["ka", "ri", "so", "ma", "ta", "ni", "bo", "lu", "pe", "ra", "gu", "de", "mi", "sa", "to", "ko", "la", "ne"]
+VARIANTS = ["Goreng", "Soto", "Original", "Coklat", "Keju", "Pedas", "Jumbo", "Mini", "Botol", "Sachet"]
+LOCATIONS = ["Rak Snack", "Rak Sembako", "Kulkas Minuman", "Kulkas Susu", "Rak Roti", "Rak Perlengkapan Mandi", "Rak Kopi & Teh"]
+
+
+def build_catalog(count: int) -> list:
+    # Synthetic brands (~1 per 10 products) plus the real products the queries ask for
+    rng = random.Random(42)
+    brands = ["".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).title() for _ in range(max(count // 10, 1))]
+    rows = [
+        (f"{rng.choice(brands)} {rng.choice(VARIANTS)} {rng.randint(1, 999)}gr", location, f"{location}, rak nomor {rng.randint(1, 9)}.")
+        for location in (rng.choice(LOCATIONS) for _ in range(max(count - len(REAL_PRODUCTS), 0)))
+    ] + REAL_PRODUCTS
+    return [
+        {"id": i, "nama_barang": name, "harga": 1000 * (i % 50 + 1), "stok": i % 100, "lokasi": lokasi, "deskripsi_suara_lokasi": deskripsi}
+        for i, (name, lokasi, deskripsi) in enumerate(rows, start=1)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100,1000,10000,50000")
+    parser.add_argument("--top-k", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'products':>9}{'full tokens':>13}{'full ms':>10}{'build ms':>10}{'top-k tokens':>14}{'top-k ms':>10}{'recall':>8}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        catalog = build_catalog(size)
+
+        start = time.perf_counter()
+        full = render_product_context([(p, 1.0) for p in catalog], len(catalog))
+        full_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        retriever = ProductRetriever(top_k=args.top_k)
+        retriever.build(catalog)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            prompts = [render_product_context(retriever.search(q), len(catalog)) for q, _ in QUERIES]
+        query_ms = (time.perf_counter() - start) * 1000 / (args.repeat * len(QUERIES))
+        hits = sum(any(p["nama_barang"] == wanted for p, _ in retriever.search(q)) for q, wanted in QUERIES)
+        topk_tokens = sum(estimate_tokens(p) for p in prompts) / len(prompts)
+
+        print(f"{size:>9}{estimate_tokens(full):>13}{full_ms:>10.1f}{build_ms:>10.1f}{topk_tokens:>14.0f}{query_ms:>10.2f}{hits:>5}/{len(QUERIES)}")
+
+
+if __name__ == "__main__":
+    main()
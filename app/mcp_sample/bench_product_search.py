@@ -0,0 +1,76 @@
+"""
+Benchmark: fuzzy trigram index vs. the LIKE query for product name lookups.
+
+Builds a throwaway catalog of synthetic products and times both lookups on
+exact, partial and misspelled queries. Run from app/mcp_sample:
+
+    python bench_product_search.py --products 20000 --repeat 200
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from fuzzy_index import TrigramIndex
+
+REAL_NAMES = ["Indomie Goreng", "Aqua Botol 600ml", "Chitato Sapi Panggang", "Teh Botol Sosro", "Sari Roti Tawar"]
+SYLLABLES = ["ka", "ri", "so", "ma", "ta", "ni", "bo", "lu", "pe", "ra", "gu", "de", "mi", "sa", "to", "ko", "la", "ne"]
+VARIANTS = ["Goreng", "Soto", "Original", "Coklat", "Keju", "Pedas", "Jumbo", "Mini", "Botol", "Sachet"]
+QUERIES = ["indomie goreng", "aqua", "indomi goreng", "akua", "chitatoo", "teh botl sosro"]
+
+
+def build_catalog(path: str, count: int) -> list:
+    # Synthetic brands (~1 per 10 products) plus a few real names to search for
+    rng = random.Random(42)
+    brands = ["".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).title() for _ in range(max(count // 10, 1))]
+    names = [
+        f"{rng.choice(brands)} {rng.choice(VARIANTS)} {rng.randint(1, 999)}gr"
+        for _ in range(count - len(REAL_NAMES))
+    ] + REAL_NAMES
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE produk (id INTEGER PRIMARY KEY AUTOINCREMENT, nama_barang TEXT NOT NULL)")
+    conn.executemany("INSERT INTO produk (nama_barang) VALUES (?)", [(n,) for n in names])
+    conn.commit()
+    conn.close()
+    return list(enumerate(names, start=1))
+
+
+def time_per_call(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        entries = build_catalog(db_path, args.products)
+
+        start = time.perf_counter()
+        index = TrigramIndex()
+        index.build(entries)
+        print(f"{args.products} products, index built in {(time.perf_counter() - start) * 1000:.1f} ms\n")
+
+        conn = sqlite3.connect(db_path)
+        like_sql = "SELECT * FROM produk WHERE LOWER(nama_barang) LIKE ?"
+        print(f"{'query':<18}{'LIKE ms':>10}{'hit':>6}{'trigram ms':>12}{'hit':>6}")
+        for query in QUERIES:
+            pattern = f"%{query.lower()}%"
+            like_ms = time_per_call(lambda: conn.execute(like_sql, (pattern,)).fetchone(), args.repeat)
+            trigram_ms = time_per_call(lambda: index.search(query, limit=5), args.repeat)
+            like_hit = conn.execute(like_sql, (pattern,)).fetchone() is not None
+            trigram_hit = bool(index.search(query, limit=5))
+            print(f"{query:<18}{like_ms:>10.3f}{str(like_hit):>6}{trigram_ms:>12.3f}{str(trigram_hit):>6}")
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+import asyncio
+import sqlite3
+import time
+from typing import Dict, Optional
+
+import aiosqlite
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+try:
+    from db_connection import connect
+    from setup_logs import setup_logger
+except ImportError:  # imported as app.mcp_sample.checkpoint_store (app/main.py)
+    from app.mcp_sample.db_connection import connect
+    from app.mcp_sample.setup_logs import setup_logger
+
+logger = setup_logger("checkpoint_store", log_filename="warung.log")
+
+# 100 ns intervals between the UUID epoch (1582-10-15) and the Unix epoch
+_UUID_EPOCH_OFFSET = 0x01B21DD213814000
+
+
+def uuid6_prefix(timestamp: float) -> str:
+    """
+    Return the time prefix of a UUIDv6 created at `timestamp` (Unix seconds).
+
+    LangGraph checkpoint IDs are UUIDv6 strings, whose hex form starts with
+    the creation time, most significant bits first. Comparing a checkpoint_id
+    with this prefix therefore tells whether it was created before
+    `timestamp`, using the primary key index.
+    """
+    t = int(timestamp * 10_000_000) + _UUID_EPOCH_OFFSET
+    return f"{t >> 28:08x}-{(t >> 12) & 0xFFFF:04x}-6{t & 0x0FFF:03x}"
+
+
+def _has_checkpoint_tables(conn: sqlite3.Connection) -> bool:
+    names = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    return {"checkpoints", "writes"} <= names
+
+
+def prepare_checkpoint_db(database_name: str):
+    """
+    Switch a checkpoint database to WAL and incremental auto-vacuum.
+
+    auto_vacuum only takes effect after a VACUUM, which runs once here when
+    the mode is first changed; afterwards compact() can hand freed pages
+    back to the file system without rewriting the whole database.
+    """
+    conn = connect(database_name)
+    try:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+
+def prune_checkpoints(conn: sqlite3.Connection, keep_last: int) -> int:
+    """Delete all but the newest `keep_last` checkpoints of each thread. Returns the number deleted."""
+    deleted = conn.execute("""
+        DELETE FROM checkpoints WHERE rowid IN (
+            SELECT rowid FROM (
+                SELECT rowid, ROW_NUMBER() OVER (
+                    PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC
+                ) AS newest_first
+                FROM checkpoints
+            ) WHERE newest_first > ?
+        )
+    """, (keep_last,)).rowcount
+    _delete_orphan_writes(conn)
+    return deleted
+
+
+def evict_idle_threads(conn: sqlite3.Connection, ttl_seconds: float, now: Optional[float] = None) -> int:
+    """Delete every thread whose newest checkpoint is older than ttl_seconds. Returns the number of threads."""
+    cutoff = uuid6_prefix((time.time() if now is None else now) - ttl_seconds)
+    idle = [row[0] for row in conn.execute(
+        "SELECT thread_id FROM checkpoints GROUP BY thread_id HAVING MAX(checkpoint_id) < ?", (cutoff,)
+    )]
+    conn.executemany("DELETE FROM checkpoints WHERE thread_id = ?", [(thread_id,) for thread_id in idle])
+    _delete_orphan_writes(conn)
+    return len(idle)
+
+
+def _delete_orphan_writes(conn: sqlite3.Connection):
+    conn.execute("""
+        DELETE FROM writes WHERE NOT EXISTS (
+            SELECT 1 FROM checkpoints c
+            WHERE c.thread_id = writes.thread_id
+              AND c.checkpoint_ns = writes.checkpoint_ns
+              AND c.checkpoint_id = writes.checkpoint_id
+        )
+    """)
+
+
+def compact(conn: sqlite3.Connection):
+    """Return free pages to the file system and fold the WAL back into the database file."""
+    conn.execute("PRAGMA incremental_vacuum")
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+class CheckpointMaintenance:
+    """
+    Keeps a LangGraph SQLite checkpoint database at a bounded size.
+
+    Every `interval_seconds` it keeps only the newest `keep_last` checkpoints
+    per thread, drops threads idle for longer than `ttl_seconds`, and
+    compacts the file. It uses its own connection, so it can run next to the
+    saver's; WAL lets the saver keep reading while it deletes.
+    """
+
+    def __init__(self, database_name: str, keep_last: int = 20, ttl_seconds: float = 24 * 3600, interval_seconds: float = 300):
+        self.database_name = database_name
+        self.keep_last = keep_last
+        self.ttl_seconds = ttl_seconds
+        self.interval_seconds = interval_seconds
+        self._task: Optional[asyncio.Task] = None
+
+    def run_once(self) -> Dict[str, int]:
+        """Prune, evict and compact once. Returns what was deleted."""
+        conn = connect(self.database_name)
+        try:
+            if not _has_checkpoint_tables(conn):
+                return {"checkpoints_pruned": 0, "threads_evicted": 0}
+            with conn:
+                threads_evicted = evict_idle_threads(conn, self.ttl_seconds)
+                checkpoints_pruned = prune_checkpoints(conn, self.keep_last)
+            compact(conn)
+        finally:
+            conn.close()
+        return {"checkpoints_pruned": checkpoints_pruned, "threads_evicted": threads_evicted}
+
+    async def _run_forever(self):
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                result = await asyncio.to_thread(self.run_once)
+                logger.info("Checkpoint maintenance: %s", result)
+            except sqlite3.Error as e:  # e.g. locked for longer than the busy timeout; retry next round
+                logger.warning("Checkpoint maintenance failed, retrying in %ss: %s", self.interval_seconds, e)
+
+    def start(self) -> asyncio.Task:
+        """Start the background job on the running event loop (once per loop)."""
+        loop = asyncio.get_running_loop()
+        if self._task is not None and self._task.get_loop() is not loop:
+            self.stop()
+        if self._task is None or self._task.done():
+            self._task = loop.create_task(self._run_forever())
+        return self._task
+
+    def stop(self):
+        """Cancel the background job. Safe to call from another thread or event loop than start()'s."""
+        if self._task is not None:
+            loop = self._task.get_loop()
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(self._task.cancel)
+            self._task = None
+
+
+class CheckpointStore:
+    """
+    The AsyncSqliteSaver of a checkpoint database plus its CheckpointMaintenance.
+
+    The aiosqlite connection, the saver's lock and the maintenance task all
+    belong to the event loop they were made on. app/main.py starts up on one
+    loop and Gradio serves requests on another, so open() creates them on the
+    loop that calls it, and moves them when a different loop calls.
+    """
+
+    def __init__(self, maintenance: CheckpointMaintenance):
+        self.maintenance = maintenance
+        self.saver: Optional[AsyncSqliteSaver] = None
+        self._conn: Optional[aiosqlite.Connection] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._lock_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    async def open(self) -> AsyncSqliteSaver:
+        """The saver for the running event loop; on first use there, opens it and starts maintenance."""
+        loop = asyncio.get_running_loop()
+        if self._lock_loop is not loop:
+            self._lock, self._lock_loop = asyncio.Lock(), loop
+        async with self._lock:
+            if self._loop is not loop:
+                await self.close()
+                prepare_checkpoint_db(self.maintenance.database_name)
+                conn = await aiosqlite.connect(self.maintenance.database_name)
+                await conn.execute("PRAGMA journal_mode=WAL")
+                await conn.execute("PRAGMA synchronous=NORMAL")
+                await conn.execute("PRAGMA busy_timeout=5000")
+                self._conn, self.saver, self._loop = conn, AsyncSqliteSaver(conn), loop
+                self.maintenance.start()
+        return self.saver
+
+    async def close(self):
+        """Stop maintenance and close the saver's connection; the next open() starts over."""
+        self.maintenance.stop()
+        conn, self._conn, self.saver, self._loop = self._conn, None, None, None
+        if conn is not None:
+            await conn.close()
@@ -0,0 +1,248 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Set
+
+# Applied to every connection. WAL lets readers run while a write is in
+# progress; synchronous=NORMAL is durable across application crashes in WAL
+# mode and only syncs at checkpoints. cache_size is in KiB when negative.
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -16000,
+    "mmap_size": 128 * 1024 * 1024,
+    "temp_store": "MEMORY",
+}
+
+# Size of sqlite3's per-connection prepared statement cache. Connections are
+# kept open, so repeated queries skip parsing and planning.
+CACHED_STATEMENTS = 256
+
+# While batch_transaction() is active, every get_connection() call for the
+# same database reuses its connection instead of opening and committing its
+# own. A ContextVar keeps concurrent asyncio tasks (one per MCP request) and
+# threads from joining each other's batches.
+_batches: ContextVar[Dict[str, sqlite3.Connection]] = ContextVar("db_batches", default={})
+
+# One long-lived connection per thread and database, see get_connection().
+# batch_transaction() runs on the same connection; _local.batch_keys holds the
+# databases whose connection is inside a batch, so a task from another
+# context on this thread does not end up in that batch's transaction.
+_local = threading.local()
+_all_connections: Dict[int, sqlite3.Connection] = {}
+_all_connections_lock = threading.Lock()
+
+
+def _batch_key(database_name: str) -> str:
+    return os.path.abspath(database_name)
+
+
+def connect(database_name: str, **kwargs) -> sqlite3.Connection:
+    """Open a connection with sqlite3.Row rows and PRAGMAS applied."""
+    conn = sqlite3.connect(database_name, cached_statements=CACHED_STATEMENTS, **kwargs)
+    conn.row_factory = sqlite3.Row
+    for pragma, value in PRAGMAS.items():
+        conn.execute(f"PRAGMA {pragma}={value}")
+    return conn
+
+
+def _thread_connection(database_name: str) -> sqlite3.Connection:
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    key = _batch_key(database_name)
+    conn = connections.get(key)
+    if conn is None:
+        conn = connections[key] = connect(database_name)
+        with _all_connections_lock:
+            _all_connections[id(conn)] = conn
+    return conn
+
+
+def _batch_keys() -> Set[str]:
+    keys = getattr(_local, "batch_keys", None)
+    if keys is None:
+        keys = _local.batch_keys = set()
+    return keys
+
+
+def _after_end() -> Dict[int, List[Callable[[], None]]]:
+    callbacks = getattr(_local, "after_end", None)
+    if callbacks is None:
+        callbacks = _local.after_end = {}
+    return callbacks
+
+
+def _transaction_ended(conn: sqlite3.Connection):
+    for callback in _after_end().pop(id(conn), ()):
+        callback()
+
+
+def close_connections():
+    """Close every cached connection, e.g. on shutdown or between tests."""
+    with _all_connections_lock:
+        connections = list(_all_connections.values())
+        _all_connections.clear()
+    for conn in connections:
+        try:
+            conn.close()
+        except sqlite3.ProgrammingError:
+            pass  # created in another thread that is still running
+    _local.__dict__.clear()
+
+
+def in_batch(database_name: str) -> bool:
+    """Return True if a batch_transaction is open for this database in this context."""
+    return _batch_key(database_name) in _batches.get()
+
+
+def _open_transaction(database_name: str) -> Optional[sqlite3.Connection]:
+    """The connection whose transaction database calls in this context are part of, if one is open."""
+    key = _batch_key(database_name)
+    batch_conn = _batches.get().get(key)
+    if batch_conn is not None:
+        return batch_conn
+    if key in _batch_keys():
+        return None  # another task's batch
+    conn = getattr(_local, "connections", {}).get(key)
+    return conn if conn is not None and conn.in_transaction else None
+
+
+def in_transaction(database_name: str) -> bool:
+    """
+    Return True if database calls in this context are inside an open transaction.
+
+    Rows read there may include uncommitted writes, so they must not be
+    cached for other callers.
+    """
+    return _open_transaction(database_name) is not None
+
+
+def after_transaction(database_name: str, callback: Callable[[], None]):
+    """
+    Call `callback` when the transaction open in this context ends, or now
+    if there is none.
+
+    The callback runs after both COMMIT and ROLLBACK, which suits cache
+    invalidation: dropping a value too often is harmless.
+    """
+    conn = _open_transaction(database_name)
+    if conn is None:
+        callback()
+    else:
+        _after_end().setdefault(id(conn), []).append(callback)
+
+
+@contextmanager
+def get_connection(database_name: str) -> Iterator[sqlite3.Connection]:
+    """
+    Yield this thread's connection to `database_name`.
+
+    The connection is opened on first use and kept for later calls. The work
+    is committed when the outermost block exits normally and rolled back when
+    it raises. Inside batch_transaction() the batch connection is yielded and
+    committing is left to the batch. Callbacks registered with
+    after_transaction() run once the outermost block has committed or
+    rolled back.
+    """
+    key = _batch_key(database_name)
+    batch_conn = _batches.get().get(key)
+    if batch_conn is not None:
+        yield batch_conn
+        return
+
+    if key in _batch_keys():
+        # This thread's connection is inside another task's batch
+        conn = connect(database_name)
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            _transaction_ended(conn)
+            conn.close()
+        return
+
+    conn = _thread_connection(database_name)
+    if conn.in_transaction:
+        # Nested call on this thread: the outer block commits
+        yield conn
+        return
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        _transaction_ended(conn)
+
+
+@contextmanager
+def batch_transaction(database_name: str) -> Iterator[sqlite3.Connection]:
+    """
+    Run every database call in the block inside one SQLite transaction.
+
+    Runs on this thread's cached connection (see get_connection). The
+    transaction is started with BEGIN IMMEDIATE so the write lock is taken
+    up front, committed when the block exits normally and rolled back when it
+    raises. Nested calls join the outer batch.
+    """
+    key = _batch_key(database_name)
+    batches = _batches.get()
+    if key in batches:
+        yield batches[key]
+        return
+
+    if key in _batch_keys():
+        # This thread's connection is inside another task's batch
+        with get_connection(database_name) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            token = _batches.set({**batches, key: conn})
+            try:
+                yield conn
+            finally:
+                _batches.reset(token)
+        return
+
+    conn = _thread_connection(database_name)
+    if conn.in_transaction:
+        # Inside a get_connection() block on this thread: join its transaction
+        token = _batches.set({**batches, key: conn})
+        try:
+            yield conn
+        finally:
+            _batches.reset(token)
+        return
+
+    token = _batches.set({**batches, key: conn})
+    _batch_keys().add(key)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+    finally:
+        _batch_keys().discard(key)
+        _batches.reset(token)
+        _transaction_ended(conn)
+
+
+@contextmanager
+def savepoint(conn: sqlite3.Connection, name: str = "batch_item") -> Iterator[sqlite3.Connection]:
+    """Wrap part of a batch in a SAVEPOINT that is rolled back on error."""
+    conn.execute(f"SAVEPOINT {name}")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute(f"ROLLBACK TO {name}")
+        conn.execute(f"RELEASE {name}")
+        raise
+    conn.execute(f"RELEASE {name}")
@@ -0,0 +1,146 @@
+import heapq
+import re
+import threading
+from collections import defaultdict
+from operator import itemgetter
+from typing import Dict, Iterable, List, Set, Tuple
+
+
+def words(text: str) -> List[str]:
+    """Lowercase `text` and split it into words."""
+    return re.findall(r"\w+", text.lower())
+
+
+def trigrams(word: str) -> Set[str]:
+    """
+    Return the character trigrams of one word, pg_trgm style.
+
+    The word is padded with two spaces in front and one behind, so "aqua"
+    gives "  a", " aq", "aqu", "qua" and "ua ".
+    """
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """
+    In-memory trigram index for fuzzy matching of short names.
+
+    Tolerates typos and speech-to-text spelling ("indomi goreng", "akua",
+    "chitatoo"). Trigrams are indexed per distinct word rather than per
+    entry: a catalog repeats the same few thousand words, so matching a
+    query word against the vocabulary stays cheap however many entries
+    there are. Entries are added, replaced and removed one at a time, so
+    the index can follow product writes without being rebuilt.
+    """
+
+    # Only the closest vocabulary words are considered for each query word;
+    # a short or common query word can otherwise match thousands of entries.
+    max_words_per_query_word = 8
+
+    def __init__(self):
+        self._word_gram_counts: Dict[str, int] = {}
+        self._entry_words: Dict[int, Set[str]] = {}
+        self._word_entries: Dict[str, Set[int]] = defaultdict(set)
+        self._gram_words: Dict[str, Set[str]] = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entry_words)
+
+    def __contains__(self, key: int) -> bool:
+        return key in self._entry_words
+
+    def build(self, entries: Iterable[Tuple[int, str]]):
+        """Replace the whole index with `entries` of (key, text)."""
+        with self._lock:
+            self._entry_words.clear()
+            self._word_entries.clear()
+            self._gram_words.clear()
+            self._word_gram_counts.clear()
+            for key, text in entries:
+                self._add(key, text)
+
+    def add(self, key: int, text: str):
+        """Add `key`, or replace its text if it is already indexed."""
+        with self._lock:
+            self._remove(key)
+            self._add(key, text)
+
+    def remove(self, key: int):
+        """Remove `key` from the index. Unknown keys are ignored."""
+        with self._lock:
+            self._remove(key)
+
+    def search(self, query: str, limit: int = 5, min_similarity: float = 0.3) -> List[Tuple[int, float]]:
+        """
+        Return up to `limit` (key, similarity) pairs, most similar first.
+
+        Each query word is compared with the words of an entry using the
+        Dice coefficient of their trigrams, and the best match per query
+        word is averaged. Ties go to the entry with fewer extra words.
+        """
+        query_words = list(dict.fromkeys(words(query)))
+        if not query_words:
+            return []
+        with self._lock:
+            totals: Dict[int, float] = {}
+            for query_word in query_words:
+                # Best similarity of this query word per key, filled from the
+                # most similar vocabulary word down
+                best: Dict[int, float] = {}
+                for word, similarity in self._similar_words(query_word, min_similarity):
+                    best.update(dict.fromkeys(self._word_entries[word] - best.keys(), similarity))
+                if not totals:
+                    totals = best
+                    continue
+                for key, similarity in best.items():
+                    totals[key] = totals.get(key, 0.0) + similarity
+            # Pre-select on the score alone (cheap), then break ties among the
+            # survivors in favour of entries with fewer extra words
+            threshold = min_similarity * len(query_words)
+            candidates = heapq.nlargest(limit * 4, totals.items(), key=itemgetter(1))
+            ranked = sorted(
+                (-total, len(self._entry_words[key]), key) for key, total in candidates if total >= threshold
+            )
+        return [(key, round(-total / len(query_words), 4)) for total, _, key in ranked[:limit]]
+
+    def _similar_words(self, query_word: str, min_similarity: float) -> List[Tuple[str, float]]:
+        """The vocabulary words most similar to `query_word`, most similar first."""
+        query_grams = trigrams(query_word)
+        shared: Dict[str, int] = defaultdict(int)
+        for gram in query_grams:
+            for word in self._gram_words.get(gram, ()):
+                shared[word] += 1
+        similar = []
+        for word, count in shared.items():
+            # Dice coefficient of the two trigram sets
+            similarity = 2 * count / (len(query_grams) + self._word_gram_counts[word])
+            if similarity >= min_similarity:
+                similar.append((similarity, word))
+        return [(word, similarity) for similarity, word in heapq.nlargest(self.max_words_per_query_word, similar)]
+
+    def _add(self, key: int, text: str):
+        entry_words = set(words(text))
+        self._entry_words[key] = entry_words
+        for word in entry_words:
+            if not self._word_entries[word]:
+                grams = trigrams(word)
+                self._word_gram_counts[word] = len(grams)
+                for gram in grams:
+                    self._gram_words[gram].add(word)
+            self._word_entries[word].add(key)
+
+    def _remove(self, key: int):
+        for word in self._entry_words.pop(key, ()):
+            entries = self._word_entries[word]
+            entries.discard(key)
+            if entries:
+                continue
+            del self._word_entries[word]
+            del self._word_gram_counts[word]
+            for gram in trigrams(word):
+                gram_words = self._gram_words[gram]
+                gram_words.discard(word)
+                if not gram_words:
+                    del self._gram_words[gram]
@@ -0,0 +1,165 @@
+import datetime
+import json
+import math
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+# Rough characters per token for Indonesian/English chat text. Only used to
+# keep the prompt under a budget, so an estimate without a tokenizer is enough.
+CHARS_PER_TOKEN = 4
+
+# Summarizer: prompt -> summary text, e.g. one LLM call
+Summarizer = Callable[[str], Awaitable[str]]
+
+SUMMARY_PROMPT = """Ringkas percakapan antara pembeli dan asisten warung berikut.
+Gabungkan dengan ringkasan sebelumnya (jika ada) menjadi satu ringkasan baru, maksimal {max_words} kata.
+Pertahankan fakta yang masih dibutuhkan: produk dan jumlah yang diminta, ID produk/transaksi, harga, keputusan pembeli.
+Jangan menambahkan informasi yang tidak ada di percakapan.
+
+Ringkasan sebelumnya:
+{previous_summary}
+
+Percakapan yang perlu diringkas:
+{transcript}
+
+Ringkasan baru:"""
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+def clip_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut `text` to about `max_tokens`, at a word boundary where possible."""
+    limit = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    return (cut.rsplit(" ", 1)[0] if " " in cut else cut) + " ..."
+
+
+def extractive_summary(previous_summary: str, transcript: str, max_tokens: int) -> str:
+    """
+    Summary without an LLM: (at most half a budget of) the previous summary
+    followed by the most recent folded lines that still fit. Used when the
+    summarizer fails, so the history still stays within budget.
+    """
+    head = clip_to_tokens(previous_summary, max_tokens // 2) if previous_summary else ""
+    room = max(0, max_tokens - estimate_tokens(head)) * CHARS_PER_TOKEN
+    tail = transcript[-room:] if room else ""
+    if len(transcript) > room and "\n" in tail:
+        tail = tail.split("\n", 1)[1]  # start at a whole line
+    return "\n".join(filter(None, [head, tail.strip()]))
+
+
+def render_open_order(order: Optional[Dict[str, Any]]) -> str:
+    return f"Pesanan yang sedang berjalan: {json.dumps(order, ensure_ascii=False, default=str)}" if order else ""
+
+
+class HistoryManager:
+    """
+    Keeps the conversation sent to the LLM within a token budget.
+
+    As long as the pinned order state, the summary and the turns fit in
+    `max_tokens`, nothing happens. When they no longer fit, every turn except
+    the last `keep_last_turns` is folded into the summary with a single
+    summarizer call, so the history then has room to grow for several turns
+    before the next overflow. The open order is never summarized; it is
+    rendered in full in every prompt.
+    """
+
+    def __init__(self, max_tokens: int = 3000, keep_last_turns: int = 4, summary_max_tokens: int = 300,
+                 summarize: Optional[Summarizer] = None):
+        self.max_tokens = max_tokens
+        self.keep_last_turns = max(1, keep_last_turns)
+        self.summary_max_tokens = summary_max_tokens
+        self._summarize = summarize
+        self.summaries = 0
+
+    def fold_count(self, turn_tokens: Sequence[int], summary: str = "", open_order: Optional[Dict[str, Any]] = None) -> int:
+        """
+        How many of the oldest turns to fold into the summary now; 0 if the history fits.
+
+        Folds everything before the last keep_last_turns turns, and more if
+        those alone still overflow. The newest turn is always kept.
+        """
+        pinned = estimate_tokens(render_open_order(open_order))
+        if pinned + estimate_tokens(summary) + sum(turn_tokens) <= self.max_tokens:
+            return 0
+        fold = max(0, len(turn_tokens) - self.keep_last_turns)
+        while fold < len(turn_tokens) - 1 and pinned + self.summary_max_tokens + sum(turn_tokens[fold:]) > self.max_tokens:
+            fold += 1
+        return fold
+
+    async def summarize(self, previous_summary: str, transcript: str) -> str:
+        """Fold `transcript` into `previous_summary`. Always returns at most summary_max_tokens."""
+        self.summaries += 1
+        if self._summarize is not None:
+            prompt = SUMMARY_PROMPT.format(
+                max_words=self.summary_max_tokens * 3 // 4,
+                previous_summary=previous_summary or "-",
+                transcript=transcript,
+            )
+            try:
+                summary = (await self._summarize(prompt)).strip()
+                if summary:
+                    return clip_to_tokens(summary, self.summary_max_tokens)
+            except Exception as e:
+                print(f"Ringkasan riwayat gagal, memakai ringkasan ekstraktif: {e}")
+        return extractive_summary(previous_summary, transcript, self.summary_max_tokens)
+
+    def context_block(self, summary: str, open_order: Optional[Dict[str, Any]]) -> str:
+        """Pinned order state and summary as one block for the prompt ("" if both are empty)."""
+        parts = [render_open_order(open_order)]
+        if summary:
+            parts.append(f"Ringkasan percakapan sebelumnya: {summary}")
+        return "\n".join(p for p in parts if p)
+
+
+class ConversationMemory:
+    """
+    History of one chat session for agents that take a single prompt string (streamlit_app.py).
+
+    Each turn is formatted once when it is added, so rendering a prompt only
+    joins the kept lines instead of rebuilding the whole history.
+    """
+
+    def __init__(self, manager: HistoryManager):
+        self.manager = manager
+        self.summary = ""
+        self.open_order: Optional[Dict[str, Any]] = None
+        self._turns: List[str] = []
+        self._turn_tokens: List[int] = []
+
+    def set_open_order(self, order: Optional[Dict[str, Any]]):
+        self.open_order = order
+
+    async def add_turn(self, user_message: str, assistant_message: str, timestamp: Optional[datetime.datetime] = None):
+        ts = (timestamp or datetime.datetime.now()).strftime("%Y-%m-%d %H:%M:%S")
+        turn = f"{ts} | buyer: {user_message}\n{ts} | assistant: {assistant_message}"
+        self._turns.append(turn)
+        self._turn_tokens.append(estimate_tokens(turn))
+
+        fold = self.manager.fold_count(self._turn_tokens, self.summary, self.open_order)
+        if fold:
+            transcript = "\n".join(self._turns[:fold])
+            self.summary = await self.manager.summarize(self.summary, transcript)
+            del self._turns[:fold], self._turn_tokens[:fold]
+
+    @property
+    def turns(self) -> List[str]:
+        return list(self._turns)
+
+    def render(self, current_message: str) -> str:
+        """Prompt with pinned order, summary, the kept turns and the new message."""
+        context = self.manager.context_block(self.summary, self.open_order)
+        history = "\n".join(filter(None, [context, *self._turns]))
+        return f"""
+Konteks Percakapan Sebelumnya::
+---
+{history}
+---
+
+--- Percakapan Berlanjut ---
+Pesan terbaru dari pembeli: {current_message}
+
+"""
@@ -0,0 +1,201 @@
+import math
+import re
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+try:
+    from fuzzy_index import words
+except ImportError:  # imported as app.mcp_sample.intent_router (app/main.py)
+    from app.mcp_sample.fuzzy_index import words
+
+
+class Intent(BaseModel):
+    """
+    Intent chat yang bisa dijawab langsung tanpa LLM.
+    """
+    name: str = Field(..., description="list_products, product_price, product_location, product_stock atau order_status")
+    args: Dict[str, Any] = Field(default_factory=dict, description="Argumen intent, misal: {\"product_name\": \"indomie\"}")
+
+
+# Turns that create, change or cancel an order always go to the agent
+MUTATING_WORDS = {"pesan", "beli", "order", "batal", "batalkan", "bayar", "tambah", "ubah", "hapus", "kurangi"}
+
+# A "product" made of these words refers back to the conversation ("harganya
+# berapa", "yang itu di mana") or names several products; the agent handles it
+CONTEXT_WORDS = {"nya", "itu", "ini", "tersebut", "tadi", "yang", "semua", "dan", "atau", "sama"}
+
+_PRODUCT = r"(?P<product>[a-z0-9][a-z0-9 .\-]{1,60}?)"
+_TAIL = r"(?: (?:ya|dong|kak|sih|nih|gan))*"
+
+# Each pattern must match the whole normalized message, so anything with
+# extra clauses ("harga indomie berapa, terus ...") falls through to the agent.
+RULES = [(name, [re.compile(p) for p in patterns]) for name, patterns in [
+    ("list_products", [
+        r"(?:ada )?(?:produk|barang)(?:nya)? apa(?: aja| saja)?(?: yang (?:ada|dijual|tersedia))?",
+        r"(?:lihat |tampilkan )?daftar (?:produk|barang)(?: yang (?:ada|tersedia))?",
+        r"jual apa(?: aja| saja)?",
+    ]),
+    ("product_price", [
+        rf"(?:berapa )?harga(?:nya)? {_PRODUCT}(?: berapa)?",
+        rf"{_PRODUCT} (?:harganya berapa|berapa harganya)",
+    ]),
+    ("product_location", [
+        rf"(?:lokasi|letak|tempat) {_PRODUCT} (?:ada )?di ?mana",
+        rf"di ?mana (?:lokasi |letak )?{_PRODUCT}",
+        rf"{_PRODUCT} (?:ada )?di ?mana",
+    ]),
+    ("product_stock", [
+        rf"(?:sisa )?stok {_PRODUCT}(?: (?:berapa|masih ada|ada))?",
+        rf"{_PRODUCT} (?:masih ada|stoknya berapa)",
+    ]),
+    ("order_status", [
+        r"(?:cek |lihat |status )?(?:pesanan|transaksi)(?: (?:nomor|no|id))? ?#?(?P<transaction_id>\d+)",
+    ]),
+]]
+
+def normalize(message: str) -> str:
+    """Lowercase, drop punctuation other than . and -, and collapse spaces."""
+    text = re.sub(r"[^\w\s.\-#]", " ", message.lower())
+    return " ".join(text.split())
+
+
+class IntentRouter:
+    """
+    Rule-based router for the chat turns that do not need the LLM.
+
+    match() only returns an intent when a rule matches the whole message and
+    the message says nothing about changing an order; otherwise it returns
+    None and the turn goes to the agent. Whether the lookup behind the intent
+    is conclusive (e.g. the product exists) is checked by the caller, which
+    can still fall back to the agent.
+    """
+
+    def match(self, message: str) -> Optional[Intent]:
+        text = normalize(message)
+        text = re.sub(rf"{_TAIL}$", "", text).rstrip(" .")
+        if not text or MUTATING_WORDS & set(words(text)):
+            return None
+        for name, patterns in RULES:
+            m = next((m for m in (p.fullmatch(text) for p in patterns) if m), None)
+            if not m:
+                continue
+            groups = {k: v for k, v in m.groupdict().items() if v}
+            args: Dict[str, Any] = {}
+            if "product" in groups:
+                product_words = words(groups["product"])
+                if not product_words or CONTEXT_WORDS & set(product_words):
+                    return None
+                args["product_name"] = groups["product"].strip(" .-")
+            if "transaction_id" in groups:
+                args["transaction_id"] = int(groups["transaction_id"])
+            return Intent(name=name, args=args)
+        return None
+
+
+def names_match(query: str, nama_barang: str) -> bool:
+    """True if every word of `query` starts a word of `nama_barang`, e.g. "teh bot" / "Teh Botol Sosro"."""
+    name_words = words(nama_barang)
+    return all(any(w.startswith(q) for w in name_words) for q in words(query))
+
+
+def pick_product(query: str, candidates: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    The one product `query` clearly names, or None if there is none or it is ambiguous.
+
+    Search results that do not contain every query word (fuzzy fallbacks)
+    are ignored. Of several remaining products an exact name match wins;
+    otherwise, e.g. "indomie" for Indomie Goreng and Indomie Soto, the
+    agent should ask which one is meant.
+    """
+    matching = [p for p in candidates if names_match(query, p["nama_barang"])]
+    exact = [p for p in matching if words(p["nama_barang"]) == words(query)]
+    if len(exact) == 1:
+        return exact[0]
+    return matching[0] if len(matching) == 1 else None
+
+
+def rupiah(amount: int) -> str:
+    return "Rp" + f"{amount:,}".replace(",", ".")
+
+
+def render_product(intent: Intent, produk: Dict[str, Any]) -> str:
+    """Answer a product_* intent from one product dict."""
+    nama = produk["nama_barang"]
+    if intent.name == "product_price":
+        return f"Harga {nama} {rupiah(produk['harga'])}."
+    if intent.name == "product_location":
+        if not produk.get("lokasi"):
+            return f"Lokasi {nama} belum dicatat."
+        deskripsi = f" {produk['deskripsi_suara_lokasi']}" if produk.get("deskripsi_suara_lokasi") else ""
+        return f"{nama} ada di {produk['lokasi']}.{deskripsi}"
+    return f"Stok {nama} saat ini {produk['stok']}." if produk["stok"] > 0 else f"Maaf, stok {nama} sedang habis."
+
+
+def render_product_list(page: Dict[str, Any]) -> str:
+    """Answer list_products from one list_all_produk page."""
+    if not page["items"]:
+        return "Belum ada produk yang tersedia."
+    lines = [f"- {p['nama_barang']}: {rupiah(p['harga'])} (stok {p['stok']})" for p in page["items"]]
+    more = "\nMasih ada produk lainnya, tanyakan saja nama produknya." if page.get("next_cursor") else ""
+    return "Produk yang tersedia:\n" + "\n".join(lines) + more
+
+
+def render_order(order: Dict[str, Any]) -> str:
+    """Answer order_status from a get_order_with_items result."""
+    t = order["transaction"]
+    lines = [
+        f"- {item['qty']}x {item['nama_barang'] or 'Produk ID ' + str(item['produk_id'])} @ {rupiah(item['harga_per_produk'])} = {rupiah(item['total_harga_produk'])}"
+        for item in order["items"]
+    ]
+    header = f"Pesanan #{t['id']} ({t['tanggal_transaksi']}), status {t['status']}, pembayaran {t['metode_pembayaran']}."
+    return "\n".join([header, *lines, f"Total {rupiah(t['total_harga_transaksi'])}."])
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile (q in 0..100) of `values`, None if empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, min(len(ordered), math.ceil(q / 100 * len(ordered))))
+    return ordered[rank - 1]
+
+
+class RouterMetrics:
+    """
+    Hit rate and latency of routed turns versus agent turns.
+
+    Latencies (seconds) of the last `window` turns of each kind are kept.
+    "saved" compares agent and fast-path percentiles, i.e. what a routed
+    turn would have cost had it gone through the agent.
+    """
+
+    def __init__(self, window: int = 1000):
+        self.routed = 0
+        self.fallbacks = 0
+        self._routed_latency: Deque[float] = deque(maxlen=window)
+        self._agent_latency: Deque[float] = deque(maxlen=window)
+
+    def record(self, routed: bool, seconds: float):
+        if routed:
+            self.routed += 1
+            self._routed_latency.append(seconds)
+        else:
+            self.fallbacks += 1
+            self._agent_latency.append(seconds)
+
+    def summary(self) -> Dict[str, Any]:
+        turns = self.routed + self.fallbacks
+        routed, agent = list(self._routed_latency), list(self._agent_latency)
+        result: Dict[str, Any] = {
+            "turns": turns,
+            "routed": self.routed,
+            "hit_rate": round(self.routed / turns, 4) if turns else 0.0,
+        }
+        for q in (50, 95):
+            fast_q, agent_q = percentile(routed, q), percentile(agent, q)
+            result[f"fast_p{q}_ms"] = round(fast_q * 1000, 1) if fast_q is not None else None
+            result[f"agent_p{q}_ms"] = round(agent_q * 1000, 1) if agent_q is not None else None
+            result[f"saved_p{q}_ms"] = round((agent_q - fast_q) * 1000, 1) if fast_q is not None and agent_q is not None else None
+        return result
@@ -0,0 +1,381 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from datetime import timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import anyio
+import mcp
+from mcp import StdioServerParameters
+from mcp.client.stdio import stdio_client
+from mcp.shared.exceptions import McpError
+from mcp.types import CONNECTION_CLOSED
+
+logger = logging.getLogger("mcp_session")
+
+# Errors raised by the stdio transport when the server process has gone away.
+# A request that fails with one of these never reached the server, so it is
+# safe to restart the session and send it again.
+TRANSPORT_ERRORS = (
+    anyio.ClosedResourceError,
+    anyio.BrokenResourceError,
+    anyio.EndOfStream,
+    ConnectionError,
+)
+
+
+class MCPSessionManager:
+    """
+    Long-lived ClientSession to a single stdio MCP server.
+
+    The server subprocess is spawned and initialized once, then reused for
+    every call. The session is pinged when it has been idle for longer than
+    `health_check_interval` seconds and is transparently restarted when the
+    ping fails or the transport reports that the process is gone.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        params: StdioServerParameters,
+        request_timeout: float = 60.0,
+        health_check_interval: float = 30.0,
+        ping_timeout: float = 5.0,
+    ):
+        self.name = name
+        self.params = params
+        self.request_timeout = request_timeout
+        self.health_check_interval = health_check_interval
+        self.ping_timeout = ping_timeout
+
+        self.restart_count = 0
+        # Bumped every time a session is started; lets callers that saw the
+        # same session fail agree on a single restart (see _restart_stale)
+        self.generation = 0
+        # name/version the server reported in the initialize handshake
+        self.server_info: Optional[mcp.types.Implementation] = None
+        self._session: Optional[mcp.ClientSession] = None
+        self._runner: Optional[asyncio.Task] = None
+        self._stop: Optional[asyncio.Event] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._last_ok = 0.0
+        self._start_error: Optional[BaseException] = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._session is not None and self._runner is not None and not self._runner.done()
+
+    async def _bind_loop(self):
+        """
+        Bind the loop-bound state (lock, session, runner) to the running event loop.
+
+        A manager serves one event loop at a time. When it is used from a new
+        one, the server process started on the old loop is shut down first:
+        on that loop if it still runs in another thread, while a closed loop
+        already shut it down when asyncio.run() cancelled the runner. A loop
+        that is alive but not running cannot shut it down, so using the
+        manager elsewhere is refused rather than leaving the old process behind.
+        """
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        old_loop, runner, stop = self._loop, self._runner, self._stop
+        if runner is not None and not runner.done() and not old_loop.is_closed():
+            if not old_loop.is_running():
+                raise RuntimeError(
+                    f"MCP session '{self.name}' is still running on an event loop that is not running; "
+                    "stop() it on that loop before using it from another one"
+                )
+            logger.info("MCP session '%s' used from a new event loop, stopping the old server", self.name)
+            await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._shut_down(runner, stop), old_loop))
+        if self._loop is not loop:  # another caller may have rebound it while we waited
+            self._loop = loop
+            self._lock = asyncio.Lock()
+            self._session = None
+            self._runner = None
+            self._stop = None
+
+    async def _run(self, ready: asyncio.Event, stop: asyncio.Event):
+        # The stdio transport and the session are anyio contexts that must be
+        # entered and exited by the same task, so they live in this runner.
+        try:
+            async with stdio_client(self.params) as streams:
+                async with mcp.ClientSession(
+                    *streams, read_timeout_seconds=timedelta(seconds=self.request_timeout)
+                ) as session:
+                    init_result = await session.initialize()
+                    self.server_info = init_result.serverInfo
+                    self._session = session
+                    self._last_ok = time.monotonic()
+                    ready.set()
+                    await stop.wait()
+        except BaseException as e:
+            self._start_error = e
+            if not isinstance(e, asyncio.CancelledError):
+                logger.warning("MCP session '%s' terminated: %s", self.name, e)
+        finally:
+            self._session = None
+            ready.set()
+
+    async def _start_locked(self):
+        ready = asyncio.Event()
+        self._stop = asyncio.Event()
+        self._start_error = None
+        self._runner = asyncio.create_task(self._run(ready, self._stop), name=f"mcp-session-{self.name}")
+        await ready.wait()
+        if self._session is None:
+            error = self._start_error
+            raise ConnectionError(f"Failed to start MCP server '{self.name}': {error}") from error
+        self.generation += 1
+        logger.info("MCP session '%s' started", self.name)
+
+    async def _stop_locked(self):
+        runner, stop = self._runner, self._stop
+        self._session = None
+        self._runner = None
+        self._stop = None
+        if runner is not None:
+            await self._shut_down(runner, stop)
+
+    async def _shut_down(self, runner: asyncio.Task, stop: Optional[asyncio.Event]):
+        """Ask the runner to leave its contexts (which terminates the process), cancelling it if it hangs."""
+        if stop is not None:
+            stop.set()
+        try:
+            await asyncio.wait_for(runner, timeout=self.ping_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError, Exception):
+            runner.cancel()
+
+    async def start(self):
+        """Start the server process and initialize the session if needed."""
+        await self._bind_loop()
+        async with self._lock:
+            if not self.is_running:
+                await self._start_locked()
+
+    async def stop(self):
+        """Shut down the session and its server process, from any event loop."""
+        if self._loop is None:
+            return
+        await self._bind_loop()
+        async with self._lock:
+            await self._stop_locked()
+
+    async def _restart_locked(self):
+        await self._stop_locked()
+        self.restart_count += 1
+        logger.info("Restarting MCP session '%s' (restart #%s)", self.name, self.restart_count)
+        await self._start_locked()
+
+    async def restart(self):
+        """Replace the current server process with a fresh one."""
+        await self._bind_loop()
+        async with self._lock:
+            await self._restart_locked()
+
+    async def _restart_stale(self, generation: int) -> mcp.ClientSession:
+        """
+        Restart the session of `generation` that a caller saw fail, and return the live session.
+
+        Concurrent callers often see the same session fail. The first one to
+        take the lock restarts it; the others find a newer generation running
+        and reuse that one instead of killing it and spawning yet another
+        server process.
+        """
+        await self._bind_loop()
+        async with self._lock:
+            if self.generation == generation or not self.is_running:
+                await self._restart_locked()
+            return self._session
+
+    async def health_check(self) -> bool:
+        """Ping the server, returning False if it does not answer in time."""
+        session = self._session
+        if session is None or not self.is_running:
+            return False
+        try:
+            with anyio.fail_after(self.ping_timeout):
+                await session.send_ping()
+        except (McpError, TimeoutError, *TRANSPORT_ERRORS) as e:
+            logger.warning("Health check for MCP session '%s' failed: %s", self.name, e)
+            return False
+        self._last_ok = time.monotonic()
+        return True
+
+    async def _live_session(self) -> Tuple[mcp.ClientSession, int]:
+        await self.start()
+        session, generation = self._session, self.generation
+        if time.monotonic() - self._last_ok > self.health_check_interval:
+            if not await self.health_check():
+                session = await self._restart_stale(generation)
+                generation = self.generation
+        return session, generation
+
+    async def get_session(self) -> mcp.ClientSession:
+        """Return a live session, starting or restarting the server as needed."""
+        session, _ = await self._live_session()
+        return session
+
+    async def _request(self, method: str, *args: Any) -> Any:
+        session, generation = await self._live_session()
+        try:
+            result = await getattr(session, method)(*args)
+        except TRANSPORT_ERRORS as e:
+            logger.warning("MCP session '%s' lost during %s: %s", self.name, method, e)
+            session = await self._restart_stale(generation)
+            result = await getattr(session, method)(*args)
+        except McpError as e:
+            if e.error.code == CONNECTION_CLOSED:
+                # The server died while handling the request. It may or may not
+                # have been applied, so restart for the next call but do not retry.
+                logger.warning("MCP session '%s' closed during %s, restarting", self.name, method)
+                await self._restart_stale(generation)
+            raise
+        self._last_ok = time.monotonic()
+        return result
+
+    async def call_tool(self, tool_name: str, tool_args: Dict[str, Any]) -> Any:
+        """Call a tool on the server."""
+        return await self._request("call_tool", tool_name, tool_args)
+
+    async def read_resource(self, resource_uri: str) -> Any:
+        """Read a resource from the server."""
+        return await self._request("read_resource", resource_uri)
+
+    async def list_tools(self) -> List[Any]:
+        """List the tools exposed by the server."""
+        result = await self._request("list_tools")
+        return result.tools
+
+
+class MCPPoolBusyError(Exception):
+    """Raised when no pooled session becomes free within the acquire timeout."""
+
+
+class MCPSessionPool:
+    """
+    Pool of warm MCPSessionManager workers for one server.
+
+    Each worker owns its own server process and handles one request at a
+    time. Calls are dispatched to whichever worker is idle; when all of them
+    are busy, callers wait up to `acquire_timeout` seconds and then get an
+    MCPPoolBusyError instead of queueing without bound.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        params: StdioServerParameters,
+        size: int = 2,
+        acquire_timeout: float = 30.0,
+        **session_kwargs: Any,
+    ):
+        if size < 1:
+            raise ValueError("MCPSessionPool size must be at least 1")
+        self.name = name
+        self.params = params
+        self.size = size
+        self.acquire_timeout = acquire_timeout
+        self.workers = [
+            MCPSessionManager(f"{name}-{i}", params, **session_kwargs) for i in range(size)
+        ]
+        self.waiting = 0
+        self._idle: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def server_info(self) -> Optional[mcp.types.Implementation]:
+        """serverInfo of a started worker, None before any has started."""
+        return next((w.server_info for w in self.workers if w.server_info is not None), None)
+
+    @property
+    def in_flight(self) -> int:
+        if self._idle is None:
+            return 0
+        return self.size - self._idle.qsize()
+
+    def _bind_loop(self):
+        # Only the idle queue is loop-bound here; each worker moves (and stops)
+        # its own server process in MCPSessionManager._bind_loop.
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._idle = asyncio.Queue()
+            for worker in self.workers:
+                self._idle.put_nowait(worker)
+
+    @asynccontextmanager
+    async def acquire(self) -> AsyncIterator[MCPSessionManager]:
+        """Borrow an idle worker, waiting for one if all are busy."""
+        self._bind_loop()
+        idle = self._idle
+        self.waiting += 1
+        try:
+            worker = await asyncio.wait_for(idle.get(), timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            raise MCPPoolBusyError(
+                f"All {self.size} '{self.name}' sessions busy for {self.acquire_timeout}s"
+            ) from None
+        finally:
+            self.waiting -= 1
+        try:
+            yield worker
+        finally:
+            idle.put_nowait(worker)
+
+    async def start(self):
+        """Spawn and initialize every worker up front."""
+        await asyncio.gather(*(worker.start() for worker in self.workers))
+
+    async def stop(self):
+        """Shut down every worker."""
+        await asyncio.gather(*(worker.stop() for worker in self.workers))
+
+    async def call_tool(self, tool_name: str, tool_args: Dict[str, Any]) -> Any:
+        """Call a tool on the first idle worker."""
+        async with self.acquire() as worker:
+            return await worker.call_tool(tool_name, tool_args)
+
+    async def read_resource(self, resource_uri: str) -> Any:
+        """Read a resource on the first idle worker."""
+        async with self.acquire() as worker:
+            return await worker.read_resource(resource_uri)
+
+    async def list_tools(self) -> List[Any]:
+        """List the tools exposed by the server."""
+        async with self.acquire() as worker:
+            return await worker.list_tools()
+
+
+# Shared managers and pools, one per server, used by produk_client,
+# transaction_client and app/main.py.
+_session_managers: Dict[str, MCPSessionManager] = {}
+_session_pools: Dict[str, MCPSessionPool] = {}
+
+
+def get_session_manager(name: str, params: StdioServerParameters, **kwargs: Any) -> MCPSessionManager:
+    """Return the shared session manager for `name`, creating it on first use."""
+    manager = _session_managers.get(name)
+    if manager is None:
+        manager = MCPSessionManager(name, params, **kwargs)
+        _session_managers[name] = manager
+    return manager
+
+
+def get_session_pool(name: str, params: StdioServerParameters, **kwargs: Any) -> MCPSessionPool:
+    """Return the shared session pool for `name`, creating it on first use."""
+    pool = _session_pools.get(name)
+    if pool is None:
+        pool = MCPSessionPool(name, params, **kwargs)
+        _session_pools[name] = pool
+    return pool
+
+
+async def close_all_sessions():
+    """Stop every shared session manager, pool and their server processes."""
+    for manager in list(_session_managers.values()):
+        await manager.stop()
+    for pool in list(_session_pools.values()):
+        await pool.stop()
@@ -0,0 +1,152 @@
+import sqlite3
+from typing import List, Sequence, Tuple
+
+try:
+    from db_connection import batch_transaction, get_connection
+except ImportError:  # imported as app.mcp_sample.migrations (app/main.py, streamlit_app.py)
+    from app.mcp_sample.db_connection import batch_transaction, get_connection
+
+# Tables every warung.db starts from. Created with IF NOT EXISTS when a
+# database is at version 0, so databases made before migrations existed are
+# adopted as they are.
+BASELINE: Sequence[str] = (
+    """
+    CREATE TABLE IF NOT EXISTS produk (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        nama_barang TEXT NOT NULL,
+        harga INTEGER NOT NULL,
+        lokasi TEXT,
+        deskripsi_suara_lokasi TEXT,
+        path_qris TEXT,
+        stok INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS transactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        tanggal_transaksi TEXT NOT NULL,
+        total_harga_transaksi INTEGER NOT NULL,
+        status TEXT,
+        metode_pembayaran TEXT,
+        catatan TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS detail_transactions (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        transaction_id INTEGER NOT NULL,
+        produk_id INTEGER NOT NULL,
+        qty INTEGER NOT NULL,
+        harga_per_produk INTEGER NOT NULL,
+        total_harga_produk INTEGER NOT NULL,
+        FOREIGN KEY (transaction_id) REFERENCES transactions (id),
+        FOREIGN KEY (produk_id) REFERENCES produk (id)
+    )
+    """,
+)
+
+# Schema changes for warung.db, applied in order. PRAGMA user_version holds the
+# version of the last one applied, so each runs once per database. Never edit
+# or reorder a released migration; append a new one instead.
+MIGRATIONS: List[Tuple[int, str, Sequence[str]]] = [
+    (1, "ledger indexes", (
+        "CREATE INDEX IF NOT EXISTS idx_detail_transactions_transaction_id ON detail_transactions (transaction_id)",
+        "CREATE INDEX IF NOT EXISTS idx_detail_transactions_produk_id ON detail_transactions (produk_id)",
+        "CREATE INDEX IF NOT EXISTS idx_transactions_tanggal_transaksi ON transactions (tanggal_transaksi)",
+        "CREATE INDEX IF NOT EXISTS idx_transactions_status ON transactions (status)",
+    )),
+    (2, "produk full-text index", (
+        # External content table over produk, kept in sync by the triggers below
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS produk_fts USING fts5(
+            nama_barang, lokasi, deskripsi_suara_lokasi,
+            content='produk', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS produk_fts_ai AFTER INSERT ON produk BEGIN
+            INSERT INTO produk_fts (rowid, nama_barang, lokasi, deskripsi_suara_lokasi)
+            VALUES (new.id, new.nama_barang, new.lokasi, new.deskripsi_suara_lokasi);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS produk_fts_ad AFTER DELETE ON produk BEGIN
+            INSERT INTO produk_fts (produk_fts, rowid, nama_barang, lokasi, deskripsi_suara_lokasi)
+            VALUES ('delete', old.id, old.nama_barang, old.lokasi, old.deskripsi_suara_lokasi);
+        END
+        """,
+        # Only the indexed columns, so stock changes do not rewrite the FTS row
+        """
+        CREATE TRIGGER IF NOT EXISTS produk_fts_au AFTER UPDATE OF nama_barang, lokasi, deskripsi_suara_lokasi ON produk BEGIN
+            INSERT INTO produk_fts (produk_fts, rowid, nama_barang, lokasi, deskripsi_suara_lokasi)
+            VALUES ('delete', old.id, old.nama_barang, old.lokasi, old.deskripsi_suara_lokasi);
+            INSERT INTO produk_fts (rowid, nama_barang, lokasi, deskripsi_suara_lokasi)
+            VALUES (new.id, new.nama_barang, new.lokasi, new.deskripsi_suara_lokasi);
+        END
+        """,
+        # Index the products that existed before this migration
+        "INSERT INTO produk_fts (produk_fts) VALUES ('rebuild')",
+    )),
+    (3, "produk change counter", (
+        # Bumped when a product's name, price or location changes or the
+        # product is deleted, whichever process or function does it; a product
+        # without a row is at version 0. Answers cached outside the produk
+        # server compare these to detect changes. Stock is left out so sales do
+        # not drop them; cached answers are never built from stock (see
+        # response_cache.cacheable_products).
+        """
+        CREATE TABLE IF NOT EXISTS produk_versions (
+            produk_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS produk_versions_au AFTER UPDATE OF nama_barang, harga, lokasi, deskripsi_suara_lokasi ON produk BEGIN
+            INSERT INTO produk_versions (produk_id, version) VALUES (old.id, 1)
+            ON CONFLICT (produk_id) DO UPDATE SET version = version + 1;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS produk_versions_ad AFTER DELETE ON produk BEGIN
+            INSERT INTO produk_versions (produk_id, version) VALUES (old.id, 1)
+            ON CONFLICT (produk_id) DO UPDATE SET version = version + 1;
+        END
+        """,
+    )),
+]
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    """Return the version of the last migration applied to this database."""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def apply_migrations(database_name: str, migrations: List[Tuple[int, str, Sequence[str]]] = MIGRATIONS) -> int:
+    """
+    Apply the migrations newer than the database's user_version.
+
+    Existing tables and data are never dropped, and an up-to-date database
+    costs a single PRAGMA read. Pending steps run in one BEGIN IMMEDIATE
+    transaction, so two processes starting at the same time cannot both
+    apply a step, and a failing step leaves the database at its previous
+    version. Returns the resulting version.
+    """
+    with get_connection(database_name) as conn:
+        version = get_schema_version(conn)
+    if version >= migrations[-1][0]:
+        return version
+
+    with batch_transaction(database_name) as conn:
+        version = get_schema_version(conn)  # another process may have migrated meanwhile
+        if version == 0:
+            for statement in BASELINE:
+                conn.execute(statement)
+        for target, _description, statements in migrations:
+            if target <= version:
+                continue
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {int(target)}")
+            version = target
+    return version
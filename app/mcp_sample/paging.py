@@ -0,0 +1,67 @@
+import json
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional, Sequence
+
+from pydantic import BaseModel
+
+DEFAULT_PAGE_LIMIT = 50
+PAGE_LIMIT_MAX = 200
+
+
+def clamp_limit(limit: Optional[int]) -> int:
+    """Keep a requested page size within 1..PAGE_LIMIT_MAX."""
+    if limit is None:
+        return DEFAULT_PAGE_LIMIT
+    return max(1, min(limit, PAGE_LIMIT_MAX))
+
+
+def check_fields(fields: Optional[Sequence[str]], allowed: Sequence[str]) -> Optional[List[str]]:
+    """
+    Validate a field projection against the fields a tool can return.
+
+    "id" is always kept because it is the paging cursor. Returns None when no
+    projection was requested; raises ValueError on unknown fields.
+    """
+    if not fields:
+        return None
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields {unknown}; choose from {list(allowed)}")
+    return ["id"] + [f for f in dict.fromkeys(fields) if f != "id"]
+
+
+def to_page_json(items: List[BaseModel], limit: int, include: Any = None, cursor_of: Callable[[BaseModel], int] = lambda item: item.id) -> str:
+    """
+    Serialize one keyset page as {"items": [...], "next_cursor": id | null}.
+
+    `items` is the result of fetching limit + 1 rows; the extra row only
+    tells whether another page exists and is not returned. next_cursor is
+    the ID of the last returned item, to be passed as `cursor` for the next
+    page. `include` is passed to model_dump to project fields.
+    """
+    has_more = len(items) > limit
+    items = items[:limit]
+    return json.dumps({
+        "items": [item.model_dump(include=include) for item in items],
+        "next_cursor": cursor_of(items[-1]) if has_more else None,
+    })
+
+
+async def iter_pages(fetch_page: Callable[[Optional[int]], Awaitable[str]]) -> AsyncIterator[List[Any]]:
+    """
+    Yield the items of consecutive pages of a paged tool, one page at a time.
+
+    fetch_page(cursor) returns the JSON text of one page; the first call
+    gets cursor=None and later calls get the previous next_cursor. Only one
+    page is held in memory at a time. Raises ValueError if the tool reports
+    an error.
+    """
+    cursor = None
+    while True:
+        page = json.loads(await fetch_page(cursor))
+        if "error" in page:
+            raise ValueError(page["error"])
+        if page["items"]:
+            yield page["items"]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return
@@ -0,0 +1,138 @@
+import heapq
+import math
+from collections import Counter, defaultdict
+from operator import itemgetter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    from fuzzy_index import trigrams, words
+    from intent_router import rupiah
+except ImportError:  # imported as app.mcp_sample.product_retrieval (streamlit_app.py)
+    from app.mcp_sample.fuzzy_index import trigrams, words
+    from app.mcp_sample.intent_router import rupiah
+
+# Fields that describe a product, with their weight. The name counts double:
+# "aqua" in the name says more than "kulkas" in the location.
+FIELD_WEIGHTS = {"nama_barang": 2.0, "lokasi": 1.0, "deskripsi_suara_lokasi": 1.0}
+
+# Function words of chat messages and location descriptions ("ada di rak
+# tengah", "saya mau beli ... dong"); they would only add noise matches
+STOPWORDS = {
+    "ada", "di", "ke", "dari", "dan", "atau", "yang", "dengan", "untuk", "ini", "itu", "nya", "saya", "aku", "mau",
+    "beli", "pesan", "minta", "apa", "aja", "saja", "berapa", "dong", "ya", "kak", "sih", "nih", "bagian", "sebelah",
+    "dekat", "dalam", "paling", "halo", "hai", "selamat", "pagi", "siang", "sore", "malam", "terima", "kasih",
+}
+
+# Weight of the trigram features relative to whole words. Trigrams let
+# "indomi", "minuman"/"minum" or "akua" still match; whole words rank exact hits higher.
+TRIGRAM_WEIGHT = 0.3
+
+
+def features(text: str, weight: float = 1.0) -> Counter:
+    """Weighted bag of words and word trigrams of `text`."""
+    bag: Counter = Counter()
+    for word in words(text):
+        if word in STOPWORDS:
+            continue
+        bag["w:" + word] += weight
+        for gram in trigrams(word):
+            bag["g:" + gram] += weight * TRIGRAM_WEIGHT
+    return bag
+
+
+class ProductRetriever:
+    """
+    Local TF-IDF index over the product catalog.
+
+    Selects the products a chat message is about, so a prompt only carries
+    those instead of the whole catalog. The index is built once from the
+    catalog (build()), not per message, and needs nothing beyond the
+    standard library: no model download and no network. A query only
+    walks the postings of its own words (and of trigrams for words the
+    catalog does not know), so it stays cheap as the catalog grows.
+    """
+
+    def __init__(self, top_k: int = 8, min_score: float = 0.1):
+        self.top_k = top_k
+        self.min_score = min_score
+        self._products: List[Dict[str, Any]] = []
+        self._idf: Dict[str, float] = {}
+        self._postings: Dict[str, List[Tuple[int, float]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._products)
+
+    def build(self, products: Iterable[Dict[str, Any]]):
+        """Replace the index with `products` (dicts with at least nama_barang)."""
+        self._products = list(products)
+        bags = []
+        for produk in self._products:
+            bag: Counter = Counter()
+            for field, weight in FIELD_WEIGHTS.items():
+                bag.update(features(produk.get(field) or "", weight))
+            bags.append(bag)
+
+        document_frequency: Counter = Counter()
+        for bag in bags:
+            document_frequency.update(bag.keys())
+        n = len(bags)
+        self._idf = {f: math.log((1 + n) / (1 + df)) + 1 for f, df in document_frequency.items()}
+
+        postings: Dict[str, List[Tuple[int, float]]] = defaultdict(list)
+        for doc, bag in enumerate(bags):
+            vector = self._weigh(bag)
+            for feature, weight in vector.items():
+                postings[feature].append((doc, weight))
+        self._postings = dict(postings)
+
+    def search(self, query: str, top_k: Optional[int] = None) -> List[Tuple[Dict[str, Any], float]]:
+        """Up to top_k (product, cosine score) pairs for `query`, best first; [] if nothing scores min_score."""
+        query_vector = self._weigh(self._query_features(query))
+        scores: Dict[int, float] = defaultdict(float)
+        for feature, query_weight in query_vector.items():
+            for doc, weight in self._postings[feature]:
+                scores[doc] += query_weight * weight
+        best = heapq.nlargest(top_k or self.top_k, scores.items(), key=itemgetter(1))
+        return [(self._products[doc], round(score, 4)) for doc, score in best if score >= self.min_score]
+
+    def _query_features(self, query: str) -> Counter:
+        """
+        Whole words the catalog knows, and trigrams only for the words it
+        does not (typos, inflections). Trigrams of a known word would add
+        long postings lists without changing the ranking much.
+        """
+        bag: Counter = Counter()
+        for word in words(query):
+            if word in STOPWORDS:
+                continue
+            if "w:" + word in self._idf:
+                bag["w:" + word] += 1
+            else:
+                bag.update(f for f in features(word) if f.startswith("g:") and f in self._idf)
+        return bag
+
+    def _weigh(self, bag: Counter) -> Dict[str, float]:
+        """Sublinear tf * idf, L2-normalized. Weighted counts below 1 (trigram-only features) stay linear."""
+        vector = {f: (1 + math.log(tf) if tf >= 1 else tf) * self._idf[f] for f, tf in bag.items()}
+        norm = math.sqrt(sum(w * w for w in vector.values()))
+        return {f: w / norm for f, w in vector.items()} if norm else {}
+
+
+def render_product_context(results: List[Tuple[Dict[str, Any], float]], catalog_size: int) -> str:
+    """
+    The {products} section of the instructions for the products picked by ProductRetriever.search().
+
+    Stock is left out: the catalog behind the retriever is only reloaded when
+    products change, not on every sale, so the model checks it with a tool.
+    """
+    if not results:
+        return (f"Tidak ada produk di katalog ({catalog_size} produk) yang cocok dengan pesan ini. "
+                "Gunakan tool produk untuk mencari atau mendaftar produk.")
+    lines = [
+        f"- id {p['id']}: {p['nama_barang']}, {rupiah(p['harga'])}"
+        + (f", lokasi {p['lokasi']}" if p.get("lokasi") else "")
+        for p, _ in results
+    ]
+    header = (f"Produk yang relevan dengan pesan ini ({len(results)} dari {catalog_size} produk). "
+              "Produk lain tetap bisa dicari dengan tool produk. Stok tidak dicantumkan; cek dengan tool produk.")
+    return "\n".join([header, *lines])
@@ -1,9 +1,13 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 import json
 from datetime import datetime
 from setup_logs import setup_logger
+from fuzzy_index import TrigramIndex
+from produk_cache import MISSING, produk_cache
+from db_connection import in_transaction
 
+import produk_database
 from produk_database import (
     create_product_in_db,
     get_product_from_db,
@@ -11,7 +15,16 @@ from produk_database import (
     update_product_in_db,
     delete_product_from_db,
     init_db,
-    get_product_by_name
+    get_product_by_name,
+    search_products_in_db,
+    get_products_by_ids_from_db,
+    get_products_page_from_db,
+    get_catalog_version_from_db,
+    decrement_stock,
+    decrement_stock_bulk,
+    increment_stock,
+    increment_stock_bulk,
+    InsufficientStockError
 )
 
 # Initialize the database and table
@@ -43,6 +56,31 @@ class ProdukCreationRequest(BaseModel):
     path_qris: Optional[str] = Field(None, description="Path ke gambar QRIS untuk pembayaran")
     stok: int = Field(..., description="Jumlah stok barang yang tersedia")
 
+class StockDecrement(BaseModel):
+    """
+    Satu item keranjang untuk decrement_stock_bulk.
+    """
+    produk_id: int = Field(..., description="ID produk")
+    qty: int = Field(..., description="Jumlah yang dikurangi dari stok, harus lebih dari 0")
+
+
+# Trigram index over nama_barang for typo-tolerant lookups. Rebuilt from the
+# database whenever the catalog version (product count plus produk_versions)
+# differs from the one it was built at, so writes from other processes,
+# batch deletes and renames, and rolled-back batches are all picked up.
+# Sales do not change the catalog version and cost no rebuild.
+_name_index = TrigramIndex()
+_name_index_key: Optional[Tuple[str, Tuple[int, int]]] = None
+
+def _get_name_index() -> TrigramIndex:
+    global _name_index_key
+    key = (produk_database.DATABASE_NAME, get_catalog_version_from_db())
+    if key != _name_index_key:
+        _name_index.build((p["id"], p["nama_barang"]) for p in get_all_products_from_db())
+        # Built inside a batch it may hold uncommitted rows, so it is not reused after the batch
+        _name_index_key = None if in_transaction(produk_database.DATABASE_NAME) else key
+    return _name_index
+
 
 class ProdukService:
     @staticmethod
@@ -58,22 +96,63 @@ class ProdukService:
     def get_produk(produk_id: int) -> Optional[Produk]:
         """Get a product by its ID."""
         logger.info("get_produk called with produk_id=%s", produk_id)
+        if in_transaction(produk_database.DATABASE_NAME):
+            # Inside a batch: may see uncommitted writes, so bypass the cache
+            data = get_product_from_db(produk_id)
+            return Produk(**data) if data else None
+        cached = produk_cache.get_item(produk_database.DATABASE_NAME, produk_id)
+        if cached is not MISSING:
+            logger.info("get_produk success (cached): %s", cached)
+            return cached
+        version = produk_cache.version
         data = get_product_from_db(produk_id)
-        if data:
-            result = Produk(**data)
-            logger.info("get_produk success: %s", result)
-            return result
-        logger.info("get_produk success: None")
-        return None
+        result = Produk(**data) if data else None
+        produk_cache.put_item(produk_id, result, version)
+        logger.info("get_produk success: %s", result)
+        return result
+
+    @staticmethod
+    def get_produk_by_ids(produk_ids: List[int]) -> Dict[int, Produk]:
+        """Get several products in one query, keyed by ID. Missing IDs are left out."""
+        logger.info("get_produk_by_ids called with produk_ids=%s", produk_ids)
+        result = {data["id"]: Produk(**data) for data in get_products_by_ids_from_db(produk_ids)}
+        logger.info("get_produk_by_ids success: %s products", len(result))
+        return result
+
+    @staticmethod
+    def get_produk_page(after_id: int = 0, limit: int = 50) -> List[Produk]:
+        """Get up to `limit` products with an ID greater than after_id, ordered by ID."""
+        logger.info("get_produk_page called with after_id=%s, limit=%s", after_id, limit)
+        result = [Produk(**data) for data in get_products_page_from_db(after_id, limit)]
+        logger.info("get_produk_page success: %s products", len(result))
+        return result
 
     @staticmethod
     def get_all_produk() -> List[Produk]:
         """Get all products."""
         logger.info("get_all_produk called")
+        if in_transaction(produk_database.DATABASE_NAME):
+            return [Produk(**data) for data in get_all_products_from_db()]
+        cached = produk_cache.get_all(produk_database.DATABASE_NAME)
+        if cached is not MISSING:
+            logger.info("get_all_produk success (cached): %s products", len(cached))
+            return list(cached)
+        version = produk_cache.version
         all_data = get_all_products_from_db()
         result = [Produk(**data) for data in all_data]
+        produk_cache.put_all(result, version)
         logger.info("get_all_produk success: %s", result)
-        return result
+        return list(result)
+
+    @staticmethod
+    def get_all_produk_json() -> str:
+        """Get all products as one JSON array string."""
+        return "[" + ",".join(ProdukService.to_json_report(p) for p in ProdukService.get_all_produk()) + "]"
+
+    @staticmethod
+    def cache_stats() -> Dict[str, Any]:
+        """Hit/miss counters of the product cache."""
+        return produk_cache.stats()
 
     @staticmethod
     def update_produk(produk_id: int, produk_data: ProdukCreationRequest) -> Optional[Produk]:
@@ -95,18 +174,76 @@ class ProdukService:
         logger.info("delete_produk success: %s", result)
         return result
     
+    @staticmethod
+    def decrement_stock(produk_id: int, qty: int, allow_negative: bool = False) -> Optional[int]:
+        """Subtract `qty` from a product's stock in one atomic statement; returns the new stock or None."""
+        logger.info("decrement_stock called with produk_id=%s, qty=%s, allow_negative=%s", produk_id, qty, allow_negative)
+        result = decrement_stock(produk_id, qty, allow_negative=allow_negative)
+        logger.info("decrement_stock success: %s", result)
+        return result
+
+    @staticmethod
+    def decrement_stock_bulk(items: List[Dict[str, int]], allow_negative: bool = False) -> Dict[int, int]:
+        """Apply all stock decrements of a basket, or none (raises InsufficientStockError)."""
+        logger.info("decrement_stock_bulk called with items=%s, allow_negative=%s", items, allow_negative)
+        result = decrement_stock_bulk(items, allow_negative=allow_negative)
+        logger.info("decrement_stock_bulk success: %s", result)
+        return result
+
+    @staticmethod
+    def increment_stock(produk_id: int, qty: int) -> Optional[int]:
+        """Add `qty` to a product's stock in one atomic statement; returns the new stock or None."""
+        logger.info("increment_stock called with produk_id=%s, qty=%s", produk_id, qty)
+        result = increment_stock(produk_id, qty)
+        logger.info("increment_stock success: %s", result)
+        return result
+
+    @staticmethod
+    def increment_stock_bulk(items: List[Dict[str, int]]) -> Dict[int, int]:
+        """Add the quantities of several items back to stock in one transaction; missing products are skipped."""
+        logger.info("increment_stock_bulk called with items=%s", items)
+        result = increment_stock_bulk(items)
+        logger.info("increment_stock_bulk success: %s", result)
+        return result
+
     @staticmethod
     def get_produk_by_name(produk_name: str) -> Optional[Produk]:
-        """Get a product by its name."""
+        """Get the best matching product by its name."""
         logger.info("get_produk_by_name called with produk_name=%s", produk_name)
         data = get_product_by_name(produk_name)
         if data:
             result = Produk(**data)
             logger.info("get_produk_by_name success: %s", result)
             return result
+        candidates = ProdukService.fuzzy_search_produk(produk_name, limit=1)
+        if candidates:
+            logger.info("get_produk_by_name success (fuzzy): %s", candidates[0])
+            return candidates[0]
         logger.info("get_produk_by_name success: None")
         return None
 
+    @staticmethod
+    def search_produk(query: str, limit: int = 5, offset: int = 0, include_location: bool = False) -> List[Produk]:
+        """Search products by name (optionally also by location), best matches first."""
+        logger.info("search_produk called with query=%s, limit=%s, offset=%s", query, limit, offset)
+        all_data = search_products_in_db(query, limit=limit, offset=offset, include_location=include_location)
+        result = [Produk(**data) for data in all_data]
+        if not result and offset == 0:
+            # Nothing matched literally, try the spelling-tolerant index
+            result = ProdukService.fuzzy_search_produk(query, limit=limit)
+        logger.info("search_produk success: %s results", len(result))
+        return result
+
+    @staticmethod
+    def fuzzy_search_produk(query: str, limit: int = 5, min_similarity: float = 0.3) -> List[Produk]:
+        """Find products whose name looks like `query` (typos, spoken spelling), most similar first."""
+        logger.info("fuzzy_search_produk called with query=%s, limit=%s", query, limit)
+        matches = _get_name_index().search(query, limit=limit, min_similarity=min_similarity)
+        rows = {row["id"]: row for row in get_products_by_ids_from_db([key for key, _ in matches])}
+        result = [Produk(**rows[key]) for key, _ in matches if key in rows]
+        logger.info("fuzzy_search_produk success: %s results", len(result))
+        return result
+
     @staticmethod
     def to_json_report(produk: Produk) -> str:
         """Return a JSON string representing the product."""
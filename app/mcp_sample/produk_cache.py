@@ -0,0 +1,130 @@
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+try:
+    from db_connection import connect
+except ImportError:  # imported as app.mcp_sample.produk_cache (app/main.py, streamlit_app.py)
+    from app.mcp_sample.db_connection import connect
+
+# Returned by get_item/get_all when the value is not cached
+MISSING = object()
+
+
+class ProdukCache:
+    """
+    In-process read-through cache for products.
+
+    Single products live in a bounded LRU (a cached None means "no such
+    product"); the full list is kept as one snapshot. Writes in this process
+    call invalidate(). Writes from other processes are noticed through
+    PRAGMA data_version, which changes whenever another connection commits
+    to the database file; it is read on a dedicated connection that never
+    writes, so every commit, including our own, is seen.
+
+    Callers get the cached objects themselves and must not modify them.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._items: "OrderedDict[int, Any]" = OrderedDict()
+        self._snapshot: Optional[List[Any]] = None
+        self._version = 0
+        self._database_name: Optional[str] = None
+        self._probe: Optional[sqlite3.Connection] = None
+        self._data_version: Optional[int] = None
+        self._lock = threading.RLock()
+
+    @property
+    def version(self) -> int:
+        """Bumped on every invalidation. Pass it back to put_* to drop values loaded before a write."""
+        return self._version
+
+    def get_item(self, database_name: str, produk_id: int) -> Any:
+        """Return the cached product (or None if known missing), else MISSING."""
+        with self._lock:
+            self._sync(database_name)
+            if produk_id in self._items:
+                self._items.move_to_end(produk_id)
+                self.hits += 1
+                return self._items[produk_id]
+            self.misses += 1
+            return MISSING
+
+    def put_item(self, produk_id: int, value: Any, version: int):
+        """Cache a product loaded while the cache was at `version`."""
+        with self._lock:
+            if version != self._version:
+                return  # a write happened while it was being loaded
+            self._items[produk_id] = value
+            self._items.move_to_end(produk_id)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def get_all(self, database_name: str) -> Any:
+        """Return the cached product list, else MISSING."""
+        with self._lock:
+            self._sync(database_name)
+            if self._snapshot is not None:
+                self.hits += 1
+                return self._snapshot
+            self.misses += 1
+            return MISSING
+
+    def put_all(self, values: List[Any], version: int):
+        """Cache the full product list loaded while the cache was at `version`."""
+        with self._lock:
+            if version == self._version:
+                self._snapshot = values
+
+    def invalidate(self, produk_id: Optional[int] = None):
+        """Forget one product (or, without an ID, every product) and the full list."""
+        with self._lock:
+            if produk_id is None:
+                self._items.clear()
+            else:
+                self._items.pop(produk_id, None)
+            self._snapshot = None
+            self._version += 1
+            self.invalidations += 1
+
+    def clear(self):
+        """Drop everything, including the data_version probe connection."""
+        with self._lock:
+            self.invalidate()
+            if self._probe is not None:
+                self._probe.close()
+            self._probe = None
+            self._database_name = None
+            self._data_version = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "items": len(self._items),
+                "snapshot": self._snapshot is not None,
+            }
+
+    def _sync(self, database_name: str):
+        if database_name != self._database_name:
+            self.clear()
+            self._probe = connect(database_name, check_same_thread=False)
+            self._database_name = database_name
+        data_version = self._probe.execute("PRAGMA data_version").fetchone()[0]
+        if data_version != self._data_version:
+            if self._data_version is not None:
+                self.invalidate()
+            self._data_version = data_version
+
+
+produk_cache = ProdukCache()
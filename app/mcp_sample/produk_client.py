@@ -1,70 +1,78 @@
-import mcp
-from mcp.client.stdio import stdio_client
 from mcp import StdioServerParameters
 from agents import FunctionTool # Assuming agents.py and FunctionTool are in the accessible path
 import json
-from typing import List, Dict, Any, Optional
+from typing import AsyncIterator, List, Dict, Any, Optional
 import os
 
+from app.config import Config
+from app.mcp_sample.mcp_session import MCPSessionPool, get_session_pool
+from app.mcp_sample.paging import iter_pages
+from app.mcp_sample.tool_registry import ToolSpec, get_tool_registry
 
-produk_params = StdioServerParameters(command="uv", args=["run", "app/mcp/produk_server.py"], env=None)
+
+produk_params = StdioServerParameters(command="uv", args=["run", "app/mcp_sample/produk_server.py"], env=None)
+
+def get_produk_pool() -> MCPSessionPool:
+    """Returns the shared pool of warm produk_server sessions."""
+    return get_session_pool("produk_server", produk_params, size=Config.MCP_POOL_SIZE)
 
 async def list_produk_tools() -> List[Any]: # Return type might be mcp.ToolDefinition
     """Lists all available tools from the produk_server."""
-    async with stdio_client(produk_params) as streams:
-        async with mcp.ClientSession(*streams) as session:
-            await session.initialize()
-            tools_result = await session.list_tools()
-            return tools_result.tools
+    return await get_produk_pool().list_tools()
 
 async def call_produk_tool(tool_name: str, tool_args: Dict[str, Any]) -> Any:
     """Calls a specific tool on the produk_server with given arguments."""
-    async with stdio_client(produk_params) as streams:
-        async with mcp.ClientSession(*streams) as session:
-            await session.initialize()
-            result = await session.call_tool(tool_name, tool_args)
-            return result
+    return await get_produk_pool().call_tool(tool_name, tool_args)
+
+async def call_produk_batch(operations: List[Dict[str, Any]], atomic: bool = True) -> List[Dict[str, Any]]:
+    """Runs several produk_server operations in a single batch_call round trip.
+       Each operation is {"tool": <name>, "args": {...}}. Returns one
+       {"index", "tool", "ok", "result", "error"} dict per operation.
+    """
+    tool_result = await call_produk_tool("batch_call", {"operations": operations, "atomic": atomic})
+    if tool_result.isError or not tool_result.content:
+        raise Exception(f"Tool call 'batch_call' failed. Result: {tool_result}")
+    return json.loads(tool_result.content[0].text)
+
+def iter_produk_pages(limit: int = 50, fields: Optional[List[str]] = None) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Streams the whole catalog from list_all_produk, one page of product dicts at a time."""
+    async def fetch_page(cursor: Optional[int]) -> str:
+        tool_result = await call_produk_tool("list_all_produk", {"cursor": cursor, "limit": limit, "fields": fields})
+        if tool_result.isError or not tool_result.content:
+            raise Exception(f"Tool call 'list_all_produk' failed. Result: {tool_result}")
+        return tool_result.content[0].text
+    return iter_pages(fetch_page)
 
 async def read_produk_resource(produk_id: int) -> Optional[str]:
     """Reads a specific product resource by its ID."""
-    async with stdio_client(produk_params) as streams:
-        async with mcp.ClientSession(*streams) as session:
-            await session.initialize()
-            resource_uri = f"produk://produk_server/item/{produk_id}"
-            result = await session.read_resource(resource_uri)
-            if result.contents and result.contents[0].text:
-                return result.contents[0].text
-            return None
-
-async def read_all_produk_resource() -> List[str]:
+    resource_uri = f"produk://produk_server/item/{produk_id}"
+    result = await get_produk_pool().read_resource(resource_uri)
+    if result.contents and result.contents[0].text:
+        return result.contents[0].text
+    return None
+
+async def read_all_produk_resource() -> List[Dict[str, Any]]:
     """Reads the resource listing all products."""
-    async with stdio_client(produk_params) as streams:
-        async with mcp.ClientSession(*streams) as session:
-            await session.initialize()
-            resource_uri = "produk://produk_server/all_items"
-            result = await session.read_resource(resource_uri)
-            # Assuming the resource returns a list of JSON strings directly in contents
-            return [content.text for content in result.contents if content.text]
+    resource_uri = "produk://produk_server/all_items"
+    result = await get_produk_pool().read_resource(resource_uri)
+    # The resource is a single JSON array of products
+    if result.contents and result.contents[0].text:
+        return json.loads(result.contents[0].text)
+    return []
+
+def _openai_tool(spec: ToolSpec) -> FunctionTool:
+    async def invoke(ctx: Any, args: Any) -> Any:
+        tool_args = json.loads(args) if isinstance(args, str) else args
+        spec.validate(tool_args)  # bad arguments from the LLM fail here, without a round trip
+        return await call_produk_tool(spec.name, tool_args)
+    return FunctionTool(name=spec.name, description=spec.description, params_json_schema=spec.input_schema, on_invoke_tool=invoke)
 
 async def get_produk_tools_openai() -> List[FunctionTool]:
-    """Gets all produk tools formatted for OpenAI function calling."""
-    openai_tools = []
-    tools = await list_produk_tools()
-    for tool in tools:
-        # Ensure inputSchema is correctly transformed if it's not directly a JSON schema dict
-        # Pydantic models in FastMCP usually generate compatible schemas.
-        schema = {**tool.inputSchema, "additionalProperties": False} if tool.inputSchema else {"type": "object", "properties": {}, "additionalProperties": False}
-        
-        openai_tool = FunctionTool(
-            name=tool.name,
-            description=tool.description,
-            params_json_schema=schema,
-            # Adjust lambda to correctly parse args if they are not already a JSON string
-            # And to handle the return from call_produk_tool (it might be parsed JSON or a string)
-            on_invoke_tool=lambda ctx, args, toolname=tool.name: call_produk_tool(toolname, json.loads(args) if isinstance(args, str) else args)
-        )
-        openai_tools.append(openai_tool)
-    return openai_tools
+    """Gets all produk tools formatted for OpenAI function calling.
+       Schemas are discovered and the FunctionTools built once per produk_server version.
+    """
+    registry = get_tool_registry(get_produk_pool())
+    return await registry.derived("openai", lambda specs: [_openai_tool(spec) for spec in specs])
 
 # Example Usage (requires an async runtime)
 async def main():
@@ -115,10 +123,8 @@ async def main():
 
     # Example: List all products
     print("\nListing all products...")
-    all_products_json_list = await call_produk_tool("list_all_produk", {})
-    print(f"All Products (JSON List): {all_products_json_list}")
-    # for p_json in all_products_json_list:
-    #     print(json.loads(p_json))
+    async for page in iter_produk_pages(limit=20, fields=["nama_barang", "harga", "stok"]):
+        print(f"Products page: {page}")
 
     # Example: Read product resource
     if product_id:
@@ -1,59 +1,67 @@
+import re
 import sqlite3
-from typing import Dict, Any, Optional, List
+from functools import partial
+from typing import Dict, Any, Optional, List, Tuple
 # from setup_logs import setup_logger
+try:
+    from db_connection import after_transaction, get_connection
+    from migrations import apply_migrations
+    from produk_cache import produk_cache
+except ImportError:  # imported as app.mcp_sample.produk_database (app/main.py, streamlit_app.py)
+    from app.mcp_sample.db_connection import after_transaction, get_connection
+    from app.mcp_sample.migrations import apply_migrations
+    from app.mcp_sample.produk_cache import produk_cache
 
 DATABASE_NAME = "src/data/warung.db"
 # logger = setup_logger("produk_database", log_filename="warung.log")
 # logger.info("========================== Produk Database Starting ==============================")
 
+def _invalidate_cached(produk_id: int):
+    """Drop the product from produk_cache once the write is committed (or rolled back).
+
+    Invalidating inside an open batch would let a read in the same batch put
+    uncommitted values back into the cache.
+    """
+    after_transaction(DATABASE_NAME, partial(produk_cache.invalidate, produk_id))
+
+# Full-text index over produk (created by migration 2, see migrations.py).
+# bm25() weights per column: nama_barang, lokasi, deskripsi_suara_lokasi.
+FTS_TABLE = "produk_fts"
+FTS_WEIGHTS = (10.0, 2.0, 1.0)
+
 def init_db():
-    """Drop and recreate the produk table."""
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-    
-    # Drop the table if it exists
-    cursor.execute("DROP TABLE IF EXISTS produk")
-    
-    # Recreate the table
-    cursor.execute("""
-        CREATE TABLE produk (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nama_barang TEXT NOT NULL,
-            harga INTEGER NOT NULL,
-            lokasi TEXT,
-            deskripsi_suara_lokasi TEXT,
-            path_qris TEXT,
-            stok INTEGER NOT NULL
-        )
-    """)
-    
-    conn.commit()
-    conn.close()
-    # logger.info("init_db success - dropped and recreated table")
+    """Create or upgrade the schema. Existing products are kept."""
+    apply_migrations(DATABASE_NAME)
+    # logger.info("init_db success - schema up to date")
+
+
+def has_products_in_db() -> bool:
+    """Return True if the produk table has at least one row."""
+    with get_connection(DATABASE_NAME) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM produk)")
+        return bool(cursor.fetchone()[0])
 
 
 def create_product_in_db(produk_data: Dict[str, Any]) -> int:
     """Create a new product in the database."""
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-    cursor.execute("""
-        INSERT INTO produk (nama_barang, harga, lokasi, deskripsi_suara_lokasi, path_qris, stok)
-        VALUES (:nama_barang, :harga, :lokasi, :deskripsi_suara_lokasi, :path_qris, :stok)
-    """, produk_data)
-    product_id = cursor.lastrowid
-    conn.commit()
-    conn.close()
+    with get_connection(DATABASE_NAME) as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO produk (nama_barang, harga, lokasi, deskripsi_suara_lokasi, path_qris, stok)
+            VALUES (:nama_barang, :harga, :lokasi, :deskripsi_suara_lokasi, :path_qris, :stok)
+        """, produk_data)
+        product_id = cursor.lastrowid
+    _invalidate_cached(product_id)
     # logger.info(f"create_product_in_db success, product_id={product_id}")
     return product_id
 
 def get_product_from_db(produk_id: int) -> Optional[Dict[str, Any]]:
     """Retrieve a product by its ID from the database."""
-    conn = sqlite3.connect(DATABASE_NAME)
-    conn.row_factory = sqlite3.Row  # Access columns by name
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM produk WHERE id = ?", (produk_id,))
-    row = cursor.fetchone()
-    conn.close()
+    with get_connection(DATABASE_NAME) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM produk WHERE id = ?", (produk_id,))
+        row = cursor.fetchone()
     if row:
         # logger.info(f"get_product_from_db success, data={dict(row)}")
         return dict(row)
@@ -62,42 +70,79 @@ def get_product_from_db(produk_id: int) -> Optional[Dict[str, Any]]:
 
 def get_all_products_from_db() -> List[Dict[str, Any]]:
     """Retrieve all products from the database."""
-    conn = sqlite3.connect(DATABASE_NAME)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM produk")
-    rows = cursor.fetchall()
-    conn.close()
+    with get_connection(DATABASE_NAME) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM produk")
+        rows = cursor.fetchall()
     # logger.info(f"get_all_products_from_db success, count={len(rows)}")
     return [dict(row) for row in rows]
 
+def get_products_page_from_db(after_id: int = 0, limit: int = 50) -> List[Dict[str, Any]]:
+    """Retrieve up to `limit` products with an ID greater than after_id, ordered by ID (keyset paging)."""
+    with get_connection(DATABASE_NAME) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM produk WHERE id > ? ORDER BY id LIMIT ?", (after_id, limit))
+        rows = cursor.fetchall()
+    # logger.info(f"get_products_page_from_db success, count={len(rows)}")
+    return [dict(row) for row in rows]
+
+def get_products_by_ids_from_db(produk_ids: List[int]) -> List[Dict[str, Any]]:
+    """Retrieve several products by ID in one query. Missing IDs are skipped."""
+    if not produk_ids:
+        return []
+    placeholders = ", ".join("?" for _ in produk_ids)
+    with get_connection(DATABASE_NAME) as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT * FROM produk WHERE id IN ({placeholders})", list(produk_ids))
+        rows = cursor.fetchall()
+    # logger.info(f"get_products_by_ids_from_db success, count={len(rows)}")
+    return [dict(row) for row in rows]
+
+def get_product_versions_from_db(produk_ids: List[int]) -> Dict[int, int]:
+    """Change counter per product ID (see migration 3); bumped when the name, price or location changes or the product is deleted."""
+    if not produk_ids:
+        return {}
+    placeholders = ", ".join("?" for _ in produk_ids)
+    with get_connection(DATABASE_NAME) as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT produk_id, version FROM produk_versions WHERE produk_id IN ({placeholders})", list(produk_ids))
+        versions = {row["produk_id"]: row["version"] for row in cursor.fetchall()}
+    return {produk_id: versions.get(produk_id, 0) for produk_id in produk_ids}
+
+def get_catalog_version_from_db() -> Tuple[int, int]:
+    """
+    (product count, sum of the change counters): changes when a product is added,
+    deleted, or its name, price or location changes; stock changes leave it as is.
+    """
+    with get_connection(DATABASE_NAME) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT (SELECT COUNT(*) FROM produk), (SELECT COALESCE(SUM(version), 0) FROM produk_versions)")
+        return tuple(cursor.fetchone())
+
 def update_product_in_db(produk_id: int, produk_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     """Update an existing product in the database."""
-    conn = sqlite3.connect(DATABASE_NAME)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    # Check if product exists
-    cursor.execute("SELECT * FROM produk WHERE id = ?", (produk_id,))
-    if not cursor.fetchone():
-        conn.close()
-        # logger.info(f"update_product_in_db success, data=None (not found)")
-        return None # Product not found
-
-    cursor.execute("""
-        UPDATE produk
-        SET nama_barang = :nama_barang,
-            harga = :harga,
-            lokasi = :lokasi,
-            deskripsi_suara_lokasi = :deskripsi_suara_lokasi,
-            path_qris = :path_qris,
-            stok = :stok
-        WHERE id = :id
-    """, {**produk_data, "id": produk_id})
-    conn.commit()
-    # Fetch the updated row
-    cursor.execute("SELECT * FROM produk WHERE id = ?", (produk_id,))
-    updated_row = cursor.fetchone()
-    conn.close()
+    with get_connection(DATABASE_NAME) as conn:
+        cursor = conn.cursor()
+        # Check if product exists
+        cursor.execute("SELECT * FROM produk WHERE id = ?", (produk_id,))
+        if not cursor.fetchone():
+            # logger.info(f"update_product_in_db success, data=None (not found)")
+            return None # Product not found
+
+        cursor.execute("""
+            UPDATE produk
+            SET nama_barang = :nama_barang,
+                harga = :harga,
+                lokasi = :lokasi,
+                deskripsi_suara_lokasi = :deskripsi_suara_lokasi,
+                path_qris = :path_qris,
+                stok = :stok
+            WHERE id = :id
+        """, {**produk_data, "id": produk_id})
+        # Fetch the updated row
+        cursor.execute("SELECT * FROM produk WHERE id = ?", (produk_id,))
+        updated_row = cursor.fetchone()
+    _invalidate_cached(produk_id)
     if updated_row:
         # logger.info(f"update_product_in_db success, data={dict(updated_row)}")
         return dict(updated_row)
@@ -105,29 +150,181 @@ def update_product_in_db(produk_id: int, produk_data: Dict[str, Any]) -> Optiona
     return None
 
 def get_product_by_name(produk_name: str) -> Optional[Dict[str, Any]]:
-    """Get a product by name (case-insensitive, partial match) from the database."""
-    conn = sqlite3.connect(DATABASE_NAME)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    query = "SELECT * FROM produk WHERE LOWER(nama_barang) LIKE ?"
-    like_pattern = f"%{produk_name.lower()}%"
-    cursor.execute(query, (like_pattern,))
-    row = cursor.fetchone()
-    conn.close()
-    if row:
-        # logger.info(f"get_product_by_name success, data={dict(row)}")
-        return dict(row)
+    """Get the best matching product by name (case-insensitive, partial match) from the database."""
+    rows = search_products_in_db(produk_name, limit=1)
+    if rows:
+        # logger.info(f"get_product_by_name success, data={rows[0]}")
+        return rows[0]
     # logger.info(f"get_product_by_name success, data=None")
     return None
 
+def _fts_match_expression(query: str, include_location: bool) -> Optional[str]:
+    """Turn free text into an FTS5 query: every word must match as a prefix."""
+    tokens = re.findall(r"\w+", query.lower())
+    if not tokens:
+        return None
+    expression = " ".join(f'"{token}"*' for token in tokens)
+    if include_location:
+        return expression
+    return f"nama_barang : ({expression})"
+
+def search_products_in_db(
+    query: str, limit: int = 5, offset: int = 0, include_location: bool = False
+) -> List[Dict[str, Any]]:
+    """Search products by name, best matches first.
+
+    Uses the FTS5 index: every word in `query` must match the start of a word
+    in the name (or, with include_location, in the location fields), ranked
+    by BM25. When the index has no hit at all for `query`, falls back to a
+    plain substring match on the name so partial words like "mie" still find
+    "Indomie". The choice depends only on `query`, not on `offset`, so every
+    page of one search comes from the same result set.
+    Only `limit` rows starting at `offset` are returned.
+    """
+    expression = _fts_match_expression(query, include_location)
+    if expression is None:
+        return []
+    with get_connection(DATABASE_NAME) as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"SELECT EXISTS (SELECT 1 FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :expression)",
+            {"expression": expression}
+        )
+        if cursor.fetchone()[0]:
+            cursor.execute(f"""
+                SELECT produk.* FROM {FTS_TABLE}
+                JOIN produk ON produk.id = {FTS_TABLE}.rowid
+                WHERE {FTS_TABLE} MATCH :expression
+                ORDER BY bm25({FTS_TABLE}, {", ".join(str(w) for w in FTS_WEIGHTS)}), produk.id
+                LIMIT :limit OFFSET :offset
+            """, {"expression": expression, "limit": limit, "offset": offset})
+            rows = cursor.fetchall()
+        else:
+            needle = query.lower().strip()
+            cursor.execute("""
+                SELECT * FROM produk
+                WHERE INSTR(LOWER(nama_barang), :needle) > 0
+                ORDER BY INSTR(LOWER(nama_barang), :needle), LENGTH(nama_barang), id
+                LIMIT :limit OFFSET :offset
+            """, {"needle": needle, "limit": limit, "offset": offset})
+            rows = cursor.fetchall()
+    # logger.info(f"search_products_in_db success, count={len(rows)}")
+    return [dict(row) for row in rows]
+
+class InsufficientStockError(ValueError):
+    """Raised when a stock decrement would make stok negative (or the product does not exist)."""
+
+    def __init__(self, produk_id: int, qty: int):
+        super().__init__(f"Stok produk ID {produk_id} tidak cukup untuk mengurangi {qty}")
+        self.produk_id = produk_id
+        self.qty = qty
+
+_DECREMENT_STOCK_SQL = """
+    UPDATE produk SET stok = stok - :qty
+    WHERE id = :produk_id AND (:allow_negative OR stok >= :qty)
+    RETURNING stok
+"""
+
+def decrement_stock(produk_id: int, qty: int, allow_negative: bool = False) -> Optional[int]:
+    """Atomically subtract `qty` from a product's stock and return the new stock.
+
+    The check and the write are one UPDATE statement, so concurrent sales of
+    the same product cannot overwrite each other. Returns None, without
+    changing anything, if the product does not exist or (unless
+    allow_negative) has less than `qty` in stock.
+    """
+    if qty <= 0:
+        raise ValueError(f"qty harus lebih dari 0, didapat {qty}")
+    with get_connection(DATABASE_NAME) as conn:
+        cursor = conn.cursor()
+        cursor.execute(_DECREMENT_STOCK_SQL, {"produk_id": produk_id, "qty": qty, "allow_negative": allow_negative})
+        row = cursor.fetchone()
+    if row:
+        _invalidate_cached(produk_id)
+    # logger.info(f"decrement_stock success, produk_id={produk_id}, new_stok={row['stok'] if row else None}")
+    return row["stok"] if row else None
+
+def decrement_stock_bulk(items: List[Dict[str, int]], allow_negative: bool = False) -> Dict[int, int]:
+    """Apply a whole basket of stock decrements in one transaction.
+
+    `items` is a list of {"produk_id": ..., "qty": ...}; repeated products are
+    summed. Either every decrement is applied or, if one product is missing
+    or short on stock, none is and InsufficientStockError is raised.
+    Returns the new stock per produk_id.
+    """
+    totals: Dict[int, int] = {}
+    for item in items:
+        if item["qty"] <= 0:
+            raise ValueError(f"qty harus lebih dari 0, didapat {item['qty']}")
+        totals[item["produk_id"]] = totals.get(item["produk_id"], 0) + item["qty"]
+
+    new_stock: Dict[int, int] = {}
+    with get_connection(DATABASE_NAME) as conn:
+        cursor = conn.cursor()
+        for produk_id, qty in totals.items():
+            cursor.execute(_DECREMENT_STOCK_SQL, {"produk_id": produk_id, "qty": qty, "allow_negative": allow_negative})
+            row = cursor.fetchone()
+            if row is None:
+                raise InsufficientStockError(produk_id, qty)  # rolls back the whole basket
+            new_stock[produk_id] = row["stok"]
+    for produk_id in new_stock:
+        _invalidate_cached(produk_id)
+    # logger.info(f"decrement_stock_bulk success, new_stock={new_stock}")
+    return new_stock
+
+_INCREMENT_STOCK_SQL = "UPDATE produk SET stok = stok + :qty WHERE id = :produk_id RETURNING stok"
+
+def increment_stock(produk_id: int, qty: int) -> Optional[int]:
+    """Atomically add `qty` to a product's stock (restock, returned goods) and return the new stock.
+
+    Like decrement_stock, the addition is done by the UPDATE itself, so it
+    cannot overwrite a concurrent sale and leaves the other columns alone.
+    Returns None if the product does not exist.
+    """
+    if qty <= 0:
+        raise ValueError(f"qty harus lebih dari 0, didapat {qty}")
+    with get_connection(DATABASE_NAME) as conn:
+        cursor = conn.cursor()
+        cursor.execute(_INCREMENT_STOCK_SQL, {"produk_id": produk_id, "qty": qty})
+        row = cursor.fetchone()
+    if row:
+        _invalidate_cached(produk_id)
+    # logger.info(f"increment_stock success, produk_id={produk_id}, new_stok={row['stok'] if row else None}")
+    return row["stok"] if row else None
+
+def increment_stock_bulk(items: List[Dict[str, int]]) -> Dict[int, int]:
+    """Add the quantities of several items back to stock in one transaction.
+
+    `items` is a list of {"produk_id": ..., "qty": ...}; repeated products are
+    summed. Products that no longer exist are skipped and left out of the
+    returned mapping of produk_id to new stock.
+    """
+    totals: Dict[int, int] = {}
+    for item in items:
+        if item["qty"] <= 0:
+            raise ValueError(f"qty harus lebih dari 0, didapat {item['qty']}")
+        totals[item["produk_id"]] = totals.get(item["produk_id"], 0) + item["qty"]
+
+    new_stock: Dict[int, int] = {}
+    with get_connection(DATABASE_NAME) as conn:
+        cursor = conn.cursor()
+        for produk_id, qty in totals.items():
+            cursor.execute(_INCREMENT_STOCK_SQL, {"produk_id": produk_id, "qty": qty})
+            row = cursor.fetchone()
+            if row is not None:
+                new_stock[produk_id] = row["stok"]
+    for produk_id in new_stock:
+        _invalidate_cached(produk_id)
+    # logger.info(f"increment_stock_bulk success, new_stock={new_stock}")
+    return new_stock
+
 def delete_product_from_db(produk_id: int) -> bool:
     """Delete a product by its ID from the database."""
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM produk WHERE id = ?", (produk_id,))
-    conn.commit()
-    deleted_rows = cursor.rowcount
-    conn.close()
+    with get_connection(DATABASE_NAME) as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM produk WHERE id = ?", (produk_id,))
+        deleted_rows = cursor.rowcount
+    _invalidate_cached(produk_id)
     # logger.info(f"delete_product_from_db success, deleted={deleted_rows > 0}")
     return deleted_rows > 0
 
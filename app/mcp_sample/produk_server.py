@@ -1,6 +1,10 @@
 from mcp.server.fastmcp import FastMCP
-from produk import ProdukService, Produk, ProdukCreationRequest # Import ProdukCreationRequest
+from produk import ProdukService, Produk, ProdukCreationRequest, StockDecrement, InsufficientStockError # Import ProdukCreationRequest
+import produk_database
+from batch import BatchOperation, execute_batch, to_json_report as batch_to_json_report
+from paging import DEFAULT_PAGE_LIMIT, check_fields, clamp_limit, to_page_json
 from typing import List, Optional
+import json
 from setup_logs import setup_logger
 # logger = setup_logger("produk_server", log_filename="warung.log")
 # logger.info("========================== produk_server Starting ==============================")
@@ -8,35 +12,61 @@ from setup_logs import setup_logger
 # (Assuming init_db() in produk_database.py is called upon import of produk.py or ProdukService instantiation)
 
 mcp = FastMCP("produk_server")
+# Reported to clients in the initialize handshake; they cache the tool schemas
+# per version (tool_registry.py), so bump it whenever a tool or its arguments change.
+# FastMCP() takes no version argument, so it is set on the underlying server.
+SERVER_VERSION = "1.1"
+mcp._mcp_server.version = SERVER_VERSION
 
-# @mcp.tool()
-# async def get_produk(produk_id: int) -> Optional[str]:
-#     """Get a product by its ID.
+SEARCH_LIMIT_MAX = 50
 
-#     Args:
-#         produk_id: The ID of the product to retrieve.
-#     """
-#     # logger.info("get_produk called with produk_id=%s", produk_id)
-#     produk = ProdukService.get_produk(produk_id)
-#     if produk:
-#         result = ProdukService.to_json_report(produk)
-#         # logger.info("get_produk success: %s", result)
-#         return result
-#     # logger.info("get_produk success: None")
-#     return None
+@mcp.tool()
+async def get_produk(produk_id: int) -> Optional[str]:
+    """Get a product by its ID.
+
+    Args:
+        produk_id: The ID of the product to retrieve.
+    """
+    # logger.info("get_produk called with produk_id=%s", produk_id)
+    produk = ProdukService.get_produk(produk_id)
+    if produk:
+        result = ProdukService.to_json_report(produk)
+        # logger.info("get_produk success: %s", result)
+        return result
+    # logger.info("get_produk success: None")
+    return None
 
 @mcp.tool()
-async def list_all_produk() -> List[str]:
-    """List all available products."""
-    # logger.info("list_all_produk called")
-    produk_list = ProdukService.get_all_produk()
-    result = [ProdukService.to_json_report(p) for p in produk_list]
+async def list_all_produk(cursor: Optional[int] = None, limit: int = DEFAULT_PAGE_LIMIT, fields: Optional[List[str]] = None) -> str:
+    """List available products a page at a time, ordered by ID.
+
+    Args:
+        cursor: next_cursor from the previous page; omit for the first page.
+        limit: Maximum number of products per page (default 50, max 200).
+        fields: Only return these fields, e.g. ["nama_barang", "harga", "stok"]. "id" is always included.
+
+    Returns:
+        A JSON object {"items": [...], "next_cursor": <id or null>}. Call again with
+        cursor=next_cursor until it is null. {"error"} if a field is unknown.
+    """
+    # logger.info("list_all_produk called with cursor=%s, limit=%s, fields=%s", cursor, limit, fields)
+    try:
+        fields = check_fields(fields, list(Produk.model_fields))
+    except ValueError as e:
+        return json.dumps({"error": str(e)})
+    limit = clamp_limit(limit)
+    produk_list = ProdukService.get_produk_page(after_id=cursor or 0, limit=limit + 1)
+    result = to_page_json(produk_list, limit, include=set(fields) if fields else None)
     # logger.info("list_all_produk success: %s", result)
     return result
 
-# @mcp.tool()
+@mcp.tool()
 async def get_produk_by_name(produk_name: str) -> Optional[str]:
-    """Get a product by its name."""
+    """Get the product whose name best matches `produk_name` (case-insensitive).
+
+    Args:
+        produk_name: Full or partial product name, e.g. "indomie".
+    """
     # logger.info("get_produk_by_name called with produk_name=%s", produk_name)
     produk = ProdukService.get_produk_by_name(produk_name)
     if produk:
@@ -46,6 +76,30 @@ async def get_produk_by_name(produk_name: str) -> Optional[str]:
     # logger.info("get_produk_by_name success: None")
     return None
 
+@mcp.tool()
+async def search_produk(query: str, limit: int = 5, offset: int = 0, include_location: bool = False) -> str:
+    """Search products by name and return only the best matches.
+
+    Every word in the query matches the start of a word in the name, so
+    "teh bot" finds "Teh Botol Sosro". Results are ranked by relevance.
+
+    Args:
+        query: Full or partial product name, e.g. "teh botol".
+        limit: Maximum number of products to return (default 5, max 50).
+        offset: Number of matches to skip, for paging through results.
+        include_location: Also search the location and location description, e.g. "rak minuman".
+
+    Returns:
+        A JSON array of products, best matches first. Empty if nothing matches.
+    """
+    # logger.info("search_produk called with query=%s, limit=%s, offset=%s", query, limit, offset)
+    limit = max(1, min(limit, SEARCH_LIMIT_MAX))
+    offset = max(0, offset)
+    produk_list = ProdukService.search_produk(query, limit=limit, offset=offset, include_location=include_location)
+    result = json.dumps([p.model_dump() for p in produk_list])
+    # logger.info("search_produk success: %s", result)
+    return result
+
 # @mcp.tool()
 # async def delete_produk(produk_id: int) -> bool:
 #     """Delete a product by its ID.
@@ -92,42 +146,117 @@ async def get_produk_by_name(produk_name: str) -> Optional[str]:
 #     return result
 
 # @mcp.tool()
-# async def update_produk(
-#     produk_id: int,
-#     nama_barang: str,
-#     harga: int,
-#     stok: int,
-#     lokasi: Optional[str] = None,
-#     deskripsi_suara_lokasi: Optional[str] = None,
-#     path_qris: Optional[str] = None
-# ) -> Optional[str]:
-#     """Update an existing product.
+async def update_produk(
+    produk_id: int,
+    nama_barang: str,
+    harga: int,
+    stok: int,
+    lokasi: Optional[str] = None,
+    deskripsi_suara_lokasi: Optional[str] = None,
+    path_qris: Optional[str] = None
+) -> Optional[str]:
+    """Update an existing product.
 
-#     Args:
-#         produk_id: The ID of the product to update.
-#         nama_barang: Nama barang yang dijual.
-#         harga: Harga barang dalam mata uang lokal (misal: Rupiah).
-#         stok: Jumlah stok barang yang tersedia.
-#         lokasi: Lokasi fisik barang di warung (opsional).
-#         deskripsi_suara_lokasi: Deskripsi lokasi barang untuk panduan suara (opsional).
-#         path_qris: Path ke gambar QRIS untuk pembayaran (opsional).
-#     """
-#     # logger.info("update_produk called with produk_id=%s, nama_barang=%s, harga=%s, stok=%s, lokasi=%s, deskripsi_suara_lokasi=%s, path_qris=%s", produk_id, nama_barang, harga, stok, lokasi, deskripsi_suara_lokasi, path_qris)
-#     produk_data = ProdukCreationRequest(
-#         nama_barang=nama_barang,
-#         harga=harga,
-#         stok=stok,
-#         lokasi=lokasi,
-#         deskripsi_suara_lokasi=deskripsi_suara_lokasi,
-#         path_qris=path_qris
-#     )
-#     updated_produk = ProdukService.update_produk(produk_id, produk_data)
-#     if updated_produk:
-#         result = ProdukService.to_json_report(updated_produk)
-#         # logger.info("update_produk success: %s", result)
-#         return result
-#     # logger.info("update_produk success: None")
-#     return None
+    Args:
+        produk_id: The ID of the product to update.
+        nama_barang: Nama barang yang dijual.
+        harga: Harga barang dalam mata uang lokal (misal: Rupiah).
+        stok: Jumlah stok barang yang tersedia.
+        lokasi: Lokasi fisik barang di warung (opsional).
+        deskripsi_suara_lokasi: Deskripsi lokasi barang untuk panduan suara (opsional).
+        path_qris: Path ke gambar QRIS untuk pembayaran (opsional).
+    """
+    # logger.info("update_produk called with produk_id=%s, nama_barang=%s, harga=%s, stok=%s, lokasi=%s, deskripsi_suara_lokasi=%s, path_qris=%s", produk_id, nama_barang, harga, stok, lokasi, deskripsi_suara_lokasi, path_qris)
+    produk_data = ProdukCreationRequest(
+        nama_barang=nama_barang,
+        harga=harga,
+        stok=stok,
+        lokasi=lokasi,
+        deskripsi_suara_lokasi=deskripsi_suara_lokasi,
+        path_qris=path_qris
+    )
+    updated_produk = ProdukService.update_produk(produk_id, produk_data)
+    if updated_produk:
+        result = ProdukService.to_json_report(updated_produk)
+        # logger.info("update_produk success: %s", result)
+        return result
+    # logger.info("update_produk success: None")
+    return None
+
+@mcp.tool()
+async def decrement_stock(produk_id: int, qty: int, allow_negative: bool = False) -> str:
+    """Subtract qty from a product's stock in one atomic step.
+
+    Args:
+        produk_id: The ID of the product.
+        qty: Quantity sold, must be greater than 0.
+        allow_negative: If true, stock may go below zero.
+
+    Returns:
+        A JSON object {"produk_id", "stok"} with the new stock, or {"error"} if the
+        product does not exist or has less than qty in stock (nothing is changed).
+    """
+    # logger.info("decrement_stock called with produk_id=%s, qty=%s", produk_id, qty)
+    try:
+        new_stok = ProdukService.decrement_stock(produk_id, qty, allow_negative=allow_negative)
+    except ValueError as e:
+        return json.dumps({"error": str(e)})
+    if new_stok is None:
+        return json.dumps({"error": f"Produk ID {produk_id} tidak ditemukan atau stok tidak cukup untuk {qty}"})
+    return json.dumps({"produk_id": produk_id, "stok": new_stok})
+
+@mcp.tool()
+async def decrement_stock_bulk(items: List[StockDecrement], allow_negative: bool = False) -> str:
+    """Subtract the quantities of a whole basket from stock, all or nothing.
+
+    Args:
+        items: Basket items, e.g. [{"produk_id": 1, "qty": 2}, {"produk_id": 3, "qty": 1}].
+        allow_negative: If true, stock may go below zero.
+
+    Returns:
+        A JSON object mapping produk_id to its new stock, or {"error", "produk_id"} if any
+        product is missing or short on stock; in that case no stock is changed.
+    """
+    # logger.info("decrement_stock_bulk called with items=%s", items)
+    try:
+        new_stock = ProdukService.decrement_stock_bulk([item.model_dump() for item in items], allow_negative=allow_negative)
+    except InsufficientStockError as e:
+        return json.dumps({"error": str(e), "produk_id": e.produk_id})
+    except ValueError as e:
+        return json.dumps({"error": str(e)})
+    return json.dumps(new_stock)
+
+# Operations that may be combined in one batch_call. update_produk is left out:
+# it rewrites the whole row including stok, which would undo concurrent
+# decrement_stock calls; stock only changes through the atomic stock operations.
+BATCH_HANDLERS = {
+    "get_produk": get_produk,
+    "get_produk_by_name": get_produk_by_name,
+    "search_produk": search_produk,
+    "list_all_produk": list_all_produk,
+    "decrement_stock": decrement_stock,
+    "decrement_stock_bulk": decrement_stock_bulk,
+}
+
+@mcp.tool()
+async def batch_call(operations: List[BatchOperation], atomic: bool = True) -> str:
+    """Run several product operations in one call and one database transaction.
+
+    Args:
+        operations: List of sub-operations, each {"tool": <name>, "args": {...}}.
+            Available tools: get_produk, get_produk_by_name, search_produk, list_all_produk,
+            decrement_stock, decrement_stock_bulk.
+            Example: [{"tool": "get_produk", "args": {"produk_id": 1}},
+                      {"tool": "get_produk_by_name", "args": {"produk_name": "aqua"}}]
+        atomic: If true, any failing operation rolls back the whole batch.
+            If false, only the failing operations are rolled back.
+
+    Returns:
+        A JSON array with one result per operation: {"index", "tool", "ok", "result", "error"}.
+    """
+    # logger.info("batch_call called with operations=%s, atomic=%s", operations, atomic)
+    results = await execute_batch(operations, BATCH_HANDLERS, produk_database.DATABASE_NAME, atomic=atomic)
+    return batch_to_json_report(results)
 
 @mcp.resource("produk://produk_server/item/{produk_id}")
 async def read_produk_resource(produk_id: int) -> Optional[str]:
@@ -141,13 +270,17 @@ async def read_produk_resource(produk_id: int) -> Optional[str]:
     return None # Or raise a resource not found error
 
 @mcp.resource("produk://produk_server/all_items")
-async def read_all_produk_resource() -> List[str]:
+async def read_all_produk_resource() -> str:
     # logger.info("read_all_produk_resource called")
-    produk_list = ProdukService.get_all_produk()
-    result = [ProdukService.to_json_report(p) for p in produk_list]
+    result = ProdukService.get_all_produk_json()
     # logger.info("read_all_produk_resource success: %s", result)
     return result
 
+@mcp.resource("produk://produk_server/cache_stats")
+async def read_cache_stats_resource() -> str:
+    """Hit/miss counters of the product cache."""
+    return json.dumps(ProdukService.cache_stats())
+
 
 if __name__ == "__main__":
     mcp.run(transport='stdio')
\ No newline at end of file
@@ -0,0 +1,167 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional
+
+try:
+    from fuzzy_index import words
+    from intent_router import CONTEXT_WORDS, MUTATING_WORDS, normalize
+except ImportError:  # imported as app.mcp_sample.response_cache (app/main.py)
+    from app.mcp_sample.fuzzy_index import words
+    from app.mcp_sample.intent_router import CONTEXT_WORDS, MUTATING_WORDS, normalize
+
+# Looks up the current change counter of each product ID, e.g.
+# produk_database.get_product_versions_from_db
+VersionLookup = Callable[[List[int]], Dict[int, int]]
+
+
+class _Entry(NamedTuple):
+    answer: str
+    versions: Dict[int, int]
+    expires_at: float
+
+
+def cache_key(message: str) -> Optional[str]:
+    """
+    The cache key of a chat message, or None if its answer must not be cached.
+
+    Only self-contained questions qualify: nothing about creating, changing
+    or cancelling an order, no reference back to the conversation ("yang
+    itu", "harganya"), and no bare numbers, which are quantities or order IDs.
+    """
+    key = normalize(message).rstrip(" ?.!")
+    message_words = set(words(key))
+    if not message_words or message_words & (MUTATING_WORDS | CONTEXT_WORDS):
+        return None
+    if any(w.isdigit() for w in message_words):
+        return None
+    return key
+
+
+def cacheable_products(tool_names: List[str], tool_results: List[str], cacheable_tools: Iterable[str]) -> Optional[Dict[int, Dict[str, Any]]]:
+    """
+    The products (ID -> row) an answer was built from, or None if it must not be cached.
+
+    `tool_names` are the tools called in the turn and `tool_results` their
+    outputs. The turn qualifies only if it called nothing but
+    `cacheable_tools`, and each result is one product row without `stok`.
+    Stock changes with every sale without bumping produk_versions, so an
+    answer that saw it could go stale unnoticed.
+    """
+    if not tool_names or any(name not in cacheable_tools for name in tool_names):
+        return None
+    products = {}
+    for content in tool_results:
+        try:
+            result = json.loads(content)
+        except (TypeError, ValueError):
+            return None
+        if not isinstance(result, dict) or "error" in result or "id" not in result or "stok" in result:
+            return None
+        products[result["id"]] = result
+    return products
+
+
+def mentions_product(message: str, nama_barang: Iterable[str]) -> bool:
+    """True if the message contains a word of one of the product names."""
+    message_words = set(words(message))
+    return any(message_words & set(words(name)) for name in nama_barang)
+
+
+class ResponseCache:
+    """
+    LRU + TTL cache of agent answers to repeated product questions.
+
+    An answer is stored with the change counters of the products it was
+    built from (produk_versions, see migration 3). get() compares
+    them with the current counters, so an answer is dropped as soon as the
+    name, price or location of one of its products changes, or the product
+    is deleted, by any process. Stock is not tracked, so only answers built
+    without it may be stored (see cacheable_products). Entries also expire
+    after `ttl_seconds`, and the least recently used one is evicted beyond
+    `maxsize`.
+
+    Callers decide which turns are safe to store (read-only tools); the
+    cache itself refuses messages for which cache_key() returns None.
+    """
+
+    def __init__(self, maxsize: int = 1000, ttl_seconds: float = 600, clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.stale = 0
+        self.expired = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, message: str, current_versions: VersionLookup) -> Optional[str]:
+        """The cached answer for `message` if it is still valid, else None."""
+        key = cache_key(message)
+        if key is None:
+            with self._lock:
+                self.bypassed += 1
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires_at <= self._clock():
+                del self._entries[key]
+                self.expired += 1
+                self.misses += 1
+                return None
+        # Outside the lock: this reads the database
+        if entry.versions and current_versions(list(entry.versions)) != entry.versions:
+            with self._lock:
+                if self._entries.get(key) is entry:
+                    del self._entries[key]
+                self.stale += 1
+                self.misses += 1
+            return None
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self.hits += 1
+        return entry.answer
+
+    def put(self, message: str, answer: str, versions: Dict[int, int]) -> bool:
+        """Cache `answer`, built from the products in `versions` (ID -> change counter). Returns False if refused."""
+        key = cache_key(message)
+        if key is None or not answer:
+            return False
+        with self._lock:
+            if key in self._entries:
+                del self._entries[key]
+            self._entries[key] = _Entry(answer, dict(versions), self._clock() + self.ttl_seconds)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit rate over cacheable messages, plus why the others missed."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "bypassed": self.bypassed,
+                "stale": self.stale,
+                "expired": self.expired,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+            }
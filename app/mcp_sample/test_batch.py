@@ -0,0 +1,68 @@
+import asyncio
+import json
+
+import pytest
+
+import produk_database
+from batch import BatchOperation, execute_batch
+from produk import ProdukService
+from produk_server import BATCH_HANDLERS, batch_call
+
+
+@pytest.fixture
+def produk_db(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "warung.db")
+    monkeypatch.setattr(produk_database, "DATABASE_NAME", db_path)
+    produk_database.init_db()
+    produk_database.create_product_in_db({
+        "nama_barang": "Indomie Goreng",
+        "harga": 3000,
+        "lokasi": "Rak Mie Instan",
+        "deskripsi_suara_lokasi": "Ada di rak tengah, bagian mie instan.",
+        "path_qris": "/qris/indomie_goreng.png",
+        "stok": 50
+    })
+    return db_path
+
+
+def _sell(produk_id: int, qty: int) -> BatchOperation:
+    return BatchOperation(tool="decrement_stock", args={"produk_id": produk_id, "qty": qty})
+
+
+class TestBatchCall:
+    def test_batch_call_returns_per_item_results(self, produk_db):
+        operations = [
+            BatchOperation(tool="get_produk", args={"produk_id": 1}),
+            BatchOperation(tool="get_produk_by_name", args={"produk_name": "indomie"}),
+        ]
+        results = json.loads(asyncio.run(batch_call(operations)))
+
+        assert [r["ok"] for r in results] == [True, True]
+        assert json.loads(results[0]["result"])["nama_barang"] == "Indomie Goreng"
+        assert json.loads(results[1]["result"])["id"] == 1
+
+    def test_atomic_batch_rolls_back_everything(self, produk_db):
+        operations = [_sell(1, 40), BatchOperation(tool="unknown_tool")]
+        results = asyncio.run(execute_batch(operations, BATCH_HANDLERS, produk_db, atomic=True))
+
+        assert [r.ok for r in results] == [False, False]
+        assert ProdukService.get_produk(1).stok == 50
+
+    def test_non_atomic_batch_keeps_successful_items(self, produk_db):
+        operations = [
+            _sell(1, 40),
+            BatchOperation(tool="decrement_stock", args={"produk_id": 1}),
+            BatchOperation(tool="get_produk", args={"produk_id": 1}),
+        ]
+        results = asyncio.run(execute_batch(operations, BATCH_HANDLERS, produk_db, atomic=False))
+
+        assert [r.ok for r in results] == [True, False, True]
+        assert ProdukService.get_produk(1).stok == 10
+
+
+def test_update_produk_cannot_overwrite_stock_in_a_batch(produk_db):
+    operations = [BatchOperation(tool="update_produk", args={"produk_id": 1, "nama_barang": "Indomie Goreng", "harga": 3000, "stok": 999})]
+    results = asyncio.run(execute_batch(operations, BATCH_HANDLERS, produk_db, atomic=True))
+
+    assert not results[0].ok
+    assert ProdukService.get_produk(1).stok == 50
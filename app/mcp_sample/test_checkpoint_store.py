@@ -0,0 +1,287 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import Annotated, List, TypedDict
+
+import aiosqlite
+import pytest
+from langchain_core.messages import AIMessage, AnyMessage, HumanMessage
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from langgraph.graph import END, StateGraph
+from langgraph.graph.message import add_messages
+
+from checkpoint_store import CheckpointMaintenance, CheckpointStore, prepare_checkpoint_db, uuid6_prefix
+
+# Same tables as langgraph.checkpoint.sqlite creates
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT,
+    checkpoint BLOB,
+    metadata BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT,
+    value BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+"""
+
+
+def _checkpoint_id(timestamp: float, seq: int) -> str:
+    """A UUIDv6 string as langgraph's uuid6() makes it."""
+    return f"{uuid6_prefix(timestamp)}-8{seq:03x}-000000000000"
+
+
+@pytest.fixture
+def memory_db(tmp_path):
+    db_path = str(tmp_path / "memory.sqlite")
+    conn = sqlite3.connect(db_path)
+    conn.executescript(SCHEMA)
+    conn.close()
+    return db_path
+
+
+def _add_checkpoints(db_path: str, thread_id: str, count: int, started: float):
+    conn = sqlite3.connect(db_path)
+    with conn:
+        for seq in range(count):
+            checkpoint_id = _checkpoint_id(started + seq, seq)
+            conn.execute(
+                "INSERT INTO checkpoints (thread_id, checkpoint_id, checkpoint) VALUES (?, ?, ?)",
+                (thread_id, checkpoint_id, b"x" * 4096),
+            )
+            conn.execute(
+                "INSERT INTO writes (thread_id, checkpoint_id, task_id, idx, channel) VALUES (?, ?, 't', 0, 'messages')",
+                (thread_id, checkpoint_id),
+            )
+    conn.close()
+
+
+def _rows(db_path: str, table: str, thread_id: str):
+    conn = sqlite3.connect(db_path)
+    rows = [row[0] for row in conn.execute(f"SELECT checkpoint_id FROM {table} WHERE thread_id = ? ORDER BY checkpoint_id", (thread_id,))]
+    conn.close()
+    return rows
+
+
+def test_uuid6_prefix_sorts_by_time():
+    earlier, later = uuid6_prefix(1_700_000_000.0), uuid6_prefix(1_700_000_000.5)
+    assert earlier < _checkpoint_id(1_700_000_000.2, 1) < later
+    assert len(earlier) == 18 and earlier[14] == "6"
+
+
+def test_keeps_only_the_newest_checkpoints(memory_db):
+    now = time.time()
+    _add_checkpoints(memory_db, "a", 10, now - 100)
+    _add_checkpoints(memory_db, "b", 2, now - 100)
+    newest = _rows(memory_db, "checkpoints", "a")[-3:]
+
+    result = CheckpointMaintenance(memory_db, keep_last=3).run_once()
+
+    assert result == {"checkpoints_pruned": 7, "threads_evicted": 0}
+    assert _rows(memory_db, "checkpoints", "a") == newest
+    assert _rows(memory_db, "writes", "a") == newest
+    assert len(_rows(memory_db, "checkpoints", "b")) == 2
+
+
+def test_evicts_idle_threads(memory_db):
+    now = time.time()
+    _add_checkpoints(memory_db, "idle", 3, now - 7200)
+    _add_checkpoints(memory_db, "active", 3, now - 60)
+
+    result = CheckpointMaintenance(memory_db, ttl_seconds=3600).run_once()
+
+    assert result["threads_evicted"] == 1
+    assert _rows(memory_db, "checkpoints", "idle") == []
+    assert _rows(memory_db, "writes", "idle") == []
+    assert len(_rows(memory_db, "checkpoints", "active")) == 3
+
+
+def test_compaction_shrinks_the_file(memory_db):
+    prepare_checkpoint_db(memory_db)
+    _add_checkpoints(memory_db, "a", 200, time.time() - 100)
+    maintenance = CheckpointMaintenance(memory_db, keep_last=1)
+    maintenance.run_once()  # checkpoints the WAL into the file
+    _add_checkpoints(memory_db, "a", 200, time.time() - 50)
+    maintenance.run_once()
+    size_after_first_cleanup = os.path.getsize(memory_db)
+
+    for _ in range(3):
+        _add_checkpoints(memory_db, "a", 200, time.time() - 10)
+        maintenance.run_once()
+
+    assert os.path.getsize(memory_db) <= size_after_first_cleanup
+    wal = memory_db + "-wal"  # removed when the last connection closes, otherwise truncated
+    assert not os.path.exists(wal) or os.path.getsize(wal) == 0
+
+
+def test_database_without_checkpoints_yet(tmp_path):
+    db_path = str(tmp_path / "fresh.sqlite")
+    assert CheckpointMaintenance(db_path).run_once() == {"checkpoints_pruned": 0, "threads_evicted": 0}
+
+
+def test_background_failures_are_logged_and_retried(memory_db, monkeypatch, caplog):
+    maintenance = CheckpointMaintenance(memory_db, interval_seconds=0.01)
+    calls = []
+
+    def locked():
+        calls.append(1)
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(maintenance, "run_once", locked)
+
+    async def scenario():
+        maintenance.start()
+        await asyncio.sleep(0.2)
+        maintenance.stop()
+
+    asyncio.run(scenario())
+    assert len(calls) >= 2
+    assert "Checkpoint maintenance failed, retrying in 0.01s: database is locked" in caplog.text
+
+
+def _echo_graph(checkpointer):
+    class State(TypedDict):
+        messages: Annotated[List[AnyMessage], add_messages]
+
+    def echo(state: State):
+        return {"messages": [AIMessage(content=f"echo {state['messages'][-1].content}")]}
+
+    workflow = StateGraph(State)
+    workflow.add_node("echo", echo)
+    workflow.set_entry_point("echo")
+    workflow.add_edge("echo", END)
+    return workflow.compile(checkpointer=checkpointer)
+
+
+class TestWithAsyncSqliteSaver:
+    """Drives the real LangGraph saver, as app/main.py does, with maintenance running next to it."""
+
+    def _run(self, db_path: str, maintenance: CheckpointMaintenance, turns: int):
+        async def scenario():
+            prepare_checkpoint_db(db_path)
+            conn = await aiosqlite.connect(db_path)
+            await conn.execute("PRAGMA journal_mode=WAL")
+            try:
+                graph = _echo_graph(AsyncSqliteSaver(conn))
+                for thread_id in ("a", "b"):
+                    config = {"configurable": {"thread_id": thread_id}}
+                    for turn in range(turns):
+                        await graph.ainvoke({"messages": [HumanMessage(content=f"{thread_id}{turn}")]}, config)
+                # Runs on its own connection while the saver's stays open
+                result = await asyncio.to_thread(maintenance.run_once)
+                states = {}
+                for thread_id in ("a", "b"):
+                    config = {"configurable": {"thread_id": thread_id}}
+                    state = await graph.aget_state(config)
+                    history = [c async for c in graph.checkpointer.alist(config)]
+                    states[thread_id] = ([m.content for m in state.values.get("messages", [])], len(history))
+                # The saver keeps working on the pruned thread
+                await graph.ainvoke({"messages": [HumanMessage(content="lagi")]}, {"configurable": {"thread_id": "a"}})
+                after = await graph.aget_state({"configurable": {"thread_id": "a"}})
+                return result, states, [m.content for m in after.values.get("messages", [])]
+            finally:
+                await conn.close()
+
+        return asyncio.run(scenario())
+
+    def test_prunes_saver_checkpoints_and_keeps_the_latest_state(self, tmp_path):
+        db_path = str(tmp_path / "memory.sqlite")
+        result, states, after = self._run(db_path, CheckpointMaintenance(db_path, keep_last=2), turns=3)
+
+        # Each turn writes 3 checkpoints (input, start, echo): 9 per thread, 2 kept
+        assert result == {"checkpoints_pruned": 14, "threads_evicted": 0}
+        expected = ["a0", "echo a0", "a1", "echo a1", "a2", "echo a2"]
+        assert states["a"] == (expected, 2)
+        assert states["b"][1] == 2
+        assert after == expected + ["lagi", "echo lagi"]
+
+    def test_evicts_saver_threads(self, tmp_path):
+        db_path = str(tmp_path / "memory.sqlite")
+        result, states, after = self._run(db_path, CheckpointMaintenance(db_path, ttl_seconds=-60), turns=1)
+
+        assert result["threads_evicted"] == 2
+        assert states == {"a": ([], 0), "b": ([], 0)}
+        assert after == ["lagi", "echo lagi"]
+
+
+class CountingMaintenance(CheckpointMaintenance):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.runs = 0
+
+    def run_once(self):
+        self.runs += 1
+        return super().run_once()
+
+
+class TestCheckpointStore:
+    """app/main.py starts up on one event loop and Gradio serves predict_fn on another, in its own thread."""
+
+    @staticmethod
+    def _serve(store: CheckpointStore, turns: int):
+        """Run a few chat turns on a fresh loop in another thread, then give maintenance time to run."""
+        async def scenario():
+            graph = _echo_graph(await store.open())
+            config = {"configurable": {"thread_id": "a"}}
+            for turn in range(turns):
+                await graph.ainvoke({"messages": [HumanMessage(content=str(turn))]}, config)
+            await asyncio.sleep(0.3)
+            history = [c async for c in graph.checkpointer.alist(config)]
+            state = await graph.aget_state(config)
+            await store.close()
+            return len(history), [m.content for m in state.values["messages"]]
+
+        loop = asyncio.new_event_loop()
+        server = threading.Thread(target=loop.run_forever, daemon=True)
+        server.start()
+        try:
+            return asyncio.run_coroutine_threadsafe(scenario(), loop).result(timeout=30)
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            server.join()
+            loop.close()
+
+    @pytest.mark.parametrize("closed_after_startup", [True, False])
+    def test_maintenance_runs_on_the_serving_loop(self, tmp_path, closed_after_startup):
+        db_path = str(tmp_path / "memory.sqlite")
+        maintenance = CountingMaintenance(db_path, keep_last=2, interval_seconds=0.05)
+        store = CheckpointStore(maintenance)
+
+        async def startup():
+            await store.open()
+            if closed_after_startup:
+                await store.close()
+
+        asyncio.run(startup())
+        runs_at_startup = maintenance.runs
+
+        history, messages = self._serve(store, turns=3)
+
+        assert maintenance.runs > runs_at_startup
+        assert history == 2
+        assert messages == ["0", "echo 0", "1", "echo 1", "2", "echo 2"]
+
+    def test_open_is_shared_within_a_loop(self, tmp_path):
+        store = CheckpointStore(CheckpointMaintenance(str(tmp_path / "memory.sqlite")))
+
+        async def scenario():
+            savers = await asyncio.gather(*(store.open() for _ in range(5)))
+            await store.close()
+            return savers
+
+        savers = asyncio.run(scenario())
+        assert all(saver is savers[0] for saver in savers)
@@ -0,0 +1,99 @@
+import asyncio
+import threading
+
+import pytest
+
+from db_connection import batch_transaction, close_connections, get_connection
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / "warung.db")
+    with get_connection(path) as conn:
+        conn.execute("CREATE TABLE produk (id INTEGER PRIMARY KEY, stok INTEGER NOT NULL)")
+        conn.execute("INSERT INTO produk (id, stok) VALUES (1, 10)")
+    yield path
+    close_connections()
+
+
+def _stok(path: str) -> int:
+    with get_connection(path) as conn:
+        return conn.execute("SELECT stok FROM produk WHERE id = 1").fetchone()["stok"]
+
+
+class TestGetConnection:
+    def test_uses_wal_and_reuses_connection(self, db_path):
+        with get_connection(db_path) as first:
+            assert first.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        with get_connection(db_path) as second:
+            assert second is first
+
+    def test_connection_per_thread(self, db_path):
+        with get_connection(db_path) as main_conn:
+            pass
+        other = []
+
+        def worker():
+            with get_connection(db_path) as conn:
+                other.append(conn)
+
+        thread = threading.Thread(target=worker)
+        thread.start()
+        thread.join()
+        assert other[0] is not main_conn
+
+    def test_nested_block_is_rolled_back_with_outer(self, db_path):
+        with pytest.raises(RuntimeError):
+            with get_connection(db_path) as conn:
+                conn.execute("UPDATE produk SET stok = 5 WHERE id = 1")
+                with get_connection(db_path) as inner:
+                    inner.execute("UPDATE produk SET stok = stok - 1 WHERE id = 1")
+                raise RuntimeError("boom")
+        assert _stok(db_path) == 10
+
+    def test_batch_commits_once(self, db_path):
+        with batch_transaction(db_path):
+            with get_connection(db_path) as conn:
+                conn.execute("UPDATE produk SET stok = 7 WHERE id = 1")
+        assert _stok(db_path) == 7
+
+    def test_batch_runs_on_cached_connection(self, db_path):
+        with get_connection(db_path) as cached:
+            pass
+        with batch_transaction(db_path) as conn:
+            assert conn is cached
+            conn.execute("UPDATE produk SET stok = 3 WHERE id = 1")
+        assert not cached.in_transaction
+        assert _stok(db_path) == 3
+
+    def test_batch_rolls_back_on_error(self, db_path):
+        with pytest.raises(RuntimeError):
+            with batch_transaction(db_path):
+                with get_connection(db_path) as conn:
+                    conn.execute("UPDATE produk SET stok = 0 WHERE id = 1")
+                raise RuntimeError("boom")
+        assert _stok(db_path) == 10
+
+    def test_other_context_does_not_join_batch(self, db_path):
+        async def scenario():
+            entered, release = asyncio.Event(), asyncio.Event()
+
+            async def batch():
+                with pytest.raises(RuntimeError):
+                    with batch_transaction(db_path) as conn:
+                        conn.execute("UPDATE produk SET stok = 0 WHERE id = 1")
+                        entered.set()
+                        await release.wait()
+                        raise RuntimeError("boom")
+
+            async def reader():
+                await entered.wait()
+                stok = _stok(db_path)  # must not see the batch's uncommitted write
+                release.set()
+                return stok
+
+            _, stok = await asyncio.gather(batch(), reader())
+            return stok
+
+        assert asyncio.run(scenario()) == 10
+        assert _stok(db_path) == 10
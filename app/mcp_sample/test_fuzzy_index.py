@@ -0,0 +1,43 @@
+from fuzzy_index import TrigramIndex, trigrams
+
+NAMES = {
+    1: "Aqua Botol 600ml",
+    2: "Indomie Goreng",
+    3: "Chitato Sapi Panggang",
+    4: "Indomie Soto",
+}
+
+
+def _index() -> TrigramIndex:
+    index = TrigramIndex()
+    index.build(NAMES.items())
+    return index
+
+
+class TestTrigramIndex:
+    def test_trigrams_are_padded(self):
+        assert trigrams("aqua") == {"  a", " aq", "aqu", "qua", "ua "}
+
+    def test_matches_misspelled_names(self):
+        index = _index()
+        assert index.search("akua")[0][0] == 1
+        assert index.search("indomi goreng")[0][0] == 2
+        assert index.search("chitatoo")[0][0] == 3
+
+    def test_ranks_by_similarity(self):
+        keys = [key for key, _ in _index().search("indomie goreng")]
+        assert keys == [2, 4]
+
+    def test_incremental_add_and_remove(self):
+        index = _index()
+        index.add(2, "Sarimi Soto")
+        index.remove(3)
+
+        assert index.search("sarimi")[0][0] == 2
+        assert all(key != 2 for key, _ in index.search("goreng"))
+        assert index.search("chitato") == []
+        assert len(index) == 3
+
+    def test_no_match(self):
+        assert _index().search("xyz") == []
+        assert _index().search("") == []
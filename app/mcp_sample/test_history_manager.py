@@ -0,0 +1,107 @@
+import asyncio
+import datetime
+
+from history_manager import ConversationMemory, HistoryManager, clip_to_tokens, estimate_tokens, extractive_summary
+
+TS = datetime.datetime(2025, 6, 4, 10, 0, 0)
+
+
+class FakeSummarizer:
+    def __init__(self, fail: bool = False):
+        self.prompts = []
+        self.fail = fail
+
+    async def __call__(self, prompt: str) -> str:
+        self.prompts.append(prompt)
+        if self.fail:
+            raise RuntimeError("LLM down")
+        return f"ringkasan {len(self.prompts)}"
+
+
+def _add_turns(memory: ConversationMemory, count: int, start: int = 0):
+    for i in range(start, start + count):
+        asyncio.run(memory.add_turn(f"pesan {i} " + "x" * 200, f"jawaban {i} " + "y" * 200, timestamp=TS))
+
+
+class TestFoldCount:
+    def test_fits_in_budget(self):
+        manager = HistoryManager(max_tokens=1000, keep_last_turns=2)
+        assert manager.fold_count([100] * 9) == 0
+
+    def test_overflow_keeps_last_turns(self):
+        manager = HistoryManager(max_tokens=1000, keep_last_turns=2, summary_max_tokens=100)
+        assert manager.fold_count([100] * 11) == 9
+
+    def test_large_recent_turns_are_folded_too(self):
+        manager = HistoryManager(max_tokens=1000, keep_last_turns=3, summary_max_tokens=100)
+        assert manager.fold_count([100, 100, 700, 300, 300]) == 3
+
+    def test_newest_turn_is_always_kept(self):
+        manager = HistoryManager(max_tokens=100, keep_last_turns=2)
+        assert manager.fold_count([50, 5000]) == 1
+
+    def test_pinned_order_counts_against_budget(self):
+        manager = HistoryManager(max_tokens=1000, keep_last_turns=2)
+        order = {"id": 1, "catatan": "z" * 400}
+        assert manager.fold_count([100] * 9) == 0
+        assert manager.fold_count([100] * 9, open_order=order) > 0
+
+
+class TestConversationMemory:
+    def test_one_summary_per_overflow(self):
+        summarizer = FakeSummarizer()
+        memory = ConversationMemory(HistoryManager(max_tokens=1000, keep_last_turns=2, summary_max_tokens=50, summarize=summarizer))
+
+        _add_turns(memory, 8)
+
+        # ~121 tokens per turn: the 9th turn overflows, then 7 more fit next to the 2 kept turns
+        assert len(summarizer.prompts) == 0
+        _add_turns(memory, 1, start=8)
+        assert len(summarizer.prompts) == 1
+        assert len(memory.turns) == 2
+        _add_turns(memory, 6, start=9)
+        assert len(summarizer.prompts) == 1
+        _add_turns(memory, 1, start=15)
+        assert len(summarizer.prompts) == 2
+        assert "ringkasan 1" in summarizer.prompts[1]  # summarized incrementally
+        assert memory.summary == "ringkasan 2"
+
+    def test_prompt_stays_within_budget(self):
+        memory = ConversationMemory(HistoryManager(max_tokens=1000, keep_last_turns=2, summary_max_tokens=50, summarize=FakeSummarizer()))
+        for start in range(0, 100, 10):
+            _add_turns(memory, 10, start=start)
+            assert estimate_tokens(memory.render("halo")) < 1000 + 50
+
+    def test_open_order_is_pinned(self):
+        memory = ConversationMemory(HistoryManager(max_tokens=1000, keep_last_turns=2, summarize=FakeSummarizer()))
+        memory.set_open_order({"id": 12, "items": [{"produk": "Indomie Goreng", "qty": 2}]})
+        _add_turns(memory, 30)
+
+        prompt = memory.render("jadi totalnya berapa?")
+
+        assert '"id": 12' in prompt and "Indomie Goreng" in prompt
+        assert "pesan 0 " not in prompt
+        assert prompt.rstrip().endswith("Pesan terbaru dari pembeli: jadi totalnya berapa?")
+
+    def test_summarizer_failure_falls_back_to_extractive(self):
+        summarizer = FakeSummarizer(fail=True)
+        memory = ConversationMemory(HistoryManager(max_tokens=1000, keep_last_turns=2, summary_max_tokens=50, summarize=summarizer))
+        _add_turns(memory, 10)
+
+        assert len(summarizer.prompts) == 1
+        # The end of the newest folded turn (jawaban 6), within the summary budget
+        assert memory.summary == "y" * 200
+        assert estimate_tokens(memory.summary) <= 50
+
+
+def test_clip_to_tokens():
+    assert clip_to_tokens("pendek", 10) == "pendek"
+    assert clip_to_tokens("satu dua tiga empat lima", 3) == "satu dua ..."
+
+
+def test_extractive_summary_keeps_previous_summary_and_latest_lines():
+    summary = extractive_summary("beli indomie 2", "buyer: halo\nassistant: ada yang bisa dibantu", 50)
+    assert summary.splitlines() == ["beli indomie 2", "buyer: halo", "assistant: ada yang bisa dibantu"]
+
+    summary = extractive_summary("", "buyer: halo\nassistant: ada yang bisa dibantu", 8)
+    assert summary == "assistant: ada yang bisa dibantu"
@@ -0,0 +1,99 @@
+import pytest
+
+from intent_router import Intent, IntentRouter, RouterMetrics, percentile, pick_product, render_order, render_product
+
+
+@pytest.fixture
+def router():
+    return IntentRouter()
+
+
+class TestMatch:
+    @pytest.mark.parametrize("message, name, args", [
+        ("Produk apa saja?", "list_products", {}),
+        ("ada barang apa aja yang dijual", "list_products", {}),
+        ("harga indomie berapa?", "product_price", {"product_name": "indomie"}),
+        ("Berapa harga Teh Botol ya", "product_price", {"product_name": "teh botol"}),
+        ("lokasi aqua di mana?", "product_location", {"product_name": "aqua"}),
+        ("stok indomie goreng berapa", "product_stock", {"product_name": "indomie goreng"}),
+        ("cek pesanan 12", "order_status", {"transaction_id": 12}),
+        ("status transaksi #7", "order_status", {"transaction_id": 7}),
+    ])
+    def test_high_confidence_intents(self, router, message, name, args):
+        assert router.match(message) == Intent(name=name, args=args)
+
+    @pytest.mark.parametrize("message", [
+        "saya mau pesan indomie 2",
+        "batalkan pesanan 12",
+        "beli aqua di mana",
+        "harga nya berapa",
+        "harga indomie dan aqua berapa",
+        "harga indomie berapa, terus yang paling murah apa",
+        "halo",
+        "",
+    ])
+    def test_everything_else_goes_to_the_agent(self, router, message):
+        assert router.match(message) is None
+
+
+class TestPickProduct:
+    PRODUCTS = [
+        {"id": 1, "nama_barang": "Indomie Goreng"},
+        {"id": 2, "nama_barang": "Indomie Soto"},
+        {"id": 3, "nama_barang": "Aqua Botol 600ml"},
+    ]
+
+    def test_single_match(self):
+        assert pick_product("aqua", self.PRODUCTS)["id"] == 3
+
+    def test_ambiguous_name(self):
+        assert pick_product("indomie", self.PRODUCTS) is None
+
+    def test_exact_name_wins(self):
+        products = self.PRODUCTS + [{"id": 4, "nama_barang": "Indomie Goreng Jumbo"}]
+        assert pick_product("indomie goreng", products)["id"] == 1
+
+    def test_fuzzy_results_are_ignored(self):
+        assert pick_product("aqau", self.PRODUCTS) is None
+
+
+class TestRender:
+    PRODUK = {"nama_barang": "Aqua Botol 600ml", "harga": 4000, "stok": 0, "lokasi": "Kulkas", "deskripsi_suara_lokasi": None}
+
+    def test_price(self):
+        assert render_product(Intent(name="product_price"), self.PRODUK) == "Harga Aqua Botol 600ml Rp4.000."
+
+    def test_out_of_stock(self):
+        assert "habis" in render_product(Intent(name="product_stock"), self.PRODUK)
+
+    def test_order(self):
+        order = {
+            "transaction": {"id": 12, "tanggal_transaksi": "2024-05-01", "total_harga_transaksi": 10000,
+                            "status": "success", "metode_pembayaran": "cash", "catatan": None},
+            "items": [{"id": 1, "produk_id": 1, "nama_barang": None, "qty": 2,
+                       "harga_per_produk": 5000, "total_harga_produk": 10000}],
+        }
+        assert render_order(order).splitlines() == [
+            "Pesanan #12 (2024-05-01), status success, pembayaran cash.",
+            "- 2x Produk ID 1 @ Rp5.000 = Rp10.000",
+            "Total Rp10.000.",
+        ]
+
+
+class TestMetrics:
+    def test_percentile(self):
+        values = list(range(1, 101))
+        assert (percentile(values, 50), percentile(values, 95)) == (50, 95)
+        assert percentile([], 50) is None
+
+    def test_summary(self):
+        metrics = RouterMetrics()
+        for _ in range(3):
+            metrics.record(True, 0.01)
+        metrics.record(False, 2.0)
+
+        summary = metrics.summary()
+
+        assert summary["hit_rate"] == 0.75
+        assert summary["fast_p50_ms"] == 10.0
+        assert summary["saved_p50_ms"] == 1990.0
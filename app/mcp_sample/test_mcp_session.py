@@ -0,0 +1,206 @@
+import asyncio
+import os
+import sys
+import textwrap
+import threading
+import time
+
+import anyio
+import pytest
+from mcp import StdioServerParameters
+from mcp.shared.exceptions import McpError
+
+from mcp_session import MCPPoolBusyError, MCPSessionManager, MCPSessionPool, get_session_manager
+
+ECHO_SERVER = textwrap.dedent("""
+    import os
+    from mcp.server.fastmcp import FastMCP
+
+    mcp = FastMCP("echo_server")
+
+    @mcp.tool()
+    async def pid() -> int:
+        return os.getpid()
+
+    @mcp.tool()
+    async def crash() -> int:
+        os._exit(1)
+
+    if __name__ == "__main__":
+        mcp.run(transport="stdio")
+""")
+
+
+@pytest.fixture
+def echo_params(tmp_path):
+    script = tmp_path / "echo_server.py"
+    script.write_text(ECHO_SERVER)
+    return StdioServerParameters(command=sys.executable, args=[str(script)])
+
+
+async def _pid(manager: MCPSessionManager) -> int:
+    result = await manager.call_tool("pid", {})
+    return int(result.content[0].text)
+
+
+def _alive(pid: int, wait: float = 5.0) -> bool:
+    """Whether process `pid` still exists after up to `wait` seconds."""
+    deadline = time.monotonic() + wait
+    while True:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        if time.monotonic() > deadline:
+            return True
+        time.sleep(0.05)
+
+
+class ThreadLoop:
+    """An event loop running in another thread, like the one Gradio serves requests on."""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout=30)
+
+    def close(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+class TestMCPSessionManager:
+    def test_reuses_server_process(self, echo_params):
+        async def scenario():
+            manager = MCPSessionManager("echo", echo_params)
+            try:
+                first = await _pid(manager)
+                second = await _pid(manager)
+                tools = await manager.list_tools()
+            finally:
+                await manager.stop()
+            return first, second, [t.name for t in tools]
+
+        first, second, tool_names = asyncio.run(scenario())
+        assert first == second
+        assert "pid" in tool_names
+
+    def test_restarts_after_crash(self, echo_params):
+        async def scenario():
+            manager = MCPSessionManager("echo", echo_params, health_check_interval=0.0, ping_timeout=2.0)
+            try:
+                before = await _pid(manager)
+                with pytest.raises(McpError):
+                    await manager.call_tool("crash", {})
+                after = await _pid(manager)
+            finally:
+                await manager.stop()
+            return before, after, manager.restart_count
+
+        before, after, restart_count = asyncio.run(scenario())
+        assert before != after
+        assert restart_count >= 1
+
+    def test_concurrent_failures_restart_once(self, echo_params):
+        async def scenario():
+            manager = MCPSessionManager("echo", echo_params)
+            try:
+                before = await _pid(manager)
+                stale = manager._session
+                in_flight = asyncio.Event()
+                waiting = 0
+
+                async def broken_call_tool(*args, **kwargs):
+                    # Every caller is in flight on the old session before it fails
+                    nonlocal waiting
+                    waiting += 1
+                    if waiting == 5:
+                        in_flight.set()
+                    await in_flight.wait()
+                    raise anyio.ClosedResourceError()
+
+                stale.call_tool = broken_call_tool
+                after = await asyncio.gather(*(_pid(manager) for _ in range(5)))
+                return before, after, manager.restart_count, manager.generation
+            finally:
+                await manager.stop()
+
+        before, after, restart_count, generation = asyncio.run(scenario())
+        assert restart_count == 1
+        assert generation == 2
+        assert len(set(after)) == 1 and after[0] != before
+
+    def test_new_event_loop_stops_the_old_server(self, echo_params):
+        manager = MCPSessionManager("echo", echo_params)
+        other = ThreadLoop()
+        try:
+            old_pid = other.run(_pid(manager))
+
+            async def scenario():
+                try:
+                    return await _pid(manager)
+                finally:
+                    await manager.stop()
+
+            new_pid = asyncio.run(scenario())
+        finally:
+            other.close()
+        assert new_pid != old_pid
+        assert not _alive(old_pid)
+        assert not _alive(new_pid)
+
+    def test_stop_from_another_event_loop(self, echo_params):
+        manager = MCPSessionManager("echo", echo_params)
+        other = ThreadLoop()
+        try:
+            pid = other.run(_pid(manager))
+            asyncio.run(manager.stop())
+        finally:
+            other.close()
+        assert not _alive(pid)
+
+    def test_refuses_to_orphan_a_server_on_a_blocked_loop(self, echo_params):
+        manager = MCPSessionManager("echo", echo_params)
+        blocked = asyncio.new_event_loop()  # alive but not running, like a loop blocked in launch()
+        try:
+            pid = blocked.run_until_complete(_pid(manager))
+            with pytest.raises(RuntimeError, match="still running"):
+                asyncio.run(manager.start())
+            assert _alive(pid, wait=0)
+            blocked.run_until_complete(manager.stop())
+        finally:
+            blocked.close()
+        assert not _alive(pid)
+
+    def test_get_session_manager_is_shared(self, echo_params):
+        assert get_session_manager("shared_echo", echo_params) is get_session_manager("shared_echo", echo_params)
+
+
+class TestMCPSessionPool:
+    def test_dispatches_across_workers(self, echo_params):
+        async def scenario():
+            pool = MCPSessionPool("echo", echo_params, size=2)
+            try:
+                await pool.start()
+                results = await asyncio.gather(*(pool.call_tool("pid", {}) for _ in range(6)))
+            finally:
+                await pool.stop()
+            return {int(r.content[0].text) for r in results}
+
+        pids = asyncio.run(scenario())
+        assert len(pids) == 2
+
+    def test_backpressure_when_all_workers_busy(self, echo_params):
+        async def scenario():
+            pool = MCPSessionPool("echo", echo_params, size=1, acquire_timeout=0.05)
+            async with pool.acquire():
+                with pytest.raises(MCPPoolBusyError):
+                    async with pool.acquire():
+                        pass
+            assert pool.in_flight == 0
+
+        asyncio.run(scenario())
@@ -0,0 +1,143 @@
+import sqlite3
+
+import pytest
+
+import produk_database
+import transaction_database
+from db_connection import get_connection
+from migrations import MIGRATIONS, apply_migrations, get_schema_version
+
+LATEST = MIGRATIONS[-1][0]
+
+
+@pytest.fixture
+def warung_db(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "warung.db")
+    monkeypatch.setattr(produk_database, "DATABASE_NAME", db_path)
+    monkeypatch.setattr(transaction_database, "DATABASE_NAME", db_path)
+    produk_database.init_db()
+    transaction_database.init_db()
+    return db_path
+
+
+def _index_names(db_path: str) -> set:
+    with get_connection(db_path) as conn:
+        return {row["name"] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+
+def _traced_statements(db_path: str, fn) -> list:
+    """Run `fn` and return the SELECT statements it sent to SQLite, with values bound."""
+    statements = []
+    with get_connection(db_path) as conn:
+        conn.set_trace_callback(statements.append)
+        try:
+            fn()
+        finally:
+            conn.set_trace_callback(None)
+    return [s for s in statements if s.lstrip().upper().startswith("SELECT")]
+
+
+class TestMigrations:
+    def test_init_db_is_at_latest_version(self, warung_db):
+        with get_connection(warung_db) as conn:
+            assert get_schema_version(conn) == LATEST
+        assert "idx_detail_transactions_transaction_id" in _index_names(warung_db)
+
+    def test_upgrades_existing_database_in_place(self, tmp_path):
+        db_path = str(tmp_path / "old.db")
+        conn = sqlite3.connect(db_path)
+        conn.execute("CREATE TABLE transactions (id INTEGER PRIMARY KEY, tanggal_transaksi TEXT, status TEXT)")
+        conn.execute("CREATE TABLE detail_transactions (id INTEGER PRIMARY KEY, transaction_id INTEGER, produk_id INTEGER)")
+        conn.execute("INSERT INTO transactions (tanggal_transaksi, status) VALUES ('2024-05-01', 'success')")
+        conn.commit()
+        conn.close()
+
+        assert apply_migrations(db_path) == LATEST
+        assert apply_migrations(db_path) == LATEST  # already up to date, nothing to do
+        with get_connection(db_path) as conn:
+            assert conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0] == 1
+        assert {"idx_transactions_tanggal_transaksi", "idx_transactions_status"} <= _index_names(db_path)
+
+    def test_init_db_keeps_existing_data(self, warung_db):
+        produk_database.create_product_in_db({
+            "nama_barang": "Indomie Goreng", "harga": 3000, "lokasi": None,
+            "deskripsi_suara_lokasi": None, "path_qris": None, "stok": 50
+        })
+        produk_database.init_db()
+        transaction_database.init_db()
+
+        assert produk_database.has_products_in_db()
+        assert produk_database.search_products_in_db("indomie")[0]["stok"] == 50
+
+    def test_up_to_date_database_only_reads_version(self, warung_db):
+        statements = []
+        with get_connection(warung_db) as conn:
+            conn.set_trace_callback(statements.append)
+            try:
+                apply_migrations(warung_db)
+            finally:
+                conn.set_trace_callback(None)
+        assert statements == ["PRAGMA user_version"]
+
+    def test_indexes_products_created_before_full_text_search(self, tmp_path, monkeypatch):
+        db_path = str(tmp_path / "old.db")
+        conn = sqlite3.connect(db_path)
+        conn.execute("""
+            CREATE TABLE produk (
+                id INTEGER PRIMARY KEY AUTOINCREMENT, nama_barang TEXT NOT NULL, harga INTEGER NOT NULL,
+                lokasi TEXT, deskripsi_suara_lokasi TEXT, path_qris TEXT, stok INTEGER NOT NULL
+            )
+        """)
+        conn.execute("INSERT INTO produk (nama_barang, harga, stok) VALUES ('Teh Botol Sosro', 5000, 10)")
+        conn.commit()
+        conn.close()
+        monkeypatch.setattr(produk_database, "DATABASE_NAME", db_path)
+
+        produk_database.init_db()
+
+        assert [p["nama_barang"] for p in produk_database.search_products_in_db("teh bot")] == ["Teh Botol Sosro"]
+
+
+    def test_stock_changes_do_not_rewrite_the_full_text_index(self, warung_db):
+        produk_id = produk_database.create_product_in_db({
+            "nama_barang": "Indomie Goreng", "harga": 3000, "lokasi": "Rak Mie",
+            "deskripsi_suara_lokasi": None, "path_qris": None, "stok": 50
+        })
+        with get_connection(warung_db) as conn:
+            fts_sql = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'produk_fts_au'").fetchone()["sql"]
+        assert "UPDATE OF nama_barang, lokasi, deskripsi_suara_lokasi ON produk" in fts_sql
+
+        produk_database.decrement_stock(produk_id, 5)
+        produk_database.update_product_in_db(produk_id, {**produk_database.get_product_from_db(produk_id), "nama_barang": "Mie Sedaap"})
+
+        assert [p["stok"] for p in produk_database.search_products_in_db("sedaap")] == [45]
+        assert produk_database.search_products_in_db("indomie") == []
+
+
+class TestQueryPlans:
+    @pytest.mark.parametrize("name, call", [
+        ("details by transaction", lambda: transaction_database.get_detail_transactions_by_transaction_id(1)),
+        ("details by product", lambda: transaction_database.get_detail_transactions_by_produk_id(1)),
+        ("order with items", lambda: transaction_database.get_order_with_items_from_db(1)),
+        ("transactions by date", lambda: transaction_database.get_transactions_with_details_from_db(
+            limit=20, start_date="2024-05-01", end_date="2024-05-31")),
+        ("transactions by status", lambda: transaction_database.get_transactions_with_details_from_db(
+            limit=20, status="pending")),
+    ])
+    def test_hot_queries_use_an_index(self, warung_db, name, call):
+        statements = _traced_statements(warung_db, call)
+        assert statements, name
+        with get_connection(warung_db) as conn:
+            for statement in statements:
+                plan = [row["detail"] for row in conn.execute(f"EXPLAIN QUERY PLAN {statement}")]
+                full_scans = [step for step in plan if step.startswith("SCAN") and "INDEX" not in step]
+                assert not full_scans, f"{name}: {statement} -> {plan}"
+
+    def test_last_transaction_reads_one_row_from_the_end(self, warung_db):
+        # ORDER BY id DESC LIMIT 1 shows up as a SCAN, but one that walks the
+        # rowid b-tree backwards and stops at the first row; no sort needed.
+        statements = _traced_statements(warung_db, transaction_database.get_last_transaction_from_db)
+        with get_connection(warung_db) as conn:
+            plan = [row["detail"] for row in conn.execute(f"EXPLAIN QUERY PLAN {statements[0]}")]
+        assert plan == ["SCAN transactions"]
+        assert "LIMIT 1" in statements[0]
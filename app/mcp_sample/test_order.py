@@ -0,0 +1,244 @@
+import asyncio
+import json
+
+import pytest
+
+import produk_database
+import transaction_database
+from produk_database import InsufficientStockError
+from db_connection import connect, get_connection
+from transaction import DetailTransactionCreationRequest, DetailTransactionService, TransactionService, TransactionWithDetailsCreationRequest
+import produk_server
+import transaction_server
+from transaction_server import cancel_transaction, create_transaction, get_detail_transactions_by_transaction_id, get_order_with_items
+
+
+@pytest.fixture
+def warung_db(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "warung.db")
+    monkeypatch.setattr(produk_database, "DATABASE_NAME", db_path)
+    monkeypatch.setattr(transaction_database, "DATABASE_NAME", db_path)
+    produk_database.init_db()
+    transaction_database.init_db()
+    for nama_barang, harga, stok in (("Indomie Goreng", 3000, 50), ("Aqua Botol 600ml", 4000, 3)):
+        produk_database.create_product_in_db({
+            "nama_barang": nama_barang,
+            "harga": harga,
+            "lokasi": "Rak Depan",
+            "deskripsi_suara_lokasi": "Ada di rak depan.",
+            "path_qris": "/qris/default.png",
+            "stok": stok
+        })
+    return db_path
+
+
+def _order(*lines) -> TransactionWithDetailsCreationRequest:
+    details = [
+        DetailTransactionCreationRequest(
+            transaction_id=0, produk_id=produk_id, product_name=name, qty=qty,
+            harga_per_produk=harga, total_harga_produk=harga * qty
+        )
+        for produk_id, name, qty, harga in lines
+    ]
+    return TransactionWithDetailsCreationRequest(
+        tanggal_transaksi="2024-05-01",
+        total_harga_transaksi=sum(d.total_harga_produk for d in details),
+        status="success",
+        metode_pembayaran="cash",
+        detail_transactions=details,
+    )
+
+
+def _stok(produk_id: int) -> int:
+    return produk_database.get_product_from_db(produk_id)["stok"]
+
+
+class TestCreateOrder:
+    def test_commits_header_details_and_stock_together(self, warung_db):
+        result = TransactionService.create_transaction_with_details(
+            _order((1, "Indomie Goreng", 2, 3000), (0, "aqua", 3, 4000))
+        )
+
+        assert result.transaction.total_harga_transaksi == 18000
+        assert [d.produk_id for d in result.detail_transactions] == [1, 2]
+        stored = transaction_database.get_detail_transactions_by_transaction_id(result.transaction.id)
+        assert [d["id"] for d in stored] == [d.id for d in result.detail_transactions]
+        assert (_stok(1), _stok(2)) == (48, 0)
+
+    def test_short_stock_writes_nothing(self, warung_db):
+        with pytest.raises(InsufficientStockError):
+            TransactionService.create_transaction_with_details(
+                _order((1, "Indomie Goreng", 2, 3000), (2, "Aqua Botol 600ml", 4, 4000))
+            )
+
+        assert transaction_database.get_all_transactions_from_db() == []
+        assert transaction_database.get_all_detail_transactions_from_db() == []
+        assert (_stok(1), _stok(2)) == (50, 3)
+
+    def test_unknown_product_is_rejected_before_writing(self, warung_db):
+        with pytest.raises(ValueError):
+            TransactionService.create_transaction_with_details(_order((0, "Sabun Colek", 1, 2000)))
+        assert transaction_database.get_all_transactions_from_db() == []
+
+    def test_tool_returns_error_json(self, warung_db):
+        order = _order((2, "Aqua Botol 600ml", 5, 4000))
+        result = json.loads(asyncio.run(create_transaction(
+            tanggal_transaksi=order.tanggal_transaksi,
+            total_harga_transaksi=order.total_harga_transaksi,
+            status=order.status,
+            metode_pembayaran=order.metode_pembayaran,
+            detail_transactions=order.detail_transactions,
+        )))
+        assert "error" in result
+        assert _stok(2) == 3
+
+
+
+class TestTransactionHistory:
+    DATES = ("2024-04-30", "2024-05-01 09:15", "2024-05-15", "2024-06-01")
+
+    @pytest.fixture
+    def history(self, warung_db):
+        for qty, tanggal in enumerate(self.DATES, start=1):
+            order = _order((1, "Indomie Goreng", qty, 3000))
+            order.tanggal_transaksi = tanggal
+            TransactionService.create_transaction_with_details(order)
+
+    def test_loads_details_and_products(self, history):
+        result = TransactionService.get_all_transactions_with_details()
+
+        assert [t.transaction.tanggal_transaksi for t in result] == list(self.DATES)
+        assert [t.detail_transactions[0].qty for t in result] == [1, 2, 3, 4]
+        assert result[0].detail_transactions[0].produk.nama_barang == "Indomie Goreng"
+
+    def test_pagination(self, history):
+        page = TransactionService.get_all_transactions_with_details(limit=2, offset=1)
+        assert [t.detail_transactions[0].qty for t in page] == [2, 3]
+
+    def test_page_is_stable_when_an_order_is_cancelled_meanwhile(self, history, warung_db):
+        def cancel_first_order(statement):
+            # Another process cancels order 1 right before the details are read
+            if "FROM detail_transactions" in statement:
+                other = connect(warung_db)
+                with other:
+                    other.execute("DELETE FROM detail_transactions WHERE transaction_id = 1")
+                    other.execute("DELETE FROM transactions WHERE id = 1")
+                other.close()
+
+        with get_connection(warung_db) as conn:
+            conn.set_trace_callback(cancel_first_order)
+            try:
+                page = transaction_database.get_transactions_with_details_from_db(limit=2, offset=1)
+            finally:
+                conn.set_trace_callback(None)
+
+        assert [t["id"] for t in page] == [2, 3]
+        assert [[d["transaction_id"] for d in t["detail_transactions"]] for t in page] == [[2], [3]]
+
+    def test_date_range_is_inclusive(self, history):
+        result = TransactionService.get_all_transactions_with_details(start_date="2024-05-01", end_date="2024-05-15")
+        assert [t.transaction.tanggal_transaksi for t in result] == ["2024-05-01 09:15", "2024-05-15"]
+
+    def test_last_transaction(self, history):
+        assert TransactionService.get_last_transaction().tanggal_transaksi == self.DATES[-1]
+
+    def test_last_transaction_when_empty(self, warung_db):
+        assert TransactionService.get_last_transaction() is None
+
+
+class TestOrderLookup:
+    @pytest.fixture
+    def order_id(self, warung_db):
+        TransactionService.create_transaction_with_details(_order((2, "Aqua Botol 600ml", 1, 4000)))
+        result = TransactionService.create_transaction_with_details(
+            _order((1, "Indomie Goreng", 2, 3000), (2, "Aqua Botol 600ml", 1, 4000))
+        )
+        return result.transaction.id
+
+    def test_order_with_items_joins_product_names(self, order_id):
+        order = json.loads(asyncio.run(get_order_with_items(order_id)))
+
+        assert order["transaction"]["id"] == order_id
+        assert order["transaction"]["total_harga_transaksi"] == 10000
+        assert [(i["nama_barang"], i["qty"]) for i in order["items"]] == [("Indomie Goreng", 2), ("Aqua Botol 600ml", 1)]
+
+    def test_order_with_items_keeps_deleted_products(self, order_id):
+        produk_database.delete_product_from_db(1)
+
+        items = TransactionService.get_order_with_items(order_id).items
+
+        assert [(i.produk_id, i.nama_barang) for i in items] == [(1, None), (2, "Aqua Botol 600ml")]
+
+    def test_missing_order(self, warung_db):
+        assert TransactionService.get_order_with_items(99) is None
+        assert "error" in json.loads(asyncio.run(get_order_with_items(99)))
+
+    def test_details_by_transaction_id(self, order_id):
+        details = json.loads(asyncio.run(get_detail_transactions_by_transaction_id(order_id)))
+
+        assert [d["produk_id"] for d in details] == [1, 2]
+        assert all(d["transaction_id"] == order_id for d in details)
+        assert details[0]["produk"]["nama_barang"] == "Indomie Goreng"
+
+
+    def test_details_by_transaction_id_loads_products_in_one_query(self, order_id, warung_db):
+        statements = []
+        with get_connection(warung_db) as conn:
+            conn.set_trace_callback(statements.append)
+            try:
+                details = DetailTransactionService.get_detail_transactions_by_transaction_id(order_id)
+            finally:
+                conn.set_trace_callback(None)
+
+        assert [d.produk.nama_barang for d in details] == ["Indomie Goreng", "Aqua Botol 600ml"]
+        assert len([s for s in statements if "FROM produk" in s]) == 1
+
+
+class TestCancelOrder:
+    @pytest.fixture
+    def order_ids(self, warung_db):
+        first = TransactionService.create_transaction_with_details(_order((2, "Aqua Botol 600ml", 1, 4000)))
+        second = TransactionService.create_transaction_with_details(
+            _order((1, "Indomie Goreng", 2, 3000), (2, "Aqua Botol 600ml", 1, 4000))
+        )
+        return first.transaction.id, second.transaction.id
+
+    def test_cancels_the_requested_order_and_restores_stock(self, order_ids):
+        first, second = order_ids
+        assert (_stok(1), _stok(2)) == (48, 1)
+
+        result = json.loads(asyncio.run(cancel_transaction(first)))
+
+        assert result == {"transaction_id": first, "deleted_details": 1, "restored_stock": {"2": 2}, "missing_produk_ids": []}
+        assert (_stok(1), _stok(2)) == (48, 2)
+        assert TransactionService.get_order_with_items(first) is None
+        assert len(TransactionService.get_order_with_items(second).items) == 2  # the last order is untouched
+
+    def test_restock_does_not_overwrite_other_columns(self, order_ids):
+        produk_database.update_product_in_db(1, {**produk_database.get_product_from_db(1), "harga": 3500})
+
+        TransactionService.cancel_transaction(order_ids[1])
+
+        assert produk_database.get_product_from_db(1)["harga"] == 3500
+        assert _stok(1) == 50
+
+    def test_deleted_product_is_reported(self, order_ids):
+        produk_database.delete_product_from_db(1)
+
+        result = TransactionService.cancel_transaction(order_ids[1])
+
+        assert result["missing_produk_ids"] == [1]
+        assert result["restored_stock"] == {2: 2}
+
+    def test_missing_order_changes_nothing(self, order_ids):
+        assert "error" in json.loads(asyncio.run(cancel_transaction(99)))
+        assert (_stok(1), _stok(2)) == (48, 1)
+
+
+def test_order_tools_are_registered():
+    produk_tools = {t.name for t in asyncio.run(produk_server.mcp.list_tools())}
+    transaction_tools = {t.name for t in asyncio.run(transaction_server.mcp.list_tools())}
+
+    assert "get_produk" in produk_tools
+    assert {"cancel_transaction", "get_order_with_items", "create_transaction"} <= transaction_tools
+    assert "cancel_transaction" in transaction_server.BATCH_HANDLERS
@@ -0,0 +1,104 @@
+import asyncio
+import json
+
+import pytest
+
+import produk_database
+import transaction_database
+from paging import iter_pages
+from produk_server import list_all_produk
+from transaction import DetailTransactionCreationRequest, TransactionService, TransactionWithDetailsCreationRequest
+from transaction_server import get_all_detail_transactions, get_all_transactions, read_transactions_page_resource
+
+
+@pytest.fixture
+def warung_db(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "warung.db")
+    monkeypatch.setattr(produk_database, "DATABASE_NAME", db_path)
+    monkeypatch.setattr(transaction_database, "DATABASE_NAME", db_path)
+    produk_database.init_db()
+    for i in range(1, 8):
+        produk_database.create_product_in_db({
+            "nama_barang": f"Produk {i}",
+            "harga": 1000 * i,
+            "lokasi": "Rak Depan",
+            "deskripsi_suara_lokasi": "Ada di rak depan.",
+            "path_qris": "/qris/default.png",
+            "stok": 100
+        })
+    for qty, tanggal in enumerate(("2024-05-01", "2024-05-02", "2024-05-03", "2024-05-04", "2024-05-05"), start=1):
+        TransactionService.create_transaction_with_details(TransactionWithDetailsCreationRequest(
+            tanggal_transaksi=tanggal,
+            total_harga_transaksi=1000 * qty,
+            status="success",
+            metode_pembayaran="cash",
+            detail_transactions=[DetailTransactionCreationRequest(
+                transaction_id=0, produk_id=1, product_name="Produk 1", qty=qty,
+                harga_per_produk=1000, total_harga_produk=1000 * qty
+            )],
+        ))
+    return db_path
+
+
+def _walk(tool, **kwargs):
+    """Collect every page of a paged tool by following next_cursor."""
+    pages = []
+
+    async def fetch_page(cursor):
+        return await tool(cursor=cursor, **kwargs)
+
+    async def collect():
+        async for page in iter_pages(fetch_page):
+            pages.append(page)
+
+    asyncio.run(collect())
+    return pages
+
+
+class TestProdukPaging:
+    def test_first_page_and_cursor(self, warung_db):
+        page = json.loads(asyncio.run(list_all_produk(limit=3)))
+
+        assert [p["id"] for p in page["items"]] == [1, 2, 3]
+        assert page["next_cursor"] == 3
+
+    def test_walks_every_product_once(self, warung_db):
+        pages = _walk(list_all_produk, limit=3)
+
+        assert [[p["id"] for p in page] for page in pages] == [[1, 2, 3], [4, 5, 6], [7]]
+
+    def test_last_full_page_has_no_cursor(self, warung_db):
+        page = json.loads(asyncio.run(list_all_produk(limit=7)))
+        assert page["next_cursor"] is None
+
+    def test_field_projection(self, warung_db):
+        page = json.loads(asyncio.run(list_all_produk(limit=1, fields=["harga"])))
+        assert page["items"] == [{"id": 1, "harga": 1000}]
+
+    def test_unknown_field_is_an_error(self, warung_db):
+        assert "error" in json.loads(asyncio.run(list_all_produk(fields=["password"])))
+
+
+class TestTransactionPaging:
+    def test_walks_every_transaction_with_filters(self, warung_db):
+        pages = _walk(get_all_transactions, limit=2, start_date="2024-05-02")
+
+        assert [[t["transaction"]["id"] for t in page] for page in pages] == [[2, 3], [4, 5]]
+        assert pages[0][0]["detail_transactions"][0]["qty"] == 2
+
+    def test_header_projection_drops_details(self, warung_db):
+        page = json.loads(asyncio.run(get_all_transactions(limit=1, fields=["total_harga_transaksi"])))
+        assert page["items"] == [{"transaction": {"id": 1, "total_harga_transaksi": 1000}}]
+
+    def test_detail_transactions(self, warung_db):
+        pages = _walk(get_all_detail_transactions, limit=2, fields=["transaction_id", "qty"])
+
+        assert [d for page in pages for d in page] == [
+            {"id": i, "transaction_id": i, "qty": i} for i in range(1, 6)
+        ]
+
+    def test_resource_pages(self, warung_db):
+        page = json.loads(asyncio.run(read_transactions_page_resource(3)))
+
+        assert [t["transaction"]["id"] for t in page["items"]] == [4, 5]
+        assert page["next_cursor"] is None
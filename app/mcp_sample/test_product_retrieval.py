@@ -0,0 +1,69 @@
+import pytest
+
+from bench_product_context import build_catalog
+from history_manager import estimate_tokens
+from product_retrieval import ProductRetriever, render_product_context
+
+PRODUCTS = [
+    {"id": 1, "nama_barang": "Indomie Goreng", "harga": 3000, "stok": 50, "lokasi": "Rak Mie Instan", "deskripsi_suara_lokasi": "Ada di rak tengah, bagian mie instan."},
+    {"id": 2, "nama_barang": "Aqua Botol 600ml", "harga": 3500, "stok": 100, "lokasi": "Kulkas Minuman", "deskripsi_suara_lokasi": "Di dalam kulkas minuman, sebelah kanan."},
+    {"id": 3, "nama_barang": "Chitato Sapi Panggang", "harga": 10000, "stok": 30, "lokasi": "Rak Snack", "deskripsi_suara_lokasi": "Rak snack, di bagian atas."},
+    {"id": 4, "nama_barang": "Teh Botol Sosro Kotak", "harga": 4000, "stok": 70, "lokasi": "Kulkas Minuman", "deskripsi_suara_lokasi": "Kulkas minuman, di sebelah kiri bawah."},
+    {"id": 5, "nama_barang": "Sabun Mandi Lifebuoy", "harga": 5000, "stok": 60, "lokasi": "Rak Perlengkapan Mandi", "deskripsi_suara_lokasi": "Bagian sabun dan sampo, rak nomor tiga."},
+    {"id": 6, "nama_barang": "Indomie Soto", "harga": 3000, "stok": 50, "lokasi": "Rak Mie Instan", "deskripsi_suara_lokasi": None},
+]
+
+
+@pytest.fixture
+def retriever():
+    r = ProductRetriever(top_k=3)
+    r.build(PRODUCTS)
+    return r
+
+
+def _ids(results):
+    return [p["id"] for p, _ in results]
+
+
+@pytest.mark.parametrize("message, first_id", [
+    ("saya mau beli indomie goreng 2 dong", 1),
+    ("sabun ada?", 5),
+    ("chitatoo sapi berapa", 3),  # typo
+    ("akua", 2),  # typo
+    ("teh botl", 4),
+])
+def test_best_match_first(retriever, message, first_id):
+    assert _ids(retriever.search(message))[0] == first_id
+
+
+def test_matches_location(retriever):
+    assert set(_ids(retriever.search("yang di kulkas apa aja"))) == {2, 4}
+
+
+def test_small_talk_selects_nothing(retriever):
+    assert retriever.search("halo selamat pagi") == []
+    assert retriever.search("") == []
+
+
+def test_top_k(retriever):
+    assert len(retriever.search("indomie", top_k=1)) == 1
+
+
+def test_render(retriever):
+    context = render_product_context(retriever.search("aqua"), len(retriever))
+    assert "dari 6 produk" in context
+    assert "- id 2: Aqua Botol 600ml, Rp3.500, lokasi Kulkas Minuman" in context
+    assert "stok 100" not in context
+    assert "Gunakan tool produk" in render_product_context([], 6)
+
+
+def test_prompt_size_does_not_grow_with_catalog():
+    sizes = []
+    for count in (100, 2000):
+        catalog = build_catalog(count)
+        r = ProductRetriever(top_k=8)
+        r.build(catalog)
+        results = r.search("saya mau beli indomie goreng 2")
+        assert results[0][0]["nama_barang"] == "Indomie Goreng"
+        sizes.append(estimate_tokens(render_product_context(results, len(catalog))))
+    assert max(sizes) < 200
@@ -0,0 +1,110 @@
+import asyncio
+import json
+import sqlite3
+
+import pytest
+
+import produk_database
+import produk_server
+from batch import BatchOperation, execute_batch
+from db_connection import batch_transaction
+from produk import ProdukService, ProdukCreationRequest
+from produk_cache import MISSING, produk_cache
+
+
+@pytest.fixture
+def produk_db(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "warung.db")
+    monkeypatch.setattr(produk_database, "DATABASE_NAME", db_path)
+    produk_database.init_db()
+    produk_database.create_product_in_db({
+        "nama_barang": "Indomie Goreng",
+        "harga": 3000,
+        "lokasi": "Rak Mie Instan",
+        "deskripsi_suara_lokasi": "Ada di rak tengah, bagian mie instan.",
+        "path_qris": "/qris/indomie_goreng.png",
+        "stok": 50
+    })
+    produk_cache.clear()
+    yield db_path
+    produk_cache.clear()
+
+
+def _counters():
+    stats = produk_cache.stats()
+    return stats["hits"], stats["misses"]
+
+
+class TestProdukCache:
+    def test_repeated_reads_are_served_from_cache(self, produk_db):
+        hits, misses = _counters()
+        ProdukService.get_produk(1)
+        ProdukService.get_produk(1)
+        ProdukService.get_all_produk()
+        ProdukService.get_all_produk()
+
+        assert _counters() == (hits + 2, misses + 2)
+
+    def test_writes_in_this_process_invalidate(self, produk_db):
+        assert ProdukService.get_produk(1).stok == 50
+        assert len(ProdukService.get_all_produk()) == 1
+
+        produk_database.decrement_stock(1, 5)
+        ProdukService.create_produk(ProdukCreationRequest(nama_barang="Aqua Botol 600ml", harga=4000, stok=10))
+
+        assert ProdukService.get_produk(1).stok == 45
+        assert len(ProdukService.get_all_produk()) == 2
+
+    def test_writes_from_other_connections_are_picked_up(self, produk_db):
+        assert ProdukService.get_produk(1).stok == 50
+
+        other = sqlite3.connect(produk_db)  # e.g. another process
+        other.execute("UPDATE produk SET stok = 7 WHERE id = 1")
+        other.commit()
+        other.close()
+
+        assert ProdukService.get_produk(1).stok == 7
+
+    def test_lru_is_bounded(self, produk_db, monkeypatch):
+        monkeypatch.setattr(produk_cache, "maxsize", 2)
+        for produk_id in (1, 2, 3):
+            ProdukService.get_produk(produk_id)
+        assert produk_cache.stats()["items"] == 2
+
+
+class TestCatalogJson:
+    def test_catalog_is_one_json_array(self, produk_db):
+        catalog = json.loads(ProdukService.get_all_produk_json())
+
+        assert isinstance(catalog, list)
+        assert catalog[0]["nama_barang"] == "Indomie Goreng"
+
+    def test_all_items_resource_reflects_writes(self, produk_db):
+        produk_database.decrement_stock(1, 5)
+
+        result = asyncio.run(produk_server.read_all_produk_resource())
+
+        assert [(p["id"], p["stok"]) for p in json.loads(result)] == [(1, 45)]
+
+class TestBatchRollback:
+    def test_rolled_back_batch_does_not_leave_values_in_cache(self, produk_db):
+        assert ProdukService.get_produk(1).stok == 50
+        operations = [
+            BatchOperation(tool="decrement_stock", args={"produk_id": 1, "qty": 49}),
+            BatchOperation(tool="get_produk", args={"produk_id": 1}),
+            BatchOperation(tool="unknown_tool"),
+        ]
+        results = asyncio.run(execute_batch(operations, produk_server.BATCH_HANDLERS, produk_db, atomic=True))
+
+        assert not any(r.ok for r in results)
+        assert produk_database.get_product_from_db(1)["stok"] == 50
+        assert ProdukService.get_produk(1).stok == 50
+
+    def test_committed_batch_invalidates_after_commit(self, produk_db):
+        assert ProdukService.get_produk(1).stok == 50
+        with batch_transaction(produk_db):
+            produk_database.decrement_stock(1, 5)
+            assert ProdukService.get_produk(1).stok == 45  # read inside the batch, not cached
+            assert produk_cache.get_item(produk_db, 1) is not MISSING  # committed value still cached
+
+        assert ProdukService.get_produk(1).stok == 45
@@ -0,0 +1,140 @@
+import asyncio
+import json
+import sqlite3
+
+import pytest
+
+import produk_database
+from db_connection import batch_transaction
+from produk import ProdukService, ProdukCreationRequest
+from produk_server import search_produk
+
+PRODUK = [
+    ("Teh Botol Sosro", 5000, "Kulkas Minuman"),
+    ("Indomie Goreng", 3000, "Rak Mie Instan"),
+    ("Es Teh Manis", 4000, "Kulkas Minuman"),
+    ("Teh Kotak", 4500, "Rak Depan"),
+]
+
+
+@pytest.fixture
+def produk_db(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "warung.db")
+    monkeypatch.setattr(produk_database, "DATABASE_NAME", db_path)
+    produk_database.init_db()
+    for nama_barang, harga, lokasi in PRODUK:
+        produk_database.create_product_in_db({
+            "nama_barang": nama_barang,
+            "harga": harga,
+            "lokasi": lokasi,
+            "deskripsi_suara_lokasi": f"Ada di {lokasi.lower()}.",
+            "path_qris": "/qris/default.png",
+            "stok": 10
+        })
+    return db_path
+
+
+def _search(**kwargs):
+    return [p["nama_barang"] for p in json.loads(asyncio.run(search_produk(**kwargs)))]
+
+
+class TestSearchProduk:
+    def test_ranks_shorter_names_first(self, produk_db):
+        assert _search(query="TEH") == ["Teh Kotak", "Teh Botol Sosro", "Es Teh Manis"]
+
+    def test_multi_token_prefix_query(self, produk_db):
+        assert _search(query="teh bot") == ["Teh Botol Sosro"]
+        assert _search(query="goreng indo") == ["Indomie Goreng"]
+
+    def test_limit_and_offset(self, produk_db):
+        assert _search(query="teh", limit=1) == ["Teh Kotak"]
+        assert _search(query="teh", limit=2, offset=1) == ["Teh Botol Sosro", "Es Teh Manis"]
+
+    def test_include_location(self, produk_db):
+        assert _search(query="kulkas") == []
+        assert _search(query="kulkas", include_location=True) == ["Teh Botol Sosro", "Es Teh Manis"]
+
+    def test_substring_fallback(self, produk_db):
+        assert _search(query="mie") == ["Indomie Goreng"]
+
+    def test_paging_stays_on_full_text_matches(self, produk_db):
+        # "Sateh" contains "teh" but no word starts with it, so only the substring fallback finds it
+        produk_database.create_product_in_db({
+            "nama_barang": "Sateh Ayam", "harga": 15000, "lokasi": "Etalase",
+            "deskripsi_suara_lokasi": "Ada di etalase.", "path_qris": "/qris/default.png", "stok": 10
+        })
+
+        assert _search(query="teh", limit=3) == ["Teh Kotak", "Teh Botol Sosro", "Es Teh Manis"]
+        assert _search(query="teh", limit=3, offset=3) == []
+
+    def test_index_follows_updates_and_deletes(self, produk_db):
+        produk = produk_database.get_product_from_db(2)
+        produk_database.update_product_in_db(2, {**produk, "nama_barang": "Sarimi Soto"})
+        produk_database.delete_product_from_db(4)
+
+        assert _search(query="sarimi") == ["Sarimi Soto"]
+        assert _search(query="indomie") == []
+        assert _search(query="kotak") == []
+
+    def test_no_match_returns_empty_list(self, produk_db):
+        assert _search(query="sabun") == []
+
+    def test_fuzzy_fallback_for_misspelled_names(self, produk_db):
+        assert _search(query="indomi gorng") == ["Indomie Goreng"]
+        assert ProdukService.get_produk_by_name("teh botl").nama_barang == "Teh Botol Sosro"
+
+    def test_fuzzy_index_follows_service_writes(self, produk_db):
+        _search(query="indomi gorng")  # builds the index
+        ProdukService.create_produk(ProdukCreationRequest(nama_barang="Chitato Sapi Panggang", harga=10000, stok=5))
+
+        assert _search(query="chitatoo") == ["Chitato Sapi Panggang"]
+
+    def test_fuzzy_index_follows_writes_from_other_processes(self, produk_db):
+        _search(query="indomi gorng")  # builds the index
+        conn = sqlite3.connect(produk_db)
+        conn.execute("INSERT INTO produk (nama_barang, harga, stok) VALUES ('Chitato Sapi Panggang', 10000, 5)")
+        conn.execute("UPDATE produk SET nama_barang = 'Sarimi Soto' WHERE id = 2")
+        conn.commit()
+        conn.close()
+
+        assert _search(query="chitatoo") == ["Chitato Sapi Panggang"]
+        assert _search(query="indomi gorng") == []
+
+    def test_fuzzy_index_follows_batch_deletes_and_renames(self, produk_db):
+        _search(query="indomi gorng")
+        with batch_transaction(produk_db):
+            produk_database.delete_product_from_db(2)
+            produk = produk_database.get_product_from_db(4)
+            produk_database.update_product_in_db(4, {**produk, "nama_barang": "Chitato Sapi Panggang"})
+
+        assert _search(query="indomi gorng") == []
+        assert "Teh Kotak" not in _search(query="teh kotk")
+        assert _search(query="chitatoo") == ["Chitato Sapi Panggang"]
+
+    def test_fuzzy_index_forgets_rolled_back_batches(self, produk_db):
+        renamed = ProdukCreationRequest(nama_barang="Chitato Sapi Panggang", harga=3000, stok=10)
+        with pytest.raises(RuntimeError):
+            with batch_transaction(produk_db):
+                ProdukService.update_produk(2, renamed)
+                assert _search(query="chitatoo") == ["Chitato Sapi Panggang"]  # built from the uncommitted rename
+                raise RuntimeError("batch failed")
+
+        assert _search(query="indomi gorng") == ["Indomie Goreng"]
+
+    def test_fuzzy_index_is_not_reused_after_a_batch(self, produk_db):
+        # The rolled-back create and the committed one leave the same product count
+        with pytest.raises(RuntimeError):
+            with batch_transaction(produk_db):
+                ProdukService.create_produk(ProdukCreationRequest(nama_barang="Chitato Sapi Panggang", harga=10000, stok=5))
+                _search(query="chitatoo")
+                raise RuntimeError("batch failed")
+        ProdukService.create_produk(ProdukCreationRequest(nama_barang="Sabun Lifebuoy", harga=4000, stok=5))
+
+        assert _search(query="lifebouy") == ["Sabun Lifebuoy"]
+
+    def test_sales_do_not_rebuild_the_fuzzy_index(self, produk_db, monkeypatch):
+        _search(query="indomi gorng")
+        produk_database.decrement_stock(2, 1)
+        monkeypatch.setattr("produk.get_all_products_from_db", lambda: pytest.fail("index rebuilt"))
+
+        assert _search(query="indomi gorng") == ["Indomie Goreng"]
@@ -0,0 +1,169 @@
+import json
+
+import pytest
+
+import produk_database
+import transaction_database
+from response_cache import ResponseCache, cache_key, cacheable_products, mentions_product
+
+
+@pytest.fixture
+def tmp_db(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "warung.db")
+    monkeypatch.setattr(produk_database, "DATABASE_NAME", db_path)
+    monkeypatch.setattr(transaction_database, "DATABASE_NAME", db_path)
+    produk_database.init_db()
+    transaction_database.init_db()
+    return db_path
+
+
+def _create(nama_barang: str = "Aqua Botol 600ml", stok: int = 100) -> int:
+    return produk_database.create_product_in_db({
+        "nama_barang": nama_barang, "harga": 3500, "lokasi": "Kulkas Minuman",
+        "deskripsi_suara_lokasi": None, "path_qris": None, "stok": stok,
+    })
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestCacheKey:
+    @pytest.mark.parametrize("message, key", [
+        ("Lokasi Aqua di mana?", "lokasi aqua di mana"),
+        ("lokasi   aqua di mana", "lokasi aqua di mana"),
+        ("Aqua 600ml ada?", "aqua 600ml ada"),
+    ])
+    def test_normalized(self, message, key):
+        assert cache_key(message) == key
+
+    @pytest.mark.parametrize("message", [
+        "saya mau pesan aqua",
+        "batalkan pesanan",
+        "yang itu harganya berapa",
+        "aqua 2",
+        "",
+    ])
+    def test_not_cacheable(self, message):
+        assert cache_key(message) is None
+
+
+class TestCacheableProducts:
+    ROW = {"id": 2, "nama_barang": "Aqua Botol 600ml", "harga": 3500, "lokasi": "Kulkas Minuman"}
+
+    def test_product_rows_without_stock(self):
+        results = [json.dumps(self.ROW)]
+        assert cacheable_products(["get_product_details"], results, {"get_product_details"}) == {2: self.ROW}
+
+    @pytest.mark.parametrize("tool_names, row", [
+        (["get_product_details"], {**ROW, "stok": 12}),  # "masih ada 12 botol" would go stale after a sale
+        (["get_product_details"], {"error": "Produk tidak ditemukan."}),
+        (["get_product_details", "create_new_order"], ROW),
+        ([], ROW),
+    ])
+    def test_refused(self, tool_names, row):
+        assert cacheable_products(tool_names, [json.dumps(row)], {"get_product_details"}) is None
+
+    def test_non_json_result_is_refused(self):
+        assert cacheable_products(["get_product_details"], ["Error executing tool"], {"get_product_details"}) is None
+
+
+def test_mentions_product():
+    assert mentions_product("lokasi aqua di mana", ["Aqua Botol 600ml"])
+    assert not mentions_product("oke lanjut", ["Aqua Botol 600ml"])
+
+
+class TestResponseCache:
+    def test_hit_for_the_same_question(self, tmp_db):
+        produk_id = _create()
+        cache = ResponseCache()
+        versions = produk_database.get_product_versions_from_db([produk_id])
+
+        assert cache.put("Lokasi Aqua di mana?", "Aqua ada di Kulkas Minuman.", versions)
+
+        assert cache.get("lokasi aqua di mana", produk_database.get_product_versions_from_db) == "Aqua ada di Kulkas Minuman."
+        assert cache.stats()["hit_rate"] == 1.0
+
+    def test_product_update_invalidates(self, tmp_db):
+        produk_id = _create()
+        cache = ResponseCache()
+        cache.put("harga aqua", "Harga Aqua Rp3.500.", produk_database.get_product_versions_from_db([produk_id]))
+
+        produk = produk_database.get_product_from_db(produk_id)
+        produk_database.update_product_in_db(produk_id, {**produk, "harga": 4000})
+
+        assert cache.get("harga aqua", produk_database.get_product_versions_from_db) is None
+        assert len(cache) == 0
+        assert cache.stats()["stale"] == 1
+
+    def test_answers_survive_sales(self, tmp_db):
+        produk_id, other_id = _create(), _create("Teh Botol")
+        cache = ResponseCache()
+        cache.put("lokasi aqua", "Aqua ada di Kulkas Minuman.", produk_database.get_product_versions_from_db([produk_id]))
+
+        for _ in range(5):
+            produk_database.decrement_stock(produk_id, 1)
+            produk_database.increment_stock(produk_id, 1)
+            assert cache.get("lokasi aqua", produk_database.get_product_versions_from_db) == "Aqua ada di Kulkas Minuman."
+        assert produk_database.get_product_versions_from_db([produk_id, other_id]) == {produk_id: 0, other_id: 0}
+        assert cache.stats()["hit_rate"] == 1.0
+
+    def test_delete_invalidates(self, tmp_db):
+        produk_id = _create()
+        cache = ResponseCache()
+        cache.put("lokasi aqua", "Aqua ada di Kulkas Minuman.", produk_database.get_product_versions_from_db([produk_id]))
+
+        produk_database.delete_product_from_db(produk_id)
+
+        assert produk_database.get_product_versions_from_db([produk_id])[produk_id] == 1
+        assert cache.get("lokasi aqua", produk_database.get_product_versions_from_db) is None
+
+    def test_mutating_messages_are_never_served(self, tmp_db):
+        cache = ResponseCache()
+        assert not cache.put("pesan aqua", "Pesanan dibuat.", {})
+        assert cache.get("pesan aqua", produk_database.get_product_versions_from_db) is None
+        assert cache.stats()["bypassed"] == 1
+
+    def test_ttl(self, tmp_db):
+        clock = FakeClock()
+        cache = ResponseCache(ttl_seconds=60, clock=clock)
+        cache.put("jam buka warung", "Buka jam 7.", {})
+
+        clock.now += 59
+        assert cache.get("jam buka warung", produk_database.get_product_versions_from_db) == "Buka jam 7."
+        clock.now += 2
+        assert cache.get("jam buka warung", produk_database.get_product_versions_from_db) is None
+        assert cache.stats()["expired"] == 1
+
+    def test_lru_eviction(self, tmp_db):
+        cache = ResponseCache(maxsize=2)
+        lookup = produk_database.get_product_versions_from_db
+        cache.put("lokasi aqua", "a", {})
+        cache.put("lokasi teh", "b", {})
+        cache.get("lokasi aqua", lookup)
+        cache.put("lokasi kopi", "c", {})
+
+        assert cache.get("lokasi teh", lookup) is None
+        assert cache.get("lokasi aqua", lookup) == "a"
+        assert cache.stats()["evictions"] == 1
+
+
+def test_catalog_version_ignores_stock(tmp_db):
+    assert produk_database.get_catalog_version_from_db() == (0, 0)
+    produk_id = _create()
+    other_id = _create("Teh Botol")
+    versions = [produk_database.get_catalog_version_from_db()]
+
+    produk_database.decrement_stock(produk_id, 3)
+    versions.append(produk_database.get_catalog_version_from_db())
+    produk_database.update_product_in_db(produk_id, {**produk_database.get_product_from_db(produk_id), "lokasi": "Rak Depan"})
+    versions.append(produk_database.get_catalog_version_from_db())
+    produk_database.delete_product_from_db(other_id)
+    _create("Kopi Kapal Api")
+    versions.append(produk_database.get_catalog_version_from_db())
+
+    assert versions == [(2, 0), (2, 0), (2, 1), (2, 2)]
@@ -0,0 +1,92 @@
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import produk_database
+from produk import StockDecrement
+from produk_database import InsufficientStockError, decrement_stock, decrement_stock_bulk, increment_stock, increment_stock_bulk
+from produk_server import decrement_stock_bulk as decrement_stock_bulk_tool
+
+
+@pytest.fixture
+def produk_db(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "warung.db")
+    monkeypatch.setattr(produk_database, "DATABASE_NAME", db_path)
+    produk_database.init_db()
+    for nama_barang, stok in (("Indomie Goreng", 50), ("Aqua Botol 600ml", 3)):
+        produk_database.create_product_in_db({
+            "nama_barang": nama_barang,
+            "harga": 3000,
+            "lokasi": "Rak Depan",
+            "deskripsi_suara_lokasi": "Ada di rak depan.",
+            "path_qris": "/qris/default.png",
+            "stok": stok
+        })
+    return db_path
+
+
+def _stok(produk_id: int) -> int:
+    return produk_database.get_product_from_db(produk_id)["stok"]
+
+
+class TestDecrementStock:
+    def test_returns_new_stock(self, produk_db):
+        assert decrement_stock(1, 5) == 45
+        assert _stok(1) == 45
+
+    def test_refuses_to_go_negative(self, produk_db):
+        assert decrement_stock(2, 4) is None
+        assert _stok(2) == 3
+        assert decrement_stock(2, 4, allow_negative=True) == -1
+
+    def test_unknown_product_and_invalid_qty(self, produk_db):
+        assert decrement_stock(99, 1) is None
+        with pytest.raises(ValueError):
+            decrement_stock(1, 0)
+
+    def test_concurrent_sales_are_not_lost(self, produk_db):
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(lambda _: decrement_stock(1, 1), range(60)))
+        assert sum(r is not None for r in results) == 50
+        assert _stok(1) == 0
+
+
+class TestDecrementStockBulk:
+    def test_applies_whole_basket(self, produk_db):
+        basket = [{"produk_id": 1, "qty": 2}, {"produk_id": 2, "qty": 1}, {"produk_id": 1, "qty": 3}]
+        assert decrement_stock_bulk(basket) == {1: 45, 2: 2}
+
+    def test_all_or_nothing(self, produk_db):
+        with pytest.raises(InsufficientStockError) as exc_info:
+            decrement_stock_bulk([{"produk_id": 1, "qty": 2}, {"produk_id": 2, "qty": 10}])
+        assert exc_info.value.produk_id == 2
+        assert (_stok(1), _stok(2)) == (50, 3)
+
+    def test_tool_reports_error(self, produk_db):
+        result = json.loads(asyncio.run(decrement_stock_bulk_tool([StockDecrement(produk_id=2, qty=10)])))
+        assert result["produk_id"] == 2
+        assert _stok(2) == 3
+
+
+class TestIncrementStock:
+    def test_adds_to_stock_and_keeps_other_columns(self, produk_db):
+        before = produk_database.get_product_from_db(1)
+        assert increment_stock(1, 5) == 55
+        assert produk_database.get_product_from_db(1) == {**before, "stok": 55}
+        assert increment_stock(99, 1) is None
+        with pytest.raises(ValueError):
+            increment_stock(1, 0)
+
+    def test_concurrent_restock_and_sales_are_not_lost(self, produk_db):
+        def step(i):
+            return increment_stock(1, 2) if i % 2 else decrement_stock(1, 1)
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(step, range(40)))
+        assert _stok(1) == 50 + 20 * 2 - 20
+
+    def test_bulk_skips_missing_products(self, produk_db):
+        basket = [{"produk_id": 1, "qty": 2}, {"produk_id": 99, "qty": 1}, {"produk_id": 1, "qty": 3}]
+        assert increment_stock_bulk(basket) == {1: 55}
@@ -0,0 +1,99 @@
+import asyncio
+import time
+
+from langchain_core.tools import tool
+
+from tool_executor import execute_tool_calls
+
+DELAY = 0.2
+
+
+def build_tools(events):
+    @tool
+    async def get_product_details(produk_id: int) -> str:
+        """Get product details."""
+        events.append(("start", produk_id))
+        await asyncio.sleep(DELAY)
+        events.append(("end", produk_id))
+        return f"produk {produk_id}"
+
+    @tool
+    async def create_order(produk_id: int) -> str:
+        """Create an order."""
+        events.append(("start", f"order {produk_id}"))
+        await asyncio.sleep(DELAY / 4)
+        events.append(("end", f"order {produk_id}"))
+        return f"order {produk_id} dibuat"
+
+    @tool
+    async def broken_tool() -> str:
+        """Always fails."""
+        raise ValueError("boom")
+
+    return {t.name: t for t in (get_product_details, create_order, broken_tool)}
+
+
+def call(name, call_id, **args):
+    return {"name": name, "args": args, "id": call_id, "type": "tool_call"}
+
+
+def run(tool_calls, events, concurrency=4):
+    return asyncio.run(execute_tool_calls(tool_calls, build_tools(events), {"get_product_details"}, concurrency))
+
+
+def test_async_tool_returns_real_output():
+    tools = build_tools([])
+    assert tools["get_product_details"].func is None
+    results = run([call("get_product_details", "a", produk_id=1)], [])
+    assert results[0].content == "produk 1"
+    assert results[0].tool_call_id == "a"
+    assert results[0].response_metadata["duration_ms"] >= DELAY * 1000 * 0.9
+
+
+def test_read_only_calls_overlap():
+    events = []
+    started = time.perf_counter()
+    results = run([call("get_product_details", str(i), produk_id=i) for i in range(3)], events)
+    elapsed = time.perf_counter() - started
+    assert [r.content for r in results] == ["produk 0", "produk 1", "produk 2"]
+    assert elapsed < DELAY * 2
+    assert [kind for kind, _ in events[:3]] == ["start"] * 3
+
+
+def test_concurrency_limit_is_respected():
+    events = []
+    started = time.perf_counter()
+    run([call("get_product_details", str(i), produk_id=i) for i in range(2)], events, concurrency=1)
+    assert time.perf_counter() - started >= DELAY * 2 * 0.9
+    assert events == [("start", 0), ("end", 0), ("start", 1), ("end", 1)]
+
+
+def test_writes_are_serialized_in_order():
+    events = []
+    results = run([call("create_order", str(i), produk_id=i) for i in range(3)], events)
+    assert [r.content for r in results] == ["order 0 dibuat", "order 1 dibuat", "order 2 dibuat"]
+    assert events == [(kind, f"order {i}") for i in range(3) for kind in ("start", "end")]
+
+
+def test_errors_and_unknown_tools_become_messages():
+    results = run([call("broken_tool", "x"), call("missing", "y"), call("get_product_details", "z", produk_id=5)], [])
+    assert results[0].content == "Error executing tool broken_tool: boom"
+    assert results[1].content == "Error: Tool 'missing' tidak ditemukan."
+    assert results[2].content == "produk 5"
+    assert [r.tool_call_id for r in results] == ["x", "y", "z"]
+
+
+def test_calls_after_a_write_run_in_order():
+    events = []
+    results = run([
+        call("get_product_details", "a", produk_id=1),
+        call("get_product_details", "b", produk_id=2),
+        call("create_order", "c", produk_id=1),
+        call("get_product_details", "d", produk_id=3),
+        call("get_product_details", "e", produk_id=4),
+    ], events)
+    assert [r.tool_call_id for r in results] == ["a", "b", "c", "d", "e"]
+    assert set(events[:2]) == {("start", 1), ("start", 2)}  # reads before the write overlap
+    assert events[4:] == [
+        ("start", "order 1"), ("end", "order 1"), ("start", 3), ("end", 3), ("start", 4), ("end", 4),
+    ]
@@ -0,0 +1,144 @@
+import asyncio
+import sys
+import textwrap
+
+import pytest
+from mcp import StdioServerParameters
+
+from mcp_session import MCPSessionPool
+from tool_registry import ArgumentValidationError, ToolRegistry, UnknownToolError, compile_validator, get_tool_registry
+
+ECHO_SERVER = textwrap.dedent("""
+    from typing import List, Optional
+    from mcp.server.fastmcp import FastMCP
+
+    mcp = FastMCP("echo_server")
+    mcp._mcp_server.version = "{version}"
+
+    @mcp.tool()
+    async def echo(text: str, times: int = 1, tags: Optional[List[str]] = None) -> str:
+        return text * times
+
+    if __name__ == "__main__":
+        mcp.run(transport="stdio")
+""")
+
+
+@pytest.fixture
+def make_params(tmp_path):
+    def make(version: str) -> StdioServerParameters:
+        script = tmp_path / f"echo_server_{version}.py"
+        script.write_text(ECHO_SERVER.replace("{version}", version))
+        return StdioServerParameters(command=sys.executable, args=[str(script)])
+    return make
+
+
+class CountingPool(MCPSessionPool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.list_tools_calls = 0
+
+    async def list_tools(self):
+        self.list_tools_calls += 1
+        return await super().list_tools()
+
+
+SCHEMA = {
+    "type": "object",
+    "properties": {
+        "produk_id": {"type": "integer"},
+        "nama": {"anyOf": [{"type": "string"}, {"type": "null"}]},
+        "harga": {"type": "number"},
+        "aktif": {"type": "boolean"},
+        "items": {"type": "array", "items": {"$ref": "#/$defs/Item"}},
+        "detail": {"$ref": "#/$defs/Detail"},
+    },
+    "required": ["produk_id"],
+    "additionalProperties": False,
+}
+
+
+class TestCompileValidator:
+    @pytest.mark.parametrize("args", [
+        {"produk_id": 1},
+        {"produk_id": 1, "nama": None, "harga": 2.5, "aktif": True, "items": [], "detail": "anything"},
+        {"produk_id": 1, "harga": 3},
+    ])
+    def test_valid(self, args):
+        compile_validator("t", SCHEMA)(args)
+
+    @pytest.mark.parametrize("args, problem", [
+        ({}, "'produk_id' wajib diisi"),
+        ({"produk_id": 1, "stok": 2}, "'stok' tidak dikenal"),
+        ({"produk_id": "1"}, "'produk_id' bertipe str"),
+        ({"produk_id": True}, "'produk_id' bertipe bool"),
+        ({"produk_id": 1, "aktif": 1}, "'aktif' bertipe int"),
+        ({"produk_id": 1, "items": {}}, "'items' bertipe dict"),
+    ])
+    def test_invalid(self, args, problem):
+        with pytest.raises(ArgumentValidationError) as excinfo:
+            compile_validator("t", SCHEMA)(args)
+        assert problem in excinfo.value.problems
+
+
+class TestToolRegistry:
+    def test_discovers_once_per_version(self, make_params):
+        async def scenario():
+            pool = CountingPool("echo", make_params("1.0"), size=2)
+            registry = ToolRegistry(pool)
+            try:
+                for _ in range(5):
+                    await registry.load()
+                built = [await registry.derived("openai", lambda specs: object()) for _ in range(3)]
+                spec = await registry.get("echo")
+                return pool.list_tools_calls, registry.version, built, spec
+            finally:
+                await pool.stop()
+
+        calls, version, built, spec = asyncio.run(scenario())
+        assert calls == 1
+        assert version == ("echo_server", "1.0")
+        assert built[0] is built[1] is built[2]
+        assert spec.input_schema["additionalProperties"] is False
+        assert spec.input_schema["required"] == ["text"]
+
+    def test_new_server_version_rediscovers(self, make_params):
+        async def scenario():
+            pool = CountingPool("echo", make_params("1.0"), size=1)
+            registry = ToolRegistry(pool)
+            try:
+                await registry.load()
+                # The server is replaced by a newer build and restarted
+                await pool.stop()
+                pool.params = pool.workers[0].params = make_params("1.1")
+                await pool.workers[0].restart()
+                await registry.load()
+                await registry.load()
+                return pool.list_tools_calls, registry.version
+            finally:
+                await pool.stop()
+
+        calls, version = asyncio.run(scenario())
+        assert calls == 2
+        assert version == ("echo_server", "1.1")
+
+    def test_validate_and_unknown_tool(self, make_params):
+        async def scenario():
+            pool = MCPSessionPool("echo", make_params("1.0"), size=1)
+            registry = ToolRegistry(pool)
+            try:
+                await registry.validate("echo", {"text": "a", "times": 2})
+                with pytest.raises(ArgumentValidationError):
+                    await registry.validate("echo", {"text": "a", "times": "2"})
+                with pytest.raises(UnknownToolError):
+                    await registry.get("missing")
+            finally:
+                await pool.stop()
+
+        asyncio.run(scenario())
+
+
+def test_get_tool_registry_is_shared_per_pool(make_params):
+    pool = MCPSessionPool("echo-shared", make_params("1.0"), size=1)
+    assert get_tool_registry(pool) is get_tool_registry(pool)
+    assert get_tool_registry(MCPSessionPool("echo-shared", make_params("1.0"), size=1)) is not get_tool_registry(pool)
@@ -0,0 +1,63 @@
+import asyncio
+import logging
+import time
+from typing import Any, Collection, Dict, List, Mapping
+
+from langchain_core.messages import ToolMessage
+from langchain_core.tools import BaseTool
+
+logger = logging.getLogger("tool_executor")
+
+
+async def execute_tool_call(
+    tool_call: Dict[str, Any],
+    tools_by_name: Mapping[str, BaseTool],
+    semaphore: asyncio.Semaphore,
+) -> ToolMessage:
+    """
+    Run one tool call from an AIMessage and return its ToolMessage.
+
+    The tool is run with ainvoke(), which works for both async and sync
+    LangChain tools (for an `async def` @tool, .func is None). Errors become
+    the ToolMessage content instead of propagating, and the duration in ms
+    is stored in response_metadata["duration_ms"].
+    """
+    tool_name = tool_call["name"]
+    selected_tool = tools_by_name.get(tool_name)
+    if selected_tool is None:
+        return ToolMessage(content=f"Error: Tool '{tool_name}' tidak ditemukan.", tool_call_id=tool_call["id"])
+
+    tool_args = tool_call["args"]
+    async with semaphore:
+        started = time.perf_counter()
+        try:
+            logger.info("Executing tool %s with args %s", tool_name, tool_args)
+            content = str(await selected_tool.ainvoke(tool_args))
+        except Exception as e:
+            logger.warning("Error executing tool %s: %s", tool_name, e)
+            content = f"Error executing tool {tool_name}: {str(e)}"
+        duration_ms = round((time.perf_counter() - started) * 1000, 1)
+    return ToolMessage(content=content, tool_call_id=tool_call["id"], response_metadata={"duration_ms": duration_ms})
+
+
+async def execute_tool_calls(
+    tool_calls: List[Dict[str, Any]],
+    tools_by_name: Mapping[str, BaseTool],
+    read_only: Collection[str],
+    concurrency: int,
+) -> List[ToolMessage]:
+    """
+    Run the tool calls of one AIMessage and return their ToolMessages in tool_calls order.
+
+    The calls before the first tool not in `read_only` run concurrently, at
+    most `concurrency` at a time. From the first write on, calls run one at
+    a time in order, so a read the model placed after a write sees its effect.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    first_write = next((i for i, tool_call in enumerate(tool_calls) if tool_call["name"] not in read_only), len(tool_calls))
+    results = list(await asyncio.gather(
+        *(execute_tool_call(tool_call, tools_by_name, semaphore) for tool_call in tool_calls[:first_write])
+    ))
+    for tool_call in tool_calls[first_write:]:
+        results.append(await execute_tool_call(tool_call, tools_by_name, semaphore))
+    return results
@@ -0,0 +1,181 @@
+import asyncio
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+try:
+    from mcp_session import MCPSessionPool
+except ImportError:  # imported as app.mcp_sample.tool_registry (produk_client, transaction_client)
+    from app.mcp_sample.mcp_session import MCPSessionPool
+
+# JSON schema type -> accepted Python types
+_JSON_TYPES: Dict[str, Tuple[type, ...]] = {
+    "string": (str,),
+    "integer": (int,),
+    "number": (int, float),
+    "boolean": (bool,),
+    "array": (list, tuple),
+    "object": (dict,),
+    "null": (type(None),),
+}
+
+
+class ArgumentValidationError(ValueError):
+    """Raised when tool arguments do not match the tool's input schema."""
+
+    def __init__(self, tool_name: str, problems: List[str]):
+        super().__init__(f"Argumen tool '{tool_name}' tidak valid: {'; '.join(problems)}")
+        self.tool_name = tool_name
+        self.problems = problems
+
+
+class UnknownToolError(KeyError):
+    """Raised when a tool name is not offered by the server."""
+
+
+def _accepted_types(property_schema: Dict[str, Any]) -> Optional[Tuple[type, ...]]:
+    """Python types a property accepts, or None if its schema is not a plain type ($ref, untyped)."""
+    accepted: List[type] = []
+    for option in property_schema.get("anyOf") or property_schema.get("oneOf") or [property_schema]:
+        json_type = option.get("type")
+        if json_type is None:
+            return None
+        for name in json_type if isinstance(json_type, list) else [json_type]:
+            if name not in _JSON_TYPES:
+                return None
+            accepted.extend(_JSON_TYPES[name])
+    return tuple(accepted)
+
+
+def compile_validator(tool_name: str, schema: Dict[str, Any]) -> Callable[[Dict[str, Any]], None]:
+    """
+    Turn a tool's input schema into a check of its top-level arguments.
+
+    The schema is read once here; the returned function only does set and
+    isinstance checks: required arguments, unknown arguments and argument
+    types. Nested structures (items, $ref models) are left to the server.
+    """
+    properties: Dict[str, Any] = schema.get("properties") or {}
+    required = frozenset(schema.get("required") or ())
+    known = frozenset(properties)
+    types = {name: _accepted_types(prop) for name, prop in properties.items()}
+    types = {name: accepted for name, accepted in types.items() if accepted is not None}
+    allows_bool = {name for name, accepted in types.items() if bool in accepted}
+
+    def validate(args: Dict[str, Any]):
+        if not isinstance(args, dict):
+            raise ArgumentValidationError(tool_name, [f"argumen harus object, didapat {type(args).__name__}"])
+        problems = [f"'{name}' wajib diisi" for name in sorted(required - args.keys())]
+        problems += [f"'{name}' tidak dikenal" for name in sorted(args.keys() - known)]
+        for name, value in args.items():
+            accepted = types.get(name)
+            if accepted is None:
+                continue
+            # bool is an int in Python, but not an integer in JSON schema
+            if not isinstance(value, accepted) or (isinstance(value, bool) and name not in allows_bool):
+                problems.append(f"'{name}' bertipe {type(value).__name__}")
+        if problems:
+            raise ArgumentValidationError(tool_name, problems)
+
+    return validate
+
+
+class ToolSpec(NamedTuple):
+    name: str
+    description: str
+    input_schema: Dict[str, Any]  # with additionalProperties: false, ready for OpenAI function calling
+    validate: Callable[[Dict[str, Any]], None]
+
+
+class ToolRegistry:
+    """
+    Tool schemas of one MCP server, discovered once per server version.
+
+    The version is the serverInfo the server reports in the initialize
+    handshake, which the pool keeps anyway, so checking it costs no round
+    trip. list_tools runs only on first use and when a (restarted) server
+    reports another version. Lookups by name are dict lookups, and each
+    tool's argument validator is compiled when the schemas are loaded.
+    Objects built from the schemas (e.g. OpenAI FunctionTools) can be
+    cached alongside with derived().
+    """
+
+    def __init__(self, pool: MCPSessionPool):
+        self.pool = pool
+        self.discoveries = 0
+        self._version: Optional[Tuple[str, str]] = None
+        self._tools: Dict[str, ToolSpec] = {}
+        self._derived: Dict[str, Any] = {}
+        self._lock: Optional[asyncio.Lock] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def version(self) -> Optional[Tuple[str, str]]:
+        """(server name, server version) the cached schemas belong to."""
+        return self._version
+
+    async def load(self) -> Dict[str, ToolSpec]:
+        """The tools by name, discovering them only if the server version changed."""
+        version = await self._server_version()
+        if version == self._version and self._tools:
+            return self._tools
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop, self._lock = loop, asyncio.Lock()
+        async with self._lock:
+            version = await self._server_version()
+            if version != self._version or not self._tools:
+                tools = await self.pool.list_tools()
+                self._tools = {t.name: self._spec(t) for t in tools}
+                self._derived.clear()
+                self._version = version
+                self.discoveries += 1
+        return self._tools
+
+    async def get(self, name: str) -> ToolSpec:
+        tools = await self.load()
+        try:
+            return tools[name]
+        except KeyError:
+            raise UnknownToolError(f"Tool '{name}' tidak tersedia di server '{self.pool.name}'") from None
+
+    async def validate(self, name: str, args: Dict[str, Any]):
+        """Raise UnknownToolError or ArgumentValidationError if the call cannot succeed."""
+        (await self.get(name)).validate(args)
+
+    async def derived(self, key: str, build: Callable[[List[ToolSpec]], Any]) -> Any:
+        """build(specs) once per server version, e.g. the FunctionTools handed to an agent."""
+        tools = await self.load()
+        if key not in self._derived:
+            self._derived[key] = build(list(tools.values()))
+        return self._derived[key]
+
+    def invalidate(self):
+        """Forget the schemas; the next load() discovers them again."""
+        self._version = None
+        self._tools = {}
+        self._derived.clear()
+
+    async def _server_version(self) -> Optional[Tuple[str, str]]:
+        info = self.pool.server_info
+        if info is None:
+            await self.pool.start()
+            info = self.pool.server_info
+        return (info.name, info.version) if info is not None else None
+
+    @staticmethod
+    def _spec(tool: Any) -> ToolSpec:
+        schema = tool.inputSchema or {"type": "object", "properties": {}}
+        schema = {**schema, "additionalProperties": False}
+        return ToolSpec(tool.name, tool.description or "", schema, compile_validator(tool.name, schema))
+
+
+# One registry per pool, shared by produk_client and transaction_client
+_registries: Dict[str, ToolRegistry] = {}
+
+
+def get_tool_registry(pool: MCPSessionPool) -> ToolRegistry:
+    """Return the shared registry for `pool`, creating it on first use."""
+    registry = _registries.get(pool.name)
+    if registry is None or registry.pool is not pool:
+        registry = ToolRegistry(pool)
+        _registries[pool.name] = registry
+    return registry
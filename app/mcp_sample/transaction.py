@@ -7,6 +7,7 @@ from transaction_database import (
     create_transaction_in_db,
     get_transaction_from_db,
     get_all_transactions_from_db,
+    get_last_transaction_from_db,
     update_transaction_in_db,
     delete_transaction_from_db,
     create_detail_transaction_in_db,
@@ -14,7 +15,12 @@ from transaction_database import (
     get_all_detail_transactions_from_db,
     update_detail_transaction_in_db,
     delete_detail_transaction_from_db,
-    get_detail_transactions_by_transaction_id
+    get_detail_transactions_by_transaction_id,
+    create_order_in_db,
+    get_transactions_with_details_from_db,
+    get_detail_transactions_page_from_db,
+    get_order_with_items_from_db,
+    cancel_order_in_db
 )
 from produk import ProdukService, ProdukCreationRequest, Produk
 
@@ -74,6 +80,24 @@ class TransactionWithDetails(BaseModel):
     transaction: Transaction
     detail_transactions: List[DetailTransaction]
 
+class OrderItem(BaseModel):
+    """
+    Satu item pesanan beserta nama produknya.
+    """
+    id: int = Field(..., description="ID detail transaksi")
+    produk_id: int = Field(..., description="ID produk")
+    nama_barang: Optional[str] = Field(None, description="Nama produk (None jika produk sudah dihapus)")
+    qty: int = Field(..., description="Jumlah produk yang dibeli")
+    harga_per_produk: int = Field(..., description="Harga per produk dalam mata uang lokal (misal: Rupiah)")
+    total_harga_produk: int = Field(..., description="Total harga produk dalam mata uang lokal (misal: Rupiah)")
+
+class OrderWithItems(BaseModel):
+    """
+    Model Pydantic untuk pesanan (header transaksi) beserta item dan nama produknya.
+    """
+    transaction: Transaction
+    items: List[OrderItem]
+
 class TransactionWithDetailsCreationRequest(BaseModel):
     """
     Model untuk membuat transaksi baru dengan detailnya, id tidak diperlukan.
@@ -150,59 +174,47 @@ class TransactionService:
     def get_last_transaction() -> Optional[Transaction]:
         """Get the last transaction based on the highest ID."""
         logger.info("get_last_transaction called")
-        all_transactions = TransactionService.get_all_transactions()
-        if not all_transactions:
+        # Assuming higher ID means more recent transaction; one primary key lookup
+        transaction_data = get_last_transaction_from_db()
+        if transaction_data is None:
             logger.info("get_last_transaction: No transactions found.")
             return None
-        # Assuming higher ID means more recent transaction
-        last_transaction = max(all_transactions, key=lambda t: t.id)
+        last_transaction = Transaction(**transaction_data)
         logger.info(f"get_last_transaction returning {last_transaction}")
         return last_transaction
 
     @staticmethod
-    def create_transaction_with_details(transaction_with_details_data: TransactionWithDetailsCreationRequest) -> TransactionWithDetails:
-        """Create a new transaction along with its detail transactions and update product stock."""
-        logger.info(f"create_transaction_with_details called with transaction_with_details_data={transaction_with_details_data}")
+    def create_transaction_with_details(
+        transaction_with_details_data: TransactionWithDetailsCreationRequest, allow_negative: bool = False
+    ) -> TransactionWithDetails:
+        """Create a new transaction along with its detail transactions and update product stock.
 
-        # Create the main transaction
-        transaction_data_for_db = transaction_with_details_data.model_dump(exclude={'detail_transactions'})
-        transaction_id = create_transaction_in_db(transaction_data_for_db)
-        new_transaction = Transaction(id=transaction_id, **transaction_data_for_db)
+        All rows and stock decrements are committed together or not at all;
+        raises ValueError if a product cannot be found and
+        InsufficientStockError if a product is short on stock.
+        """
+        logger.info(f"create_transaction_with_details called with transaction_with_details_data={transaction_with_details_data}")
 
-        # Create detail transactions and update product stock
-        created_detail_transactions: List[DetailTransaction] = []
+        # Resolve products before writing anything
         for detail_req_data in transaction_with_details_data.detail_transactions:
-            # Assign the newly created transaction_id to each detail transaction
-            detail_req_data.transaction_id = new_transaction.id
-            detail_req_data.produk_id = ProdukService.get_produk_by_name(detail_req_data.product_name).id
+            if detail_req_data.produk_id > 0:
+                continue
+            produk = ProdukService.get_produk_by_name(detail_req_data.product_name)
+            if produk is None:
+                raise ValueError(f"Produk '{detail_req_data.product_name}' tidak ditemukan")
+            detail_req_data.produk_id = produk.id
 
-            detail_transaction_id = create_detail_transaction_in_db(detail_req_data.model_dump())
-            new_detail_transaction = DetailTransaction(id=detail_transaction_id, **detail_req_data.model_dump())
-            created_detail_transactions.append(new_detail_transaction)
-
-            # Update product stock
-            try:
-                produk = ProdukService.get_produk(new_detail_transaction.produk_id)
-                if produk:
-                    if produk.stok < new_detail_transaction.qty:
-                        print(f"Warning: Product {produk.id} stock ({produk.stok}) is less than requested quantity ({new_detail_transaction.qty}). Stock will go negative.")
-
-                    new_stock = produk.stok - new_detail_transaction.qty
-                    
-                    update_data = ProdukCreationRequest(
-                        nama_barang=produk.nama_barang,
-                        harga=produk.harga,
-                        lokasi=produk.lokasi,
-                        deskripsi_suara_lokasi=produk.deskripsi_suara_lokasi,
-                        path_qris=produk.path_qris,
-                        stok=new_stock
-                    )
-                    ProdukService.update_produk(new_detail_transaction.produk_id, update_data)
-                else:
-                    print(f"Error: Product with ID {new_detail_transaction.produk_id} not found. Stock not updated for detail transaction {new_detail_transaction.id}.")
-            except Exception as e:
-                print(f"Error updating product stock for product ID {new_detail_transaction.produk_id}: {e}")
+        transaction_data_for_db = transaction_with_details_data.model_dump(exclude={'detail_transactions'})
+        detail_transactions_data = [d.model_dump() for d in transaction_with_details_data.detail_transactions]
+        transaction_id, detail_transaction_ids = create_order_in_db(
+            transaction_data_for_db, detail_transactions_data, allow_negative=allow_negative
+        )
 
+        new_transaction = Transaction(id=transaction_id, **transaction_data_for_db)
+        created_detail_transactions = [
+            DetailTransaction(id=detail_id, **{**detail_data, "transaction_id": transaction_id})
+            for detail_id, detail_data in zip(detail_transaction_ids, detail_transactions_data)
+        ]
         result = TransactionWithDetails(transaction=new_transaction, detail_transactions=created_detail_transactions)
         logger.info(f"create_transaction_with_details returning {result}")
         return result
@@ -224,15 +236,46 @@ class TransactionService:
         return result
 
     @staticmethod
-    def get_all_transactions_with_details() -> List[TransactionWithDetails]:
-        """Get all transactions along with their detail transactions."""
-        logger.info("get_all_transactions_with_details called")
-        all_transactions = TransactionService.get_all_transactions()
-        
+    def get_order_with_items(transaction_id: int) -> Optional[OrderWithItems]:
+        """Get a transaction with its items and product names from one joined query. None if it does not exist."""
+        logger.info(f"get_order_with_items called with transaction_id={transaction_id}")
+        data = get_order_with_items_from_db(transaction_id)
+        if data is None:
+            logger.info(f"get_order_with_items: Transaction with id {transaction_id} not found")
+            return None
+        result = OrderWithItems(transaction=Transaction(**data["transaction"]), items=[OrderItem(**item) for item in data["items"]])
+        logger.info(f"get_order_with_items returning {len(result.items)} items")
+        return result
+
+    @staticmethod
+    def get_all_transactions_with_details(
+        limit: Optional[int] = None,
+        offset: int = 0,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        status: Optional[str] = None,
+        after_id: Optional[int] = None,
+    ) -> List[TransactionWithDetails]:
+        """Get transactions along with their detail transactions, optionally paged and filtered by date and status.
+
+        Headers, details and the referenced products are loaded with one
+        query each, however many transactions there are. Pass the last ID of
+        the previous page as after_id to page by keyset instead of offset.
+        """
+        logger.info(f"get_all_transactions_with_details called with limit={limit}, offset={offset}, start_date={start_date}, end_date={end_date}, status={status}, after_id={after_id}")
+        rows = get_transactions_with_details_from_db(
+            limit=limit, offset=offset, start_date=start_date, end_date=end_date, status=status, after_id=after_id
+        )
+        produk_ids = {detail["produk_id"] for row in rows for detail in row["detail_transactions"]}
+        produk_by_id = ProdukService.get_produk_by_ids(list(produk_ids))
+
         transactions_with_details: List[TransactionWithDetails] = []
-        for transaction in all_transactions:
-            detail_transactions = DetailTransactionService.get_detail_transactions_by_transaction_id(transaction.id)
-            transactions_with_details.append(TransactionWithDetails(transaction=transaction, detail_transactions=detail_transactions))
+        for row in rows:
+            detail_transactions = [
+                DetailTransaction(**detail, produk=produk_by_id.get(detail["produk_id"]))
+                for detail in row.pop("detail_transactions")
+            ]
+            transactions_with_details.append(TransactionWithDetails(transaction=Transaction(**row), detail_transactions=detail_transactions))
         
         logger.info(f"get_all_transactions_with_details returning {len(transactions_with_details)} transactions with details")
         return transactions_with_details
@@ -386,6 +429,17 @@ class TransactionService:
         logger.info(f"delete_transaction_with_details returning {result}")
         return result
 
+    @staticmethod
+    def cancel_transaction(transaction_id: int) -> Optional[Dict[str, Any]]:
+        """Cancel an order: delete the transaction and its details and restore product stock in one transaction.
+
+        Returns None if the transaction does not exist (see cancel_order_in_db for the result).
+        """
+        logger.info(f"cancel_transaction called with transaction_id={transaction_id}")
+        result = cancel_order_in_db(transaction_id)
+        logger.info(f"cancel_transaction returning {result}")
+        return result
+
     @staticmethod
     def to_json_report_with_details(transaction_with_details: TransactionWithDetails) -> str:
         """Convert a transaction with details to a JSON string."""
@@ -420,28 +474,29 @@ class DetailTransactionService:
         """Get all detail transactions."""
         logger.info("get_all_detail_transactions called")
         detail_transaction_data = get_all_detail_transactions_from_db()
-        result = []
-        for data in detail_transaction_data:
-            detail_transaction = DetailTransaction(**data)
-            produk = ProdukService.get_produk(detail_transaction.produk_id)
-            if produk:
-                detail_transaction.produk = produk
-            result.append(detail_transaction)
+        produk_by_id = ProdukService.get_produk_by_ids(list({data["produk_id"] for data in detail_transaction_data}))
+        result = [DetailTransaction(**data, produk=produk_by_id.get(data["produk_id"])) for data in detail_transaction_data]
         logger.info(f"get_all_detail_transactions returning {len(result)} detail transactions")
         return result
     
+    @staticmethod
+    def get_detail_transactions_page(after_id: int = 0, limit: int = 50) -> List[DetailTransaction]:
+        """Get up to `limit` detail transactions with an ID greater than after_id, ordered by ID."""
+        logger.info(f"get_detail_transactions_page called with after_id={after_id}, limit={limit}")
+        detail_transaction_data = get_detail_transactions_page_from_db(after_id, limit)
+        produk_by_id = ProdukService.get_produk_by_ids(list({data["produk_id"] for data in detail_transaction_data}))
+        result = [DetailTransaction(**data, produk=produk_by_id.get(data["produk_id"])) for data in detail_transaction_data]
+        logger.info(f"get_detail_transactions_page returning {len(result)} detail transactions")
+        return result
+
     @staticmethod
     def get_detail_transactions_by_transaction_id(transaction_id: int) -> List[DetailTransaction]:
         """Get all detail transactions by transaction_id."""
         logger.info(f"get_detail_transactions_by_transaction_id called with transaction_id={transaction_id}")
         detail_transaction_data = get_detail_transactions_by_transaction_id(transaction_id)
-        result = []
-        for data in detail_transaction_data:
-            detail_transaction = DetailTransaction(**data)
-            produk = ProdukService.get_produk(detail_transaction.produk_id)
-            if produk:
-                detail_transaction.produk = produk
-            result.append(detail_transaction)
+        # One IN (...) query for the products instead of one get_produk per row
+        produk_by_id = ProdukService.get_produk_by_ids(list({data["produk_id"] for data in detail_transaction_data}))
+        result = [DetailTransaction(**data, produk=produk_by_id.get(data["produk_id"])) for data in detail_transaction_data]
         logger.info(f"get_detail_transactions_by_transaction_id returning {len(result)} detail transactions")
         return result
     
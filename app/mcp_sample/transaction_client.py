@@ -1,100 +1,108 @@
-import mcp
-from mcp.client.stdio import stdio_client
 from mcp import StdioServerParameters
 from agents import FunctionTool # Assuming agents.py and FunctionTool are in the accessible path
 import json
-from typing import List, Dict, Any, Optional
+from typing import AsyncIterator, List, Dict, Any, Optional
 import os
 import asyncio
+
+from app.config import Config
+from app.mcp_sample.mcp_session import MCPSessionPool, get_session_pool
+from app.mcp_sample.paging import iter_pages
+from app.mcp_sample.tool_registry import ToolSpec, get_tool_registry
 print(os.getcwd())
 # Parameters to run the transaction_server.py
-transaction_params = StdioServerParameters(command="uv", args=["run", "app/mcp/transaction_server.py"], env=None)
+transaction_params = StdioServerParameters(command="uv", args=["run", "app/mcp_sample/transaction_server.py"], env=None)
+
+def get_transaction_pool() -> MCPSessionPool:
+    """Returns the shared pool of warm transaction_server sessions."""
+    return get_session_pool("transaction_server", transaction_params, size=Config.MCP_POOL_SIZE)
 
 async def list_transaction_tools() -> List[Any]:
     """Lists all available tools from the transaction_server."""
-    async with stdio_client(transaction_params) as streams:
-        async with mcp.ClientSession(*streams) as session:
-            await session.initialize()
-            tools_result = await session.list_tools()
-            return tools_result.tools
+    return await get_transaction_pool().list_tools()
 
 async def call_transaction_tool(tool_name: str, tool_args: Dict[str, Any]) -> str:
     """Calls a specific tool on the transaction_server with given arguments.
        Returns the text content from the tool call result as a string.
        Raises Exception if the tool call fails or content is not as expected.
     """
-    async with stdio_client(transaction_params) as streams:
-        async with mcp.ClientSession(*streams) as session:
-            await session.initialize()
-            tool_result = await session.call_tool(tool_name, tool_args)
-            
-            if tool_result.isError:
-                error_message = f"Tool call '{tool_name}' failed."
-                if tool_result.content and len(tool_result.content) > 0 and hasattr(tool_result.content[0], 'text') and tool_result.content[0].text:
-                    error_message += f" Details: {tool_result.content[0].text}"
-                raise Exception(error_message)
-
-            if tool_result.content and len(tool_result.content) > 0 and hasattr(tool_result.content[0], 'text') and tool_result.content[0].text is not None:
-                return tool_result.content[0].text
-            else:
-                raise Exception(f"Tool call '{tool_name}' returned no valid text content. Result: {tool_result}")
+    tool_result = await get_transaction_pool().call_tool(tool_name, tool_args)
+
+    if tool_result.isError:
+        error_message = f"Tool call '{tool_name}' failed."
+        if tool_result.content and len(tool_result.content) > 0 and hasattr(tool_result.content[0], 'text') and tool_result.content[0].text:
+            error_message += f" Details: {tool_result.content[0].text}"
+        raise Exception(error_message)
+
+    if tool_result.content and len(tool_result.content) > 0 and hasattr(tool_result.content[0], 'text') and tool_result.content[0].text is not None:
+        return tool_result.content[0].text
+    else:
+        raise Exception(f"Tool call '{tool_name}' returned no valid text content. Result: {tool_result}")
+
+async def call_transaction_batch(operations: List[Dict[str, Any]], atomic: bool = True) -> List[Dict[str, Any]]:
+    """Runs several transaction_server operations in a single batch_call round trip.
+       Each operation is {"tool": <name>, "args": {...}}. Returns one
+       {"index", "tool", "ok", "result", "error"} dict per operation.
+    """
+    result_str = await call_transaction_tool("batch_call", {"operations": operations, "atomic": atomic})
+    return json.loads(result_str)
+
+def iter_transaction_pages(limit: int = 50, fields: Optional[List[str]] = None, **filters: Any) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Streams get_all_transactions one page at a time. filters: start_date, end_date, status."""
+    async def fetch_page(cursor: Optional[int]) -> str:
+        return await call_transaction_tool("get_all_transactions", {"cursor": cursor, "limit": limit, "fields": fields, **filters})
+    return iter_pages(fetch_page)
+
+def iter_detail_transaction_pages(limit: int = 50, fields: Optional[List[str]] = None) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Streams get_all_detail_transactions one page at a time."""
+    async def fetch_page(cursor: Optional[int]) -> str:
+        return await call_transaction_tool("get_all_detail_transactions", {"cursor": cursor, "limit": limit, "fields": fields})
+    return iter_pages(fetch_page)
 
 # --- Resource Reading Functions ---
 async def read_transaction_resource(transaction_id: int) -> Optional[str]:
     """Reads a specific transaction resource by its ID."""
-    async with stdio_client(transaction_params) as streams:
-        async with mcp.ClientSession(*streams) as session:
-            await session.initialize()
-            resource_uri = f"transaction://transaction_server/transaction/{transaction_id}"
-            result = await session.read_resource(resource_uri)
-            if result.contents and result.contents[0].text:
-                return result.contents[0].text
-            return None
-
-async def read_all_transactions_resource() -> List[str]:
-    """Reads the resource listing all transactions."""
-    async with stdio_client(transaction_params) as streams:
-        async with mcp.ClientSession(*streams) as session:
-            await session.initialize()
-            resource_uri = "transaction://transaction_server/all_transactions"
-            result = await session.read_resource(resource_uri)
-            return [content.text for content in result.contents if content.text]
+    resource_uri = f"transaction://transaction_server/transaction/{transaction_id}"
+    result = await get_transaction_pool().read_resource(resource_uri)
+    if result.contents and result.contents[0].text:
+        return result.contents[0].text
+    return None
+
+async def read_all_transactions_resource(cursor: Optional[int] = None) -> Dict[str, Any]:
+    """Reads one page of the transactions resource: {"items": [...], "next_cursor": <id or null>}."""
+    resource_uri = "transaction://transaction_server/all_transactions"
+    if cursor is not None:
+        resource_uri += f"/after/{cursor}"
+    result = await get_transaction_pool().read_resource(resource_uri)
+    return json.loads(result.contents[0].text)
 
 async def read_detail_transaction_resource(detail_transaction_id: int) -> Optional[str]:
     """Reads a specific detail_transaction resource by its ID."""
-    async with stdio_client(transaction_params) as streams:
-        async with mcp.ClientSession(*streams) as session:
-            await session.initialize()
-            resource_uri = f"transaction://transaction_server/detail_transaction/{detail_transaction_id}"
-            result = await session.read_resource(resource_uri)
-            if result.contents and result.contents[0].text:
-                return result.contents[0].text
-            return None
+    resource_uri = f"transaction://transaction_server/detail_transaction/{detail_transaction_id}"
+    result = await get_transaction_pool().read_resource(resource_uri)
+    if result.contents and result.contents[0].text:
+        return result.contents[0].text
+    return None
 
 async def read_all_detail_transactions_resource() -> List[str]:
     """Reads the resource listing all detail_transactions."""
-    async with stdio_client(transaction_params) as streams:
-        async with mcp.ClientSession(*streams) as session:
-            await session.initialize()
-            resource_uri = "transaction://transaction_server/all_detail_transactions"
-            result = await session.read_resource(resource_uri)
-            return [content.text for content in result.contents if content.text]
+    resource_uri = "transaction://transaction_server/all_detail_transactions"
+    result = await get_transaction_pool().read_resource(resource_uri)
+    return [content.text for content in result.contents if content.text]
+
+def _openai_tool(spec: ToolSpec) -> FunctionTool:
+    async def invoke(ctx: Any, args: Any) -> str:
+        tool_args = json.loads(args) if isinstance(args, str) else args
+        spec.validate(tool_args)  # bad arguments from the LLM fail here, without a round trip
+        return await call_transaction_tool(spec.name, tool_args)
+    return FunctionTool(name=spec.name, description=spec.description, params_json_schema=spec.input_schema, on_invoke_tool=invoke)
 
 async def get_transaction_tools_openai() -> List[FunctionTool]:
-    """Gets all transaction tools formatted for OpenAI function calling."""
-    openai_tools = []
-    tools = await list_transaction_tools()
-    for tool in tools:
-        schema = {**tool.inputSchema, "additionalProperties": False} if tool.inputSchema else {"type": "object", "properties": {}, "additionalProperties": False}
-        
-        openai_tool = FunctionTool(
-            name=tool.name,
-            description=tool.description,
-            params_json_schema=schema,
-            on_invoke_tool=lambda ctx, args, toolname=tool.name: call_transaction_tool(toolname, json.loads(args) if isinstance(args, str) else args)
-        )
-        openai_tools.append(openai_tool)
-    return openai_tools
+    """Gets all transaction tools formatted for OpenAI function calling.
+       Schemas are discovered and the FunctionTools built once per transaction_server version.
+    """
+    registry = get_tool_registry(get_transaction_pool())
+    return await registry.derived("openai", lambda specs: [_openai_tool(spec) for spec in specs])
 
 # Example Usage (requires an async runtime)
 async def main():
@@ -187,16 +195,12 @@ async def main():
         
         # --- Listing All ---
         print("\nListing all transactions...")
-        all_transactions_response_str = await call_transaction_tool("get_all_transactions", {})
-        all_transactions_json_strings = json.loads(all_transactions_response_str)
-        all_transactions_parsed = [json.loads(tx_str) for tx_str in all_transactions_json_strings]
-        print(f"All Transactions: {all_transactions_parsed}")
+        async for page in iter_transaction_pages(limit=20):
+            print(f"Transactions page: {page}")
 
         print("\nListing all detail transactions...")
-        all_detail_transactions_response_str = await call_transaction_tool("get_all_detail_transactions", {})
-        all_detail_transactions_json_strings = json.loads(all_detail_transactions_response_str)
-        all_detail_transactions_parsed = [json.loads(dt_str) for dt_str in all_detail_transactions_json_strings]
-        print(f"All Detail Transactions: {all_detail_transactions_parsed}")
+        async for page in iter_detail_transaction_pages(limit=20, fields=["transaction_id", "produk_id", "qty"]):
+            print(f"Detail Transactions page: {page}")
 
         # --- Reading Resources ---
         if transaction_id:
@@ -205,9 +209,8 @@ async def main():
             print(f"Transaction Resource (JSON): {transaction_resource_json}")
         
         print("\nReading all transactions resource...")
-        all_transactions_res_json_list = await read_all_transactions_resource()
-        print(f"All Transactions Resource (JSON List): {all_transactions_res_json_list}")
-        # Similar to get_all_transactions tool, the read_all_transactions_resource in server needs a return.
+        all_transactions_res_page = await read_all_transactions_resource()
+        print(f"All Transactions Resource (first page): {all_transactions_res_page}")
 
 
         if detail_transaction_id:
@@ -1,7 +1,15 @@
 import sqlite3
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
 
 # from setup_logs import setup_logger
+try:
+    from db_connection import batch_transaction, get_connection
+    from migrations import apply_migrations
+    import produk_database
+except ImportError:  # imported as app.mcp_sample.transaction_database (app/main.py, streamlit_app.py)
+    from app.mcp_sample.db_connection import batch_transaction, get_connection
+    from app.mcp_sample.migrations import apply_migrations
+    from app.mcp_sample import produk_database
 
 DATABASE_NAME = "src/data/warung.db"
 
@@ -11,74 +19,31 @@ DATABASE_NAME = "src/data/warung.db"
 
 def init_db():
     # logger.info("init_db called")
-    """Initialize the database and create transaction and detail_transaction tables if they don't exist."""
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-    
-    cursor.execute("DROP TABLE IF EXISTS transactions")
-    cursor.execute("DROP TABLE IF EXISTS detail_transactions")
-
-    # Create transactions table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS transactions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            tanggal_transaksi TEXT NOT NULL,
-            total_harga_transaksi INTEGER NOT NULL,
-            status TEXT,
-            metode_pembayaran TEXT,
-            catatan TEXT
-        )
-    """)
-    
-    # Create detail_transactions table
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS detail_transactions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            transaction_id INTEGER NOT NULL,
-            produk_id INTEGER NOT NULL,
-            qty INTEGER NOT NULL,
-            harga_per_produk INTEGER NOT NULL,
-            total_harga_produk INTEGER NOT NULL,
-            FOREIGN KEY (transaction_id) REFERENCES transactions (id),
-            FOREIGN KEY (produk_id) REFERENCES produk (id) 
-        )
-    """)
-    conn.commit()
-    conn.close()
+    """Create or upgrade the transactions and detail_transactions schema. Existing data is kept."""
+    apply_migrations(DATABASE_NAME)
     # logger.info("init_db finished")
 
 # Transaction CRUD operations
 def create_transaction_in_db(transaction_data: Dict[str, Any]) -> int:
     # logger.info(f"create_transaction_in_db called with transaction_data={transaction_data}")
     """Create a new transaction in the database."""
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-    transaction_id = None
-    try:
+    with get_connection(DATABASE_NAME) as conn:
+        cursor = conn.cursor()
         cursor.execute("""
             INSERT INTO transactions (tanggal_transaksi, total_harga_transaksi, status, metode_pembayaran, catatan)
             VALUES (:tanggal_transaksi, :total_harga_transaksi, :status, :metode_pembayaran, :catatan)
         """, transaction_data)
         transaction_id = cursor.lastrowid
-        conn.commit()
         # logger.info(f"create_transaction_in_db returning transaction_id={transaction_id}")
-    except sqlite3.Error as e:
-        conn.rollback()
-        # logger.error(f"Database error during create_transaction_in_db: {e}")
-        raise
-    finally:
-        conn.close()
     return transaction_id
 
 def get_transaction_from_db(transaction_id: int) -> Optional[Dict[str, Any]]:
     # logger.info(f"get_transaction_from_db called with transaction_id={transaction_id}")
     """Retrieve a transaction by its ID from the database."""
-    conn = sqlite3.connect(DATABASE_NAME)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM transactions WHERE id = ?", (transaction_id,))
-    row = cursor.fetchone()
-    conn.close()
+    with get_connection(DATABASE_NAME) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM transactions WHERE id = ?", (transaction_id,))
+        row = cursor.fetchone()
     if row:
         # logger.info(f"get_transaction_from_db returning row={dict(row)}")
         return dict(row)
@@ -88,23 +53,28 @@ def get_transaction_from_db(transaction_id: int) -> Optional[Dict[str, Any]]:
 def get_all_transactions_from_db() -> List[Dict[str, Any]]:
     # logger.info("get_all_transactions_from_db called")
     """Retrieve all transactions from the database."""
-    conn = sqlite3.connect(DATABASE_NAME)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM transactions")
-    rows = cursor.fetchall()
-    conn.close()
+    with get_connection(DATABASE_NAME) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM transactions")
+        rows = cursor.fetchall()
     # logger.info(f"get_all_transactions_from_db returning {len(rows)} rows")
     return [dict(row) for row in rows]
 
+def get_last_transaction_from_db() -> Optional[Dict[str, Any]]:
+    # logger.info("get_last_transaction_from_db called")
+    """Retrieve the transaction with the highest ID (the most recent one) from the database."""
+    with get_connection(DATABASE_NAME) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM transactions ORDER BY id DESC LIMIT 1")
+        row = cursor.fetchone()
+    # logger.info(f"get_last_transaction_from_db returning {dict(row) if row else None}")
+    return dict(row) if row else None
+
 def update_transaction_in_db(transaction_id: int, transaction_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     # logger.info(f"update_transaction_in_db called with transaction_id={transaction_id}, transaction_data={transaction_data}")
     """Update an existing transaction in the database."""
-    conn = sqlite3.connect(DATABASE_NAME)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    updated_row = None
-    try:
+    with get_connection(DATABASE_NAME) as conn:
+        cursor = conn.cursor()
         cursor.execute("SELECT * FROM transactions WHERE id = ?", (transaction_id,))
         if not cursor.fetchone():
             # logger.info("update_transaction_in_db: transaction not found, returning None")
@@ -119,17 +89,10 @@ def update_transaction_in_db(transaction_id: int, transaction_data: Dict[str, An
                 catatan = :catatan
             WHERE id = :id
         """, {**transaction_data, "id": transaction_id})
-        conn.commit()
-        
+
         cursor.execute("SELECT * FROM transactions WHERE id = ?", (transaction_id,))
         updated_row = cursor.fetchone()
         # logger.info(f"update_transaction_in_db returning updated_row={dict(updated_row)}")
-    except sqlite3.Error as e:
-        conn.rollback()
-        # logger.error(f"Database error during update_transaction_in_db: {e}")
-        raise
-    finally:
-        conn.close()
     if updated_row:
         return dict(updated_row)
     # logger.info("update_transaction_in_db returning None")
@@ -138,54 +101,99 @@ def update_transaction_in_db(transaction_id: int, transaction_data: Dict[str, An
 def delete_transaction_from_db(transaction_id: int) -> bool:
     # logger.info(f"delete_transaction_from_db called with transaction_id={transaction_id}")
     """Delete a transaction by its ID from the database."""
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-    deleted_rows = 0
-    try:
+    with get_connection(DATABASE_NAME) as conn:
+        cursor = conn.cursor()
         cursor.execute("DELETE FROM transactions WHERE id = ?", (transaction_id,))
-        conn.commit()
         deleted_rows = cursor.rowcount
         # logger.info(f"delete_transaction_from_db returning {deleted_rows > 0}")
-    except sqlite3.Error as e:
-        conn.rollback()
-        # logger.error(f"Database error during delete_transaction_from_db: {e}")
-        raise
-    finally:
-        conn.close()
     return deleted_rows > 0
 
+def create_order_in_db(
+    transaction_data: Dict[str, Any], detail_transactions_data: List[Dict[str, Any]], allow_negative: bool = False
+) -> Tuple[int, List[int]]:
+    """Create a transaction, its detail rows and the stock decrements as one order.
+
+    Everything runs in a single BEGIN IMMEDIATE transaction: the header
+    insert, one executemany for all detail rows and one decrement per
+    product. If any product is missing or short on stock,
+    produk_database.InsufficientStockError is raised and nothing is written.
+    Returns the new transaction ID and the detail transaction IDs in input order.
+    """
+    # The produk table lives in the same database file, so the second
+    # batch_transaction joins the first and the stock decrements share its commit.
+    with batch_transaction(DATABASE_NAME) as conn, batch_transaction(produk_database.DATABASE_NAME):
+        cursor = conn.cursor()
+        cursor.execute("""
+            INSERT INTO transactions (tanggal_transaksi, total_harga_transaksi, status, metode_pembayaran, catatan)
+            VALUES (:tanggal_transaksi, :total_harga_transaksi, :status, :metode_pembayaran, :catatan)
+        """, transaction_data)
+        transaction_id = cursor.lastrowid
+
+        cursor.executemany("""
+            INSERT INTO detail_transactions (transaction_id, produk_id, qty, harga_per_produk, total_harga_produk)
+            VALUES (:transaction_id, :produk_id, :qty, :harga_per_produk, :total_harga_produk)
+        """, [{**detail, "transaction_id": transaction_id} for detail in detail_transactions_data])
+
+        produk_database.decrement_stock_bulk(
+            [{"produk_id": detail["produk_id"], "qty": detail["qty"]} for detail in detail_transactions_data],
+            allow_negative=allow_negative,
+        )
+
+        cursor.execute("SELECT id FROM detail_transactions WHERE transaction_id = ? ORDER BY id", (transaction_id,))
+        detail_transaction_ids = [row["id"] for row in cursor.fetchall()]
+    # logger.info(f"create_order_in_db returning transaction_id={transaction_id}, detail_transaction_ids={detail_transaction_ids}")
+    return transaction_id, detail_transaction_ids
+
+def cancel_order_in_db(transaction_id: int) -> Optional[Dict[str, Any]]:
+    """Delete a transaction with its detail rows and put the sold quantities back in stock, as one unit.
+
+    Runs in a single BEGIN IMMEDIATE transaction, so a concurrent sale or
+    cancel sees either the whole order or none of it. Stock is restored with
+    produk_database.increment_stock_bulk (stok = stok + qty), never by
+    writing back a stock value read earlier. Returns None if the transaction
+    does not exist, else {"transaction_id", "deleted_details", "restored_stock",
+    "missing_produk_ids"}; products deleted since the sale cannot be restocked
+    and are listed in missing_produk_ids.
+    """
+    with batch_transaction(DATABASE_NAME) as conn, batch_transaction(produk_database.DATABASE_NAME):
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM transactions WHERE id = ?", (transaction_id,))
+        if cursor.rowcount == 0:
+            return None
+        cursor.execute("SELECT produk_id, qty FROM detail_transactions WHERE transaction_id = ? ORDER BY id", (transaction_id,))
+        items = [dict(row) for row in cursor.fetchall()]
+        cursor.execute("DELETE FROM detail_transactions WHERE transaction_id = ?", (transaction_id,))
+        deleted_details = cursor.rowcount
+        restored_stock = produk_database.increment_stock_bulk([item for item in items if item["qty"] > 0])
+    # logger.info(f"cancel_order_in_db returning restored_stock={restored_stock}")
+    return {
+        "transaction_id": transaction_id,
+        "deleted_details": deleted_details,
+        "restored_stock": restored_stock,
+        "missing_produk_ids": sorted({item["produk_id"] for item in items} - set(restored_stock)),
+    }
+
 # DetailTransaction CRUD operations
 def create_detail_transaction_in_db(detail_transaction_data: Dict[str, Any]) -> int:
     # logger.info(f"create_detail_transaction_in_db called with detail_transaction_data={detail_transaction_data}")
     """Create a new detail_transaction in the database."""
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-    detail_transaction_id = None
-    try:
+    with get_connection(DATABASE_NAME) as conn:
+        cursor = conn.cursor()
         cursor.execute("""
             INSERT INTO detail_transactions (transaction_id, produk_id, qty, harga_per_produk, total_harga_produk)
             VALUES (:transaction_id, :produk_id, :qty, :harga_per_produk, :total_harga_produk)
         """, detail_transaction_data)
         detail_transaction_id = cursor.lastrowid
-        conn.commit()
         # logger.info(f"create_detail_transaction_in_db returning detail_transaction_id={detail_transaction_id}")
-    except sqlite3.Error as e:
-        conn.rollback()
-        # logger.error(f"Database error during create_detail_transaction_in_db: {e}")
-        raise
-    finally:
-        conn.close()
     return detail_transaction_id
 
 def get_detail_transaction_from_db(detail_transaction_id: int) -> Optional[Dict[str, Any]]:
     # logger.info(f"get_detail_transaction_from_db called with detail_transaction_id={detail_transaction_id}")
     """Retrieve a detail_transaction by its ID from the database."""
-    conn = sqlite3.connect(DATABASE_NAME)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM detail_transactions WHERE id = ?", (detail_transaction_id,))
-    row = cursor.fetchone()
-    conn.close()
+    with get_connection(DATABASE_NAME) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM detail_transactions WHERE id = ?", (detail_transaction_id,))
+        row = cursor.fetchone()
     if row:
         # logger.info(f"get_detail_transaction_from_db returning row={dict(row)}")
         return dict(row)
@@ -195,23 +203,18 @@ def get_detail_transaction_from_db(detail_transaction_id: int) -> Optional[Dict[
 def get_all_detail_transactions_from_db() -> List[Dict[str, Any]]:
     # logger.info("get_all_detail_transactions_from_db called")
     """Retrieve all detail_transactions from the database."""
-    conn = sqlite3.connect(DATABASE_NAME)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM detail_transactions")
-    rows = cursor.fetchall()
-    conn.close()
+    with get_connection(DATABASE_NAME) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM detail_transactions")
+        rows = cursor.fetchall()
     # logger.info(f"get_all_detail_transactions_from_db returning {len(rows)} rows")
     return [dict(row) for row in rows]
 
 def update_detail_transaction_in_db(detail_transaction_id: int, detail_transaction_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     # logger.info(f"update_detail_transaction_in_db called with detail_transaction_id={detail_transaction_id}, detail_transaction_data={detail_transaction_data}")
     """Update an existing detail_transaction in the database."""
-    conn = sqlite3.connect(DATABASE_NAME)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    updated_row = None
-    try:
+    with get_connection(DATABASE_NAME) as conn:
+        cursor = conn.cursor()
         cursor.execute("SELECT * FROM detail_transactions WHERE id = ?", (detail_transaction_id,))
         if not cursor.fetchone():
             # logger.info("update_detail_transaction_in_db: detail_transaction not found, returning None")
@@ -226,17 +229,10 @@ def update_detail_transaction_in_db(detail_transaction_id: int, detail_transacti
                 total_harga_produk = :total_harga_produk
             WHERE id = :id
         """, {**detail_transaction_data, "id": detail_transaction_id})
-        conn.commit()
 
         cursor.execute("SELECT * FROM detail_transactions WHERE id = ?", (detail_transaction_id,))
         updated_row = cursor.fetchone()
         # logger.info(f"update_detail_transaction_in_db returning updated_row={dict(updated_row)}")
-    except sqlite3.Error as e:
-        conn.rollback()
-        # logger.error(f"Database error during update_detail_transaction_in_db: {e}")
-        raise
-    finally:
-        conn.close()
     if updated_row:
         return dict(updated_row)
     # logger.info("update_detail_transaction_in_db returning None")
@@ -245,34 +241,134 @@ def update_detail_transaction_in_db(detail_transaction_id: int, detail_transacti
 def delete_detail_transaction_from_db(detail_transaction_id: int) -> bool:
     # logger.info(f"delete_detail_transaction_from_db called with detail_transaction_id={detail_transaction_id}")
     """Delete a detail_transaction by its ID from the database."""
-    conn = sqlite3.connect(DATABASE_NAME)
-    cursor = conn.cursor()
-    deleted_rows = 0
-    try:
+    with get_connection(DATABASE_NAME) as conn:
+        cursor = conn.cursor()
         cursor.execute("DELETE FROM detail_transactions WHERE id = ?", (detail_transaction_id,))
-        conn.commit()
         deleted_rows = cursor.rowcount
         # logger.info(f"delete_detail_transaction_from_db returning {deleted_rows > 0}")
-    except sqlite3.Error as e:
-        conn.rollback()
-        # logger.error(f"Database error during delete_detail_transaction_from_db: {e}")
-        raise
-    finally:
-        conn.close()
     return deleted_rows > 0
 
 def get_detail_transactions_by_transaction_id(transaction_id: int) -> List[Dict[str, Any]]:
     # logger.info(f"get_detail_transactions_by_transaction_id called with transaction_id={transaction_id}")
     """Retrieve all detail_transactions by transaction_id from the database."""
-    conn = sqlite3.connect(DATABASE_NAME)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM detail_transactions WHERE transaction_id = ?", (transaction_id,))
-    rows = cursor.fetchall()
-    conn.close()
+    with get_connection(DATABASE_NAME) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM detail_transactions WHERE transaction_id = ?", (transaction_id,))
+        rows = cursor.fetchall()
     # logger.info(f"get_detail_transactions_by_transaction_id returning {len(rows)} rows")
     return [dict(row) for row in rows]
 
+def get_order_with_items_from_db(transaction_id: int) -> Optional[Dict[str, Any]]:
+    # logger.info(f"get_order_with_items_from_db called with transaction_id={transaction_id}")
+    """Retrieve a transaction with its items and their product names in one joined query.
+
+    Returns {"transaction": {...}, "items": [...]} with the items ordered by
+    detail ID, or None if the transaction does not exist. nama_barang is
+    None for an item whose product has since been deleted.
+    """
+    with get_connection(DATABASE_NAME) as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT t.id, t.tanggal_transaksi, t.total_harga_transaksi, t.status, t.metode_pembayaran, t.catatan,
+                   d.id AS detail_id, d.produk_id, p.nama_barang, d.qty, d.harga_per_produk, d.total_harga_produk
+            FROM transactions t
+            LEFT JOIN detail_transactions d ON d.transaction_id = t.id
+            LEFT JOIN produk p ON p.id = d.produk_id
+            WHERE t.id = ?
+            ORDER BY d.id
+        """, (transaction_id,))
+        rows = cursor.fetchall()
+    if not rows:
+        # logger.info("get_order_with_items_from_db returning None")
+        return None
+    first = rows[0]
+    transaction = {key: first[key] for key in ("id", "tanggal_transaksi", "total_harga_transaksi", "status", "metode_pembayaran", "catatan")}
+    items = [
+        {
+            "id": row["detail_id"],
+            "produk_id": row["produk_id"],
+            "nama_barang": row["nama_barang"],
+            "qty": row["qty"],
+            "harga_per_produk": row["harga_per_produk"],
+            "total_harga_produk": row["total_harga_produk"],
+        }
+        for row in rows if row["detail_id"] is not None
+    ]
+    # logger.info(f"get_order_with_items_from_db returning {len(items)} items")
+    return {"transaction": transaction, "items": items}
+
+def get_detail_transactions_by_produk_id(produk_id: int) -> List[Dict[str, Any]]:
+    # logger.info(f"get_detail_transactions_by_produk_id called with produk_id={produk_id}")
+    """Retrieve all detail_transactions (sales) of one product from the database."""
+    with get_connection(DATABASE_NAME) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM detail_transactions WHERE produk_id = ? ORDER BY id", (produk_id,))
+        rows = cursor.fetchall()
+    # logger.info(f"get_detail_transactions_by_produk_id returning {len(rows)} rows")
+    return [dict(row) for row in rows]
+
+def get_detail_transactions_page_from_db(after_id: int = 0, limit: int = 50) -> List[Dict[str, Any]]:
+    # logger.info(f"get_detail_transactions_page_from_db called with after_id={after_id}, limit={limit}")
+    """Retrieve up to `limit` detail_transactions with an ID greater than after_id, ordered by ID (keyset paging)."""
+    with get_connection(DATABASE_NAME) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM detail_transactions WHERE id > ? ORDER BY id LIMIT ?", (after_id, limit))
+        rows = cursor.fetchall()
+    # logger.info(f"get_detail_transactions_page_from_db returning {len(rows)} rows")
+    return [dict(row) for row in rows]
+
+def get_transactions_with_details_from_db(
+    limit: Optional[int] = None,
+    offset: int = 0,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    status: Optional[str] = None,
+    after_id: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """Retrieve transactions with their detail_transactions in two queries.
+
+    Transactions are ordered by ID. start_date and end_date (YYYY-MM-DD) are
+    inclusive bounds on tanggal_transaksi and status filters on an exact
+    status; limit/offset page through the filtered transactions. after_id
+    starts the page after that transaction ID, which unlike a large offset
+    does not read the skipped rows. Each returned transaction dict has a
+    "detail_transactions" list.
+    """
+    conditions = []
+    params: Dict[str, Any] = {"limit": -1 if limit is None else limit, "offset": offset}
+    if after_id is not None:
+        conditions.append("id > :after_id")
+        params["after_id"] = after_id
+    if start_date:
+        conditions.append("tanggal_transaksi >= :start_date")
+        params["start_date"] = start_date
+    if end_date:
+        # Exclusive upper bound so "2024-05-01 10:00" still counts for end_date 2024-05-01
+        conditions.append("tanggal_transaksi < date(:end_date, '+1 day')")
+        params["end_date"] = end_date
+    if status:
+        conditions.append("status = :status")
+        params["status"] = status
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+    with get_connection(DATABASE_NAME) as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT * FROM transactions {where} ORDER BY id LIMIT :limit OFFSET :offset", params)
+        transactions = {row["id"]: {**dict(row), "detail_transactions": []} for row in cursor.fetchall()}
+        if transactions:
+            # The page's IDs are bound, not re-selected: a transaction inserted or
+            # cancelled after the first query cannot shift the page for the details.
+            placeholders = ", ".join("?" for _ in transactions)
+            cursor.execute(f"""
+                SELECT * FROM detail_transactions
+                WHERE transaction_id IN ({placeholders})
+                ORDER BY transaction_id, id
+            """, list(transactions))
+            for row in cursor.fetchall():
+                transactions[row["transaction_id"]]["detail_transactions"].append(dict(row))
+    # logger.info(f"get_transactions_with_details_from_db returning {len(transactions)} transactions")
+    return list(transactions.values())
+
 if __name__ == '__main__':
     init_db() # Ensure tables are created
 
@@ -4,17 +4,28 @@ from mcp.server.fastmcp import FastMCP
 # from setup_logs import setup_logger
 from setup_logs import setup_logger
 from transaction import (
+    DetailTransaction,
     DetailTransactionCreationRequest,
+    DetailTransactionService,
+    Transaction,
     TransactionCreationRequest,
     TransactionService,
     TransactionWithDetailsCreationRequest
 )
+import transaction_database
+from batch import BatchOperation, execute_batch, to_json_report as batch_to_json_report
+from paging import DEFAULT_PAGE_LIMIT, check_fields, clamp_limit, to_page_json
 import json
 from typing import List, Optional
 import logging
 from pathlib import Path
 print(os.getcwd())
 mcp = FastMCP("transaction_server")
+# Reported to clients in the initialize handshake; they cache the tool schemas
+# per version (tool_registry.py), so bump it whenever a tool or its arguments change.
+# FastMCP() takes no version argument, so it is set on the underlying server.
+SERVER_VERSION = "1.1"
+mcp._mcp_server.version = SERVER_VERSION
 
 # logger = setup_logger("transaction_server", log_filename="warung.log")
 
@@ -109,21 +120,125 @@ async def get_transaction(transaction_id: int) -> Optional[str]:
     return TransactionService.to_json_report_with_details(transaction_with_details)
 
 @mcp.tool()
-async def get_all_transactions() -> List[str]:
-    """Get all transactions, including their detail transactions.
+async def get_detail_transactions_by_transaction_id(transaction_id: int) -> str:
+    """Get the detail transactions (items) of one transaction.
+
+    Args:
+        transaction_id (int): The unique identifier of the transaction.
+
+    Returns:
+        str: A JSON array of detail transactions, each with its product. Empty if the transaction has no items.
+
+    Example Usage:
+        '''python
+        details = await get_detail_transactions_by_transaction_id(123)
+        '''
+    """
+    # logger.info(f"get_detail_transactions_by_transaction_id called with transaction_id={transaction_id}")
+    detail_transactions = DetailTransactionService.get_detail_transactions_by_transaction_id(transaction_id)
+    # logger.info(f"get_detail_transactions_by_transaction_id SUCCESS for transaction_id={transaction_id}")
+    return json.dumps([detail.model_dump() for detail in detail_transactions])
+
+@mcp.tool()
+async def get_order_with_items(transaction_id: int) -> str:
+    """Get an order: the transaction header with its items and their product names, in one query.
+
+    Args:
+        transaction_id (int): The unique identifier of the transaction.
 
     Returns:
-        List[str]: A list of JSON strings, where each string represents a transaction with its details.
+        str: A JSON object {"transaction": {...}, "items": [{"id", "produk_id", "nama_barang", "qty",
+            "harga_per_produk", "total_harga_produk"}, ...]}, or {"error"} if the transaction does not exist.
 
     Example Usage:
         '''python
-        all_transactions = await get_all_transactions()
+        order = await get_order_with_items(123)
+        '''
+    """
+    # logger.info(f"get_order_with_items called with transaction_id={transaction_id}")
+    order = TransactionService.get_order_with_items(transaction_id)
+    if order is None:
+        return json.dumps({"error": f"Transaction with id {transaction_id} not found"})
+    # logger.info(f"get_order_with_items SUCCESS for transaction_id={transaction_id}")
+    return order.model_dump_json()
+
+@mcp.tool()
+async def get_all_transactions(
+    limit: Optional[int] = DEFAULT_PAGE_LIMIT,
+    offset: int = 0,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    status: Optional[str] = None,
+    cursor: Optional[int] = None,
+    fields: Optional[List[str]] = None
+) -> str:
+    """Get transactions, including their detail transactions, a page at a time.
+
+    Args:
+        limit (Optional[int]): Maximum number of transactions per page (default 50, max 200).
+        offset (int): Number of transactions to skip (ordered by ID). Prefer cursor for paging.
+        start_date (Optional[str]): Only transactions on or after this date (YYYY-MM-DD).
+        end_date (Optional[str]): Only transactions on or before this date (YYYY-MM-DD).
+        status (Optional[str]): Only transactions with this status (e.g., "pending", "success", "failed").
+        cursor (Optional[int]): next_cursor from the previous page; omit for the first page.
+        fields (Optional[List[str]]): Only return these transaction fields, e.g. ["tanggal_transaksi", "total_harga_transaksi"].
+            Add "detail_transactions" to also get the items. "id" is always included.
+
+    Returns:
+        str: A JSON object {"items": [{"transaction": {...}, "detail_transactions": [...]}, ...], "next_cursor": <id or null>}.
+            Call again with cursor=next_cursor until it is null. {"error"} if a field is unknown.
+
+    Example Usage:
+        '''python
+        may_transactions = await get_all_transactions(start_date="2024-05-01", end_date="2024-05-31")
+        next_page = await get_all_transactions(start_date="2024-05-01", end_date="2024-05-31", cursor=50)
+        totals_only = await get_all_transactions(fields=["tanggal_transaksi", "total_harga_transaksi"])
         '''
     """
     # logger.info("get_all_transactions called")
-    transactions_with_details = TransactionService.get_all_transactions_with_details()
+    try:
+        include = _transaction_projection(fields)
+    except ValueError as e:
+        return json.dumps({"error": str(e)})
+    limit = clamp_limit(limit)
+    transactions_with_details = TransactionService.get_all_transactions_with_details(
+        limit=limit + 1, offset=offset, start_date=start_date, end_date=end_date, status=status, after_id=cursor
+    )
     # logger.info("get_all_transactions SUCCESS")
-    return [TransactionService.to_json_report_with_details(t) for t in transactions_with_details]
+    return to_page_json(transactions_with_details, limit, include=include, cursor_of=lambda t: t.transaction.id)
+
+@mcp.tool()
+async def get_all_detail_transactions(cursor: Optional[int] = None, limit: int = DEFAULT_PAGE_LIMIT, fields: Optional[List[str]] = None) -> str:
+    """Get detail transactions (the sold items of every transaction) a page at a time, ordered by ID.
+
+    Args:
+        cursor (Optional[int]): next_cursor from the previous page; omit for the first page.
+        limit (int): Maximum number of detail transactions per page (default 50, max 200).
+        fields (Optional[List[str]]): Only return these fields, e.g. ["transaction_id", "produk_id", "qty"]. "id" is always included.
+
+    Returns:
+        str: A JSON object {"items": [...], "next_cursor": <id or null>}.
+            Call again with cursor=next_cursor until it is null. {"error"} if a field is unknown.
+    """
+    # logger.info(f"get_all_detail_transactions called with cursor={cursor}, limit={limit}, fields={fields}")
+    try:
+        fields = check_fields(fields, list(DetailTransaction.model_fields))
+    except ValueError as e:
+        return json.dumps({"error": str(e)})
+    limit = clamp_limit(limit)
+    detail_transactions = DetailTransactionService.get_detail_transactions_page(after_id=cursor or 0, limit=limit + 1)
+    # logger.info("get_all_detail_transactions SUCCESS")
+    return to_page_json(detail_transactions, limit, include=set(fields) if fields else None)
+
+def _transaction_projection(fields: Optional[List[str]]):
+    """model_dump include for TransactionWithDetails from a list of transaction fields."""
+    fields = check_fields(fields, list(Transaction.model_fields) + ["detail_transactions"])
+    if fields is None:
+        return None
+    include = {"transaction": {f for f in fields if f != "detail_transactions"}}
+    if "detail_transactions" in fields:
+        include["detail_transactions"] = True
+    return include
 
 @mcp.tool()
 async def update_transaction(
@@ -210,6 +325,74 @@ async def delete_transaction() -> bool:
     # logger.info(f"delete_transaction SUCCESS for transaction_id={transaction_id}, result={result}")
     return result
 
+@mcp.tool()
+async def cancel_transaction(transaction_id: int) -> str:
+    """Cancel an order: delete the transaction and its detail transactions and put the quantities back in stock.
+
+    Everything happens in one database transaction, so the order is either fully cancelled or left untouched.
+
+    Args:
+        transaction_id (int): The unique identifier of the transaction to cancel.
+
+    Returns:
+        str: A JSON object {"transaction_id", "deleted_details", "restored_stock": {produk_id: new stock},
+            "missing_produk_ids"}, or {"error"} if the transaction does not exist.
+
+    Example Usage:
+        '''python
+        result = await cancel_transaction(123)
+        '''
+    """
+    # logger.info(f"cancel_transaction called with transaction_id={transaction_id}")
+    result = TransactionService.cancel_transaction(transaction_id)
+    if result is None:
+        return json.dumps({"error": f"Transaction with id {transaction_id} not found"})
+    # logger.info(f"cancel_transaction SUCCESS for transaction_id={transaction_id}")
+    return json.dumps(result)
+
+# Operations that may be combined in one batch_call
+BATCH_HANDLERS = {
+    "create_transaction": create_transaction,
+    "get_transaction": get_transaction,
+    "get_detail_transactions_by_transaction_id": get_detail_transactions_by_transaction_id,
+    "get_order_with_items": get_order_with_items,
+    "get_all_transactions": get_all_transactions,
+    "get_all_detail_transactions": get_all_detail_transactions,
+    "update_transaction": update_transaction,
+    "delete_transaction": delete_transaction,
+    "cancel_transaction": cancel_transaction,
+}
+
+@mcp.tool()
+async def batch_call(operations: List[BatchOperation], atomic: bool = True) -> str:
+    """Run several transaction operations in one call and one database transaction.
+
+    Args:
+        operations (List[BatchOperation]): Sub-operations, each {"tool": <name>, "args": {...}}.
+            Available tools: create_transaction, get_transaction, get_detail_transactions_by_transaction_id,
+            get_order_with_items, get_all_transactions, get_all_detail_transactions, update_transaction,
+            delete_transaction, cancel_transaction.
+            Example: '''
+            [
+                {"tool": "get_transaction", "args": {"transaction_id": 1}},
+                {"tool": "get_transaction", "args": {"transaction_id": 2}}
+            ]
+            '''
+        atomic (bool): If true, any failing operation rolls back the whole batch.
+            If false, only the failing operations are rolled back.
+
+    Returns:
+        str: A JSON array with one result per operation: {"index", "tool", "ok", "result", "error"}.
+
+    Example Usage:
+        '''python
+        result = await batch_call([{"tool": "get_transaction", "args": {"transaction_id": 1}}])
+        '''
+    """
+    # logger.info(f"batch_call called with operations={operations}, atomic={atomic}")
+    results = await execute_batch(operations, BATCH_HANDLERS, transaction_database.DATABASE_NAME, atomic=atomic)
+    return batch_to_json_report(results)
+
 @mcp.resource("transaction://transaction_server/transaction/{transaction_id}")
 async def read_transaction_resource(transaction_id: int) -> Optional[str]:
     """Read a transaction by its ID.
@@ -232,21 +415,31 @@ async def read_transaction_resource(transaction_id: int) -> Optional[str]:
     return TransactionService.to_json_report_with_details(transaction_with_details)
 
 @mcp.resource("transaction://transaction_server/all_transactions")
-async def read_all_transactions_resource() -> List[str]:
-    """Read all transactions.
+async def read_all_transactions_resource() -> str:
+    """Read the first page of transactions, ordered by ID.
 
     Returns:
-        List[str]: A list of JSON strings, where each string represents a transaction with its details.
+        str: A JSON object {"items": [...], "next_cursor": <id or null>}. The next page is
+            transaction://transaction_server/all_transactions/after/{next_cursor}.
 
     Example Usage:
         '''python
-        all_transactions_resource = await read_all_transactions_resource())
+        first_page = await read_all_transactions_resource()
         '''
     """
     # logger.info("read_all_transactions_resource called")
-    transactions_with_details = TransactionService.get_all_transactions_with_details()
+    return await read_transactions_page_resource(0)
+
+@mcp.resource("transaction://transaction_server/all_transactions/after/{cursor}")
+async def read_transactions_page_resource(cursor: int) -> str:
+    """Read the page of transactions that follows transaction ID `cursor`.
+
+    Returns:
+        str: A JSON object {"items": [...], "next_cursor": <id or null>}.
+    """
+    transactions_with_details = TransactionService.get_all_transactions_with_details(limit=DEFAULT_PAGE_LIMIT + 1, after_id=int(cursor))
     # logger.info("read_all_transactions_resource SUCCESS")
-    return [TransactionService.to_json_report_with_details(t) for t in transactions_with_details]
+    return to_page_json(transactions_with_details, DEFAULT_PAGE_LIMIT, cursor_of=lambda t: t.transaction.id)
 
 if __name__ == "__main__":
     mcp.run()
\ No newline at end of file
@@ -1,9 +1,9 @@
 import streamlit as st
 import pandas as pd
 import json
-import datetime
 import os
-from typing import Any, List
+import asyncio
+from typing import Any, Dict, List, Tuple
 
 st.set_page_config(layout="wide")
 
@@ -15,8 +15,12 @@ from agents.mcp import MCPServerStdio
 os.chdir('/home/lenov/Documents/warung')
 
 # --- Database and Product Initialization ---
-from app.mcp_sample.produk_database import init_db as init_db_produk, create_product_in_db
+from app.mcp_sample.produk_database import init_db as init_db_produk, create_product_in_db, get_catalog_version_from_db, has_products_in_db
 from app.mcp_sample.transaction_database import init_db as init_db_transaction
+from app.mcp_sample.history_manager import ConversationMemory, HistoryManager
+from app.mcp_sample.paging import PAGE_LIMIT_MAX
+from app.mcp_sample.product_retrieval import ProductRetriever, render_product_context
+from app.config import Config
 
 sample_product_data_list = [
     {
@@ -102,18 +106,21 @@ sample_product_data_list = [
 ]
 
 def reset_db():
+    # Only pending schema migrations are applied; existing data is kept
     init_db_produk()
     init_db_transaction()
 
-    for product_data in sample_product_data_list:
-        create_product_in_db(product_data)
+    # Seed the sample catalog on a fresh database only
+    if not has_products_in_db():
+        for product_data in sample_product_data_list:
+            create_product_in_db(product_data)
 
 def reset_log():
     file_path = "/home/lenov/Documents/warung/logs/warung.log"
     if os.path.exists(file_path):
         os.remove(file_path)
 
-# Ensure database and logs are reset when the app starts
+# Ensure database is up to date and logs are reset when the app starts
 reset_db()
 reset_log()
 
@@ -121,23 +128,41 @@ reset_log()
 with open(f"{os.getcwd()}/app/instruction.md", 'r', encoding='utf-8') as file:
     base_instructions = file.read()
 
-products_raw = []
-
-@st.cache_resource
-async def get_products_data():
-    """Loads product data and caches it."""
+async def load_products() -> List[Dict[str, Any]]:
+    """Reads the whole catalog from the produk server."""
+    products = []
     params_produk_load = {"command": "uv", "args": ["run", "app/mcp_sample/produk_server.py"]}
     async with MCPServerStdio(params=params_produk_load) as mcp_produk_loader:
-        response = await mcp_produk_loader.call_tool("list_all_produk", {})
-        for i in response.content:
-            produk_dict = json.loads(i.text)
-            products_raw.append(produk_dict)
-    return products_raw
-
-# Load products at the start of the app
-products_raw = [] # Initialize empty list
-import asyncio
-products_raw = asyncio.run(get_products_data())
+        # list_all_produk returns one page per call; follow next_cursor to the end
+        cursor = None
+        while True:
+            response = await mcp_produk_loader.call_tool("list_all_produk", {"cursor": cursor, "limit": PAGE_LIMIT_MAX})
+            page = json.loads(response.content[0].text)
+            products.extend(page["items"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+    return products
+
+@st.cache_resource(max_entries=1)
+def load_catalog(catalog_version: Tuple[int, int]) -> Tuple[List[Dict[str, Any]], ProductRetriever]:
+    """
+    Loads the catalog and builds its TF-IDF index, once per catalog version.
+    Streamlit re-runs this script on every interaction; only a new version
+    (product added, deleted, renamed, repriced or moved) loads it again.
+    """
+    products = asyncio.run(load_products())
+    retriever = ProductRetriever(top_k=Config.PRODUCT_CONTEXT_TOP_K)
+    retriever.build(products)
+    return products, retriever
+
+# Only the products relevant to each message go into {products}, not the whole catalog.
+# Searching the cached index per message needs no network; checking the version is one query.
+products_raw, product_retriever = load_catalog(get_catalog_version_from_db())
+
+def instructions_for(message: str) -> str:
+    products = render_product_context(product_retriever.search(message), len(product_retriever))
+    return base_instructions.replace("{products}", products)
 
 # --- Custom Hooks for Logging ---
 class CustomHooks(RunHooks):
@@ -160,12 +185,13 @@ custom_hook = CustomHooks()
 
 # --- Model Initialization ---
 url_openrouter = "https://openrouter.ai/api/v1"
+openai_client = AsyncOpenAI(
+    base_url=url_openrouter,
+    api_key=os.getenv("OPENROUTER_API_KEY")
+)
 model = OpenAIChatCompletionsModel(
     model="openai/gpt-4o-mini",
-    openai_client=AsyncOpenAI(
-        base_url=url_openrouter,
-        api_key=os.getenv("OPENROUTER_API_KEY")
-    )
+    openai_client=openai_client
 )
 
 # --- Tool to Final Output Function ---
@@ -183,7 +209,7 @@ def my_tools_to_final_output_function(
                 details = []
                 for detail in v['detail_transactions']:
                     produk_name = "Unknown Product"
-                    for p in products_raw: # Use products_raw here to get stock
+                    for p in products_raw: # Use products_raw here to get the product name
                         if p.get('id') == detail.get('produk_id'):
                             produk_name = p.get('nama_barang', "Unknown Product")
                             break
@@ -194,6 +220,8 @@ def my_tools_to_final_output_function(
                         "Total Harga Produk": detail["total_harga_produk"]
                     })
                 st.session_state.current_transaction_details_df = pd.DataFrame(details)
+                # Pesanan yang sedang berjalan selalu ikut di prompt, tidak pernah diringkas
+                st.session_state.history_memory.set_open_order({"transaction": v.get("transaction"), "items": details})
             except json.JSONDecodeError as e:
                 st.error(f"Error decoding JSON from tool output: {e}")
             except KeyError as e:
@@ -206,32 +234,22 @@ def my_tools_to_final_output_function(
         is_final_output=False  
     )
 
-# --- Conversational History Function ---
-def conversational_history(history: list, current_message: str) -> str:
-    conversation_history_for_agent = []
-
-    for entry in history:
-        user_msg, assistant_msg = entry
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S") 
-        conversation_history_for_agent.append(f"{timestamp} | buyer: {user_msg}")
-        conversation_history_for_agent.append(f"{timestamp} | assistant: {assistant_msg}")
-
-    current_timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    conversation_history_for_agent.append(f"{current_timestamp} | buyer: {current_message}")
-    
-    formatted_history_string = "\n".join(conversation_history_for_agent)
-
-    full_request = f"""
-Konteks Percakapan Sebelumnya::
----
-{formatted_history_string}
----
-
---- Percakapan Berlanjut ---
-Pesan terbaru dari pembeli: {current_message}
+# --- Conversational History ---
+async def summarize_history(prompt: str) -> str:
+    response = await openai_client.chat.completions.create(
+        model="openai/gpt-4o-mini",
+        messages=[{"role": "user", "content": prompt}],
+    )
+    return response.choices[0].message.content or ""
 
-"""
-    return full_request
+def new_history_memory() -> ConversationMemory:
+    """Riwayat per sesi dengan budget token: giliran lama diringkas, pesanan berjalan disematkan."""
+    return ConversationMemory(HistoryManager(
+        max_tokens=Config.HISTORY_MAX_TOKENS,
+        keep_last_turns=Config.HISTORY_KEEP_LAST_TURNS,
+        summary_max_tokens=Config.HISTORY_SUMMARY_MAX_TOKENS,
+        summarize=summarize_history,
+    ))
 
 
 # --- Streamlit App --- 
@@ -242,6 +260,8 @@ async def main():
     # Initialize chat history and transaction details in session state
     if "messages" not in st.session_state:
         st.session_state.messages = []
+    if "history_memory" not in st.session_state:
+        st.session_state.history_memory = new_history_memory()
     if "current_transaction_details_df" not in st.session_state:
         st.session_state.current_transaction_details_df = pd.DataFrame(columns=["Produk", "Jumlah", "Harga per Produk", "Total Harga Produk"])
 
@@ -260,15 +280,8 @@ async def main():
             with st.chat_message("user"):
                 st.markdown(prompt)
 
-            # Prepare history for the agent
-            # Extract only user and assistant messages for conversational_history
-            agent_history = []
-            for i in range(0, len(st.session_state.messages) - 1, 2):
-                if st.session_state.messages[i]['role'] == 'user' and \
-                   st.session_state.messages[i+1]['role'] == 'assistant':
-                    agent_history.append((st.session_state.messages[i]['content'], st.session_state.messages[i+1]['content']))
-
-            full_request = conversational_history(agent_history, prompt)
+            # Prepare history for the agent (kept within the token budget by history_memory)
+            full_request = st.session_state.history_memory.render(prompt)
             
             with st.chat_message("assistant"):
                 with st.spinner("Warung AI sedang memproses..."):
@@ -279,7 +292,7 @@ async def main():
                         async with MCPServerStdio(params=params_transaction_agent) as mcp_transaction:
                             agent = Agent(
                                 name="agent", 
-                                instructions=base_instructions, 
+                                instructions=instructions_for(prompt), 
                                 model=model, 
                                 model_settings=ModelSettings(
                                     top_p=0.6,
@@ -292,6 +305,7 @@ async def main():
                             result = await Runner.run(agent, full_request, max_turns=50)
                             st.markdown(result.final_output)
                             st.session_state.messages.append({"role": "assistant", "content": result.final_output})
+                            await st.session_state.history_memory.add_turn(prompt, result.final_output)
             
             # Rerun the app to update the chat and transaction table
             st.experimental_rerun()